@@ -0,0 +1,276 @@
+import os
+import pickle
+import queue
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path
+
+from core.errors import AgentError
+from core.resources import ResourceLimits, merge_resource_usage, process_usage, wait_with_usage
+
+repo_root_folder = Path(__file__).parent.parent
+
+AUTHKEY_ENV_VARIABLE = "TABOO_AGENT_RUNNER_AUTHKEY"
+
+
+class _AgentWorker:
+    """A child process running a single agent, serving `get_hint` requests over a local connection.
+
+    The child is a plain subprocess (not a `multiprocessing.Process`), so it can be started from the daemonic
+    workers of the `multiprocessing.Pool` used by `scripts/test_solutions.py`. Every reply of the child carries its
+    resource usage so far, and the usage of the children that terminated (or were killed) is collected when they are
+    waited for.
+    """
+
+    def __init__(
+        self,
+        module_path: str,
+        llm_kwargs: dict,
+        startup_timeout: float = 60,
+        profiler=None,
+        limits: ResourceLimits | None = None,
+    ):
+        self.module_path = str(module_path)
+        self.llm_kwargs = llm_kwargs
+        self.startup_timeout = startup_timeout
+        self.profiler = profiler
+        self.limits = limits
+        self.agent_name = None
+        # Resource usage of the terminated children, and the last one reported by the running child
+        self._usages = []
+        self._live_usage = None
+        self._spawn()
+
+    def _spawn(self):
+        # The child process starts loading right away, the handshake is only completed when the worker is first used
+        authkey = os.urandom(32)
+        self._listener = Listener(authkey=authkey)
+        self._connection: Connection | None = None
+        env = os.environ.copy()
+        env[AUTHKEY_ENV_VARIABLE] = authkey.hex()
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(repo_root_folder), env.get("PYTHONPATH")]))
+        self._process = subprocess.Popen(
+            [sys.executable, "-m", "core.agent_runner", self._listener.address], env=env, cwd=repo_root_folder
+        )
+
+    def _connect(self):
+        accepted = []
+        accept_thread = threading.Thread(target=lambda: accepted.append(self._listener.accept()), daemon=True)
+        accept_thread.start()
+        deadline = time.monotonic() + self.startup_timeout
+        while accept_thread.is_alive():
+            accept_thread.join(timeout=0.05)
+            if accept_thread.is_alive() and (self._process.poll() is not None or time.monotonic() > deadline):
+                self.kill()
+                raise RuntimeError(f"Agent worker process for {self.module_path} failed to start")
+        self._listener.close()
+        if not accepted:
+            self.kill()
+            raise RuntimeError(f"Agent worker process for {self.module_path} failed to connect")
+
+        self._connection = accepted[0]
+        self._connection.send((self.module_path, self.llm_kwargs, self.profiler, self.limits))
+        if not self._connection.poll(self.startup_timeout):
+            self.kill()
+            raise RuntimeError(f"Agent worker process for {self.module_path} timed out while loading the agent")
+        try:
+            status, payload, self._live_usage = self._connection.recv()
+        except EOFError:
+            self.kill()
+            raise RuntimeError(
+                f"Agent worker process for {self.module_path} died while loading the agent{self._exit_reason()}"
+            )
+        if status == "error":
+            self.kill()
+            raise payload
+        self.agent_name = payload
+
+    def call(self, request: dict, timeout: float) -> str:
+        """Run `get_hint(**request)` in the child, killing and replacing it if it takes more than `timeout` seconds."""
+        if self._connection is None:
+            self._connect()
+
+        try:
+            self._connection.send(request)
+            replied = self._connection.poll(timeout)
+            if replied:
+                status, payload, self._live_usage = self._connection.recv()
+        except (EOFError, OSError):
+            # The child died, either while generating the hint or since its last reply (then sending fails, e.g.
+            # with a BrokenPipeError)
+            self.kill()
+            exit_reason = self._exit_reason()
+            self._spawn()
+            raise RuntimeError(
+                f"Agent worker process for {self.module_path} died while generating the hint{exit_reason}"
+            )
+        if not replied:
+            self.recycle()
+            raise TimeoutError(f"Function 'get_hint' timed out after {timeout} seconds")
+        if status == "error":
+            raise payload
+        return payload
+
+    def _exit_reason(self) -> str:
+        # Only meaningful once the child was waited for
+        exceeded_limit = self.limits.describe_exit(self._process.returncode) if self.limits is not None else None
+        return f" (exceeded its {exceeded_limit})" if exceeded_limit is not None else ""
+
+    def _wait(self, timeout: float | None = None):
+        self._usages.append(wait_with_usage(self._process, timeout=timeout))
+        self._live_usage = None
+
+    def resource_usage(self) -> dict | None:
+        """Return the resource usage of all the children of this worker (see `merge_resource_usage`)."""
+        return merge_resource_usage([*self._usages, self._live_usage])
+
+    def kill(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        self._listener.close()
+        if self._process.returncode is None:
+            self._process.kill()
+            self._wait()
+
+    def recycle(self):
+        self.kill()
+        self._spawn()
+
+    def close(self):
+        if self._connection is not None:
+            try:
+                self._connection.send(None)
+            except OSError:
+                pass
+            try:
+                self._wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                pass
+        self.kill()
+
+
+class IsolatedAgent:
+    """Runs an agent in a pool of warm, reusable worker processes, with hard timeouts on `get_hint`.
+
+    Each worker loads the agent once, then serves any number of hints. When a hint takes longer than the timeout,
+    the worker is killed (so a runaway agent can't keep running) and replaced by a freshly started one. Errors are
+    reported as `AgentError`, exactly like the in-process path of `core.tester`.
+
+    Args:
+        module_path (str): The path of the agent module (relative to the repository).
+        llm_kwargs (dict): The keyword arguments used to build the agent `LLM` in the worker processes.
+        num_workers (int, optional): The number of worker processes, i.e. of hints that can be generated concurrently. Defaults to 1.
+        profiler (AgentProfiler, optional): If given, the agent is profiled in the worker processes, which write their
+            profiles when closed (the profiles of the workers killed on timeout are lost). Defaults to None.
+        limits (ResourceLimits, optional): If given, the resource limits of each worker process. A worker exceeding
+            them fails its hint (or the loading of the agent) and, if it died, is replaced. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        module_path: str,
+        llm_kwargs: dict,
+        num_workers: int = 1,
+        profiler=None,
+        limits: ResourceLimits | None = None,
+    ):
+        self._workers = [
+            _AgentWorker(module_path, llm_kwargs, profiler=profiler, limits=limits) for _ in range(num_workers)
+        ]
+        self._idle_workers = queue.Queue()
+        try:
+            # Complete the first handshake right away, so that errors while loading the agent are raised here
+            self._workers[0]._connect()
+        except Exception:
+            self.close()
+            raise
+        self._name = self._workers[0].agent_name
+        for worker in self._workers:
+            self._idle_workers.put(worker)
+
+    def get_name(self) -> str:
+        return self._name
+
+    def get_hint(self, taboo_list: list[str], guess_word: str, level: int, timeout: float) -> str:
+        worker = self._idle_workers.get()
+        try:
+            return worker.call({"taboo_list": taboo_list, "guess_word": guess_word, "level": level}, timeout=timeout)
+        except TimeoutError as e:
+            raise AgentError(f"Timeout error when generating hint for word '{guess_word}'", original_error=e)
+        except Exception as e:
+            raise AgentError(f"Failed to generate hint for word '{guess_word}'", original_error=e)
+        finally:
+            self._idle_workers.put(worker)
+
+    def resource_usage(self) -> dict | None:
+        """Return the resource usage of the agent: the largest peak RSS (in MB) of its worker processes, and their
+        total CPU time (in seconds), or None where it can't be measured."""
+        return merge_resource_usage(worker.resource_usage() for worker in self._workers)
+
+    def close(self):
+        for worker in self._workers:
+            worker.close()
+
+
+def _picklable_error(error: Exception) -> Exception:
+    """Attach the traceback to the error (it is lost when pickling), and replace it if it can't be pickled."""
+    formatted_traceback = "".join(traceback.format_exception(error))
+    try:
+        pickle.dumps(error)
+    except Exception:
+        error = RuntimeError(repr(error))
+    if hasattr(error, "add_note"):
+        error.add_note(f"Traceback in the agent worker process:\n{formatted_traceback}")
+    return error
+
+
+def _worker_main(address: str):
+    from core.answer_generation import LLM
+    from core.tester import load_agent
+    from core.tracing import set_trace_attributes, trace
+
+    connection = Client(address, authkey=bytes.fromhex(os.environ[AUTHKEY_ENV_VARIABLE]))
+    module_path, llm_kwargs, profiler, limits = connection.recv()
+    tracer = llm_kwargs.get("tracer")
+    try:
+        # Applied once this process is started, so the limits are only spent on the agent
+        if limits:
+            limits.apply()
+        if profiler is None:
+            agent = load_agent(module_path, llm=LLM(**llm_kwargs))
+        else:
+            with profiler.profile(module_path):
+                agent = profiler.wrap(load_agent(module_path, llm=LLM(**llm_kwargs)), module_path)
+        agent_name = agent.get_name()
+        connection.send(("ready", agent_name, process_usage()))
+    except Exception as e:
+        connection.send(("error", _picklable_error(e), process_usage()))
+        return
+
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            request = None
+        if request is None:
+            if profiler is not None:
+                profiler.dump(module_path)
+            return
+
+        # The spans recorded in this process are attributed to the sample being tested, like in the parent process
+        set_trace_attributes(agent=agent_name, level=request["level"], word=request["guess_word"])
+        try:
+            with trace(tracer, "agent_get_hint"):
+                hint = agent.get_hint(**request)
+            connection.send(("ok", hint, process_usage()))
+        except Exception as e:
+            connection.send(("error", _picklable_error(e), process_usage()))
+
+
+if __name__ == "__main__":
+    _worker_main(sys.argv[1])
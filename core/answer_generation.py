@@ -1,27 +1,183 @@
-from openai import AzureOpenAI, APIConnectionError, RateLimitError, APIStatusError, OpenAIError
-from dotenv import load_dotenv
+import asyncio
+import functools
 import json
 import os
 import builtins
+import re
+import time
 
-# Load environment variables from .env file
-load_dotenv()
+from core.backends import get_client
+from core.cache import EmbeddingCache, ResponseCache
+from core.hedging import HedgingPolicy
+from core.rate_limiter import RateLimiter, RetryPolicy
+from core.startup import lazy_import
+from core.tracing import Tracer, trace
+
+# Only imported when a request is first sent (the .env file is loaded along with the first client)
+openai = lazy_import("openai")
+
+EMBEDDING_MODEL_NAME = "text-embedding-3-large"
+# Limits of a single embeddings request: at most 2048 inputs, and we keep the total size well below the token limit
+EMBEDDING_BATCH_MAX_INPUTS = 2048
+EMBEDDING_BATCH_MAX_CHARS = 400_000
+# The strings returned in place of an answer when a request fails (see `LLM._handle_error`)
+_ERROR_ANSWER_PATTERN = re.compile(r"API_CONNECTION_ERROR|RATE_LIMIT_ERROR|CONTENT_FILTER_ERROR|API_ERROR_\d+|OPENAI_ERROR")
+
+
+def is_error_answer(answer: str) -> bool:
+    """Whether an answer is the error string of a failed request (in any case, e.g. once lowercased by a guesser)."""
+    return _ERROR_ANSWER_PATTERN.fullmatch(answer.upper()) is not None
 
 
 class LLM:
-    def __init__(self, hints_db: dict, model_name: str = "gpt-4o-mini", verbose: bool = True):
+    def __init__(
+        self,
+        hints_db: dict,
+        model_name: str = "gpt-4o-mini",
+        verbose: bool = True,
+        cache: ResponseCache | None = None,
+        embedding_cache: EmbeddingCache | None = None,
+        rate_limiter: RateLimiter | None = None,
+        retry_policy: RetryPolicy | None = None,
+        backend: str | None = None,
+        tracer: Tracer | None = None,
+        hedging_policy: HedgingPolicy | None = None,
+    ):
         self.model_name = model_name
         self.verbose = verbose
-        self.client = AzureOpenAI()
+        self.backend = backend
+        # With a retry policy, retries are handled here instead of by the client
+        self._client_kwargs = {} if retry_policy is None else {"max_retries": 0}
+        self._ensure_client()
         self.hints_db = hints_db
+        self.cache = cache
+        self.embedding_cache = embedding_cache
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.tracer = tracer
+        self.hedging_policy = hedging_policy
+
+    @property
+    def client(self):
+        # Shared by all the LLM instances of the process (and created on first use)
+        return get_client(self.backend, **self._client_kwargs)
+
+    def _ensure_client(self):
+        # Get the client right away, so that configuration errors (e.g., missing credentials) are raised here
+        get_client(self.backend, **self._client_kwargs)
 
     def generate_answer(self, prompt: str):
         """Given a prompt, this function generates an answer using the LLM."""
+        return self._generate(prompt)
+
+    def generate_json_answer(self, prompt: str, max_completion_tokens: int = 300):
+        """Given a prompt asking for a JSON object, this function generates it using the LLM in JSON mode.
+
+        Meant for the prompts of the evaluation harness itself (e.g., the batched guesser), so the prompt length is
+        not limited. Errors are returned as strings like in `generate_answer`, so the caller must validate the answer.
+        """
+        return self._generate(prompt, json_mode=True, max_completion_tokens=max_completion_tokens)
+
+    def _generate(self, prompt: str, json_mode: bool = False, max_completion_tokens: int = 300):
+        with trace(self.tracer, "generate_answer", model=self.model_name) as span:
+            request = self._build_request(prompt, json_mode=json_mode, max_completion_tokens=max_completion_tokens)
+            cache_key, cached_answer = self._get_cached_answer(request, span)
+            if cached_answer is not None:
+                return cached_answer
+            try:
+                response = self._create_completion(request, span)
+            except openai.OpenAIError as e:
+                return self._error_answer(e, prompt, span)
+            return self._answer(response, cache_key)
+
+    def _get_cached_answer(self, request: dict, span) -> tuple[str | None, str | None]:
+        """Return the cache key of a request (None without a cache) and its cached answer (None if not cached)."""
+        if self.cache is None:
+            return None, None
+        cache_key = self.cache.make_key(self.model_name, request)
+        cached_answer = self.cache.get(cache_key)
+        if cached_answer is not None:
+            span.set(cached=True)
+        return cache_key, cached_answer
+
+    def _error_answer(self, error: "openai.OpenAIError", prompt: str, span) -> str:
+        answer = self._handle_error(error, prompt)
+        span.set(error=answer)
+        return answer
+
+    def _answer(self, response, cache_key: str | None) -> str:
+        answer = response.choices[0].message.content
+        # Only successful answers are cached, errors are always retried on the next run
+        if cache_key is not None and answer is not None:
+            self.cache.put(cache_key, answer)
+        return answer
+
+    def _create_completion(self, request: dict, span=None):
+        """Send a completion request, waiting for the rate limiter and retrying according to the retry policy.
+
+        With a hedging policy, each attempt is hedged on its own, once the rate limiter let it through (the wait for
+        the limiter and the backoff between retries are never hedged). The time spent waiting for the rate limiter,
+        the retries, the token usage and the hedging of the last attempt are added to `span` (if given).
+        """
+        estimated_tokens = self._estimate_tokens(request)
+        attempt = 0
+        queue_wait = 0.0
+        while True:
+            if self.rate_limiter is not None:
+                wait_start = time.perf_counter()
+                self.rate_limiter.acquire(estimated_tokens)
+                queue_wait += time.perf_counter() - wait_start
+            try:
+                with trace(self.tracer, "http", attempt=attempt):
+                    create = functools.partial(self.client.chat.completions.create, model=self.model_name, **request)
+                    if self.hedging_policy is not None:
+                        response = self.hedging_policy.run(create, span)
+                    else:
+                        response = create()
+                self._record_usage(response, estimated_tokens, span)
+                return response
+            except openai.OpenAIError as e:
+                delay = self._retry_delay(attempt, e)
+            finally:
+                if span is not None:
+                    span.set(queue_wait=queue_wait, retries=attempt)
+            time.sleep(delay)
+            attempt += 1
+
+    def _retry_delay(self, attempt: int, error: "openai.OpenAIError") -> float:
+        """Return how long to wait before retrying a failed request, or raise the error if it must not be retried."""
+        delay = self.retry_policy.get_delay(attempt, error) if self.retry_policy is not None else None
+        if delay is None:
+            raise error
+        return delay
+
+    @staticmethod
+    def _estimate_tokens(request: dict) -> int:
+        # Roughly 4 characters per token, plus the maximum length of the answer
+        prompt_chars = sum(len(message["content"]) for message in request["messages"])
+        return prompt_chars // 4 + request["max_completion_tokens"]
+
+    def _record_usage(self, response, estimated_tokens: int, span=None):
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+        if self.rate_limiter is not None:
+            self.rate_limiter.record_usage(usage.total_tokens - estimated_tokens)
+        if span is not None:
+            span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
 
-        if len(prompt) > 450:
+    def _build_request(self, prompt: str, json_mode: bool = False, max_completion_tokens: int = 300) -> dict:
+        return {
+            "messages": self._build_messages(prompt, limit_length=not json_mode),
+            "response_format": {"type": "json_object" if json_mode else "text"},
+            "max_completion_tokens": max_completion_tokens,
+        }
+
+    def _build_messages(self, prompt: str, limit_length: bool = True) -> list[dict]:
+        if limit_length and len(prompt) > 450:
             raise ValueError("Prompt is too long. Please provide a shorter prompt. Maximum length is 450 characters.")
 
-        messages = [
+        return [
             {
                 "role": "system",
                 "content": "Sei un assistente che gioca a Taboo, il celebre gioco di parole. L'utente potrà chiederti di: (1) fornire indizi creativi che permettano alla tua squadra di indovinare una parola target senza mai utilizzare le parole vietate indicate, oppure (2) interpretare gli indizi ricevuti e tentare di indovinare correttamente la parola nascosta.",
@@ -29,37 +185,30 @@ class LLM:
             {"role": "user", "content": prompt},
         ]
 
+    def _handle_error(self, error: "openai.OpenAIError", prompt: str) -> str:
+        """Map an OpenAI error to the error string returned in place of an answer."""
+
         def print(msg):
             if self.verbose:
                 builtins.print(msg)
 
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=messages,
-                response_format={"type": "text"},
-                max_completion_tokens=300,
-            )
-            answer = response.choices[0].message.content
-            return answer
-        except APIConnectionError as e:
-            print(f"Unable to reach the Azure OpenAI servers. Reason: {e.__cause__}")
+        if isinstance(error, openai.APIConnectionError):
+            print(f"Unable to reach the Azure OpenAI servers. Reason: {error.__cause__}")
             return "API_CONNECTION_ERROR"
-        except RateLimitError as e:
+        if isinstance(error, openai.RateLimitError):
             print("The maximum token per second has been reached; please slow down or request a new API KEY.")
             return "RATE_LIMIT_ERROR"
-        except APIStatusError as e:
-            if self._detect_content_filter_error(e):
+        if isinstance(error, openai.APIStatusError):
+            if self._detect_content_filter_error(error):
                 print(
                     f"The given prompt has triggered the Azure OpenAI content filter; please try to eliminate sensitive words. Prompt: '{prompt}'"
                 )
                 return "CONTENT_FILTER_ERROR"
-            return f"API_ERROR_{e.status_code}"
-        except OpenAIError as e:
-            print(f"Unexpected OpenAI error: {e}")
-            return "OPENAI_ERROR"
+            return f"API_ERROR_{error.status_code}"
+        print(f"Unexpected OpenAI error: {error}")
+        return "OPENAI_ERROR"
 
-    def _detect_content_filter_error(self, error: APIStatusError) -> bool:
+    def _detect_content_filter_error(self, error: "openai.APIStatusError") -> bool:
         if error.status_code != 400:
             return False
 
@@ -71,5 +220,117 @@ class LLM:
 
     def embed_text(self, text: str) -> list[float]:
         """Given a text, this function generates an embedding using the LLM."""
-        response = self.client.embeddings.create(input=text, model="text-embedding-3-large")
-        return response.data[0].embedding
+        return self.embed_texts([text])[0]
+
+    def embed_texts(self, texts: list[str]) -> list[list[float]]:
+        """Given a list of texts, this function generates their embeddings (in the same order) using the LLM.
+
+        Identical texts are embedded only once, texts already in the embedding cache (if any) are not sent at all,
+        and the remaining ones are sent in as few requests as the API limits allow.
+        """
+        with trace(self.tracer, "embed_texts", model=EMBEDDING_MODEL_NAME, num_texts=len(texts)) as span:
+            unique_texts = list(dict.fromkeys(texts))
+
+            embeddings = {}
+            if self.embedding_cache is not None:
+                embeddings = self.embedding_cache.get_many(EMBEDDING_MODEL_NAME, unique_texts)
+
+            missing_texts = [text for text in unique_texts if text not in embeddings]
+            prompt_tokens, retries = 0, 0
+            for batch in self._embedding_batches(missing_texts):
+                response, attempts = self._create_embeddings(batch)
+                retries += attempts
+                if getattr(response, "usage", None) is not None:
+                    prompt_tokens += response.usage.prompt_tokens
+                response_data = sorted(response.data, key=lambda item: item.index)
+                batch_embeddings = {text: item.embedding for text, item in zip(batch, response_data)}
+                if self.embedding_cache is not None:
+                    self.embedding_cache.put_many(EMBEDDING_MODEL_NAME, batch_embeddings)
+                embeddings.update(batch_embeddings)
+
+            span.set(num_requested=len(missing_texts), retries=retries, prompt_tokens=prompt_tokens)
+            return [embeddings[text] for text in texts]
+
+    def _create_embeddings(self, batch: list[str]) -> tuple:
+        """Send an embeddings request, retrying according to the retry policy. Returns the response and the retries."""
+        # Embeddings use their own deployment (and quota), so they are retried but not rate limited
+        attempt = 0
+        while True:
+            try:
+                with trace(self.tracer, "http", attempt=attempt):
+                    return self.client.embeddings.create(input=batch, model=EMBEDDING_MODEL_NAME), attempt
+            except openai.OpenAIError as e:
+                delay = self._retry_delay(attempt, e)
+            time.sleep(delay)
+            attempt += 1
+
+    @staticmethod
+    def _embedding_batches(texts: list[str]):
+        batch, batch_chars = [], 0
+        for text in texts:
+            if batch and (len(batch) == EMBEDDING_BATCH_MAX_INPUTS or batch_chars + len(text) > EMBEDDING_BATCH_MAX_CHARS):
+                yield batch
+                batch, batch_chars = [], 0
+            batch.append(text)
+            batch_chars += len(text)
+        if batch:
+            yield batch
+
+
+class AsyncLLM(LLM):
+    """LLM variant backed by AsyncAzureOpenAI, used by the asyncio evaluation engine (same arguments as `LLM`)."""
+
+    @property
+    def async_client(self):
+        # Shared by all the AsyncLLM instances running in the same event loop
+        return get_client(self.backend, asynchronous=True, **self._client_kwargs)
+
+    async def agenerate_answer(self, prompt: str):
+        """Async counterpart of `generate_answer`, with the same error handling, caching and tracing."""
+        return await self._agenerate(prompt)
+
+    async def agenerate_json_answer(self, prompt: str, max_completion_tokens: int = 300):
+        """Async counterpart of `generate_json_answer`."""
+        return await self._agenerate(prompt, json_mode=True, max_completion_tokens=max_completion_tokens)
+
+    async def _agenerate(self, prompt: str, json_mode: bool = False, max_completion_tokens: int = 300):
+        with trace(self.tracer, "generate_answer", model=self.model_name) as span:
+            request = self._build_request(prompt, json_mode=json_mode, max_completion_tokens=max_completion_tokens)
+            cache_key, cached_answer = self._get_cached_answer(request, span)
+            if cached_answer is not None:
+                return cached_answer
+            try:
+                response = await self._acreate_completion(request, span)
+            except openai.OpenAIError as e:
+                return self._error_answer(e, prompt, span)
+            return self._answer(response, cache_key)
+
+    async def _acreate_completion(self, request: dict, span=None):
+        """Async counterpart of `_create_completion`."""
+        estimated_tokens = self._estimate_tokens(request)
+        attempt = 0
+        queue_wait = 0.0
+        while True:
+            if self.rate_limiter is not None:
+                # The limiter blocks (it is shared with other processes), so wait for it outside the event loop
+                wait_start = time.perf_counter()
+                await asyncio.to_thread(self.rate_limiter.acquire, estimated_tokens)
+                queue_wait += time.perf_counter() - wait_start
+            try:
+                with trace(self.tracer, "http", attempt=attempt):
+                    create = functools.partial(
+                        self.async_client.chat.completions.create, model=self.model_name, **request
+                    )
+                    if self.hedging_policy is not None:
+                        response = await self.hedging_policy.arun(create, span)
+                    else:
+                        response = await create()
+                self._record_usage(response, estimated_tokens, span)
+                return response
+            except openai.OpenAIError as e:
+                delay = self._retry_delay(attempt, e)
+            finally:
+                if span is not None:
+                    span.set(queue_wait=queue_wait, retries=attempt)
+            await asyncio.sleep(delay)
+            attempt += 1
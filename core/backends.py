@@ -0,0 +1,303 @@
+import asyncio
+import hashlib
+import importlib.util
+import json
+import os
+import random
+import re
+import threading
+import time
+import warnings
+import weakref
+from types import SimpleNamespace
+
+import numpy as np
+
+from core.startup import finish_import, lazy_import
+
+# Only imported when a client is first created (importing openai takes most of the startup time)
+httpx = lazy_import("httpx")
+openai = lazy_import("openai")
+
+# Environment variables used to select and configure the backend, so that every process of a run (pool workers,
+# isolated agent workers, ...) uses the same one
+BACKEND_ENV_VARIABLE = "TABOO_LLM_BACKEND"
+FAKE_LATENCY_ENV_VARIABLE = "TABOO_FAKE_LATENCY"
+FAKE_RATE_LIMIT_ERROR_RATE_ENV_VARIABLE = "TABOO_FAKE_RATE_LIMIT_ERROR_RATE"
+FAKE_CONTENT_FILTER_ERROR_RATE_ENV_VARIABLE = "TABOO_FAKE_CONTENT_FILTER_ERROR_RATE"
+FAKE_SEED_ENV_VARIABLE = "TABOO_FAKE_SEED"
+HTTP_MAX_CONNECTIONS_ENV_VARIABLE = "TABOO_HTTP_MAX_CONNECTIONS"
+HTTP_MAX_KEEPALIVE_CONNECTIONS_ENV_VARIABLE = "TABOO_HTTP_MAX_KEEPALIVE_CONNECTIONS"
+HTTP_KEEPALIVE_EXPIRY_ENV_VARIABLE = "TABOO_HTTP_KEEPALIVE_EXPIRY"
+HTTP2_ENV_VARIABLE = "TABOO_HTTP2"
+
+BACKENDS = ["azure", "fake"]
+
+
+def _http_client(asynchronous: bool = False) -> "httpx.Client | httpx.AsyncClient":
+    """Create the HTTP client (i.e., connection pool) of the Azure clients, configured by `TABOO_HTTP_*` env variables.
+
+    The pool defaults to 100 connections, 20 of which are kept alive for 60 seconds between requests. HTTP/2 is used
+    if `TABOO_HTTP2` is set to 1 and the `h2` package is installed.
+    """
+    limits = httpx.Limits(
+        max_connections=int(os.environ.get(HTTP_MAX_CONNECTIONS_ENV_VARIABLE, 100)),
+        max_keepalive_connections=int(os.environ.get(HTTP_MAX_KEEPALIVE_CONNECTIONS_ENV_VARIABLE, 20)),
+        keepalive_expiry=float(os.environ.get(HTTP_KEEPALIVE_EXPIRY_ENV_VARIABLE, 60)),
+    )
+    http2 = os.environ.get(HTTP2_ENV_VARIABLE, "0") == "1"
+    if http2 and importlib.util.find_spec("h2") is None:
+        warnings.warn("HTTP/2 requires the 'h2' package (pip install httpx[http2]), falling back to HTTP/1.1")
+        http2 = False
+    client_class = openai.DefaultAsyncHttpxClient if asynchronous else openai.DefaultHttpxClient
+    return client_class(limits=limits, http2=http2)
+
+
+def create_client(backend: str | None = None, asynchronous: bool = False, **client_kwargs):
+    """Create the OpenAI-compatible client of the given backend ("azure" or "fake").
+
+    If no backend is given, it is read from the `TABOO_LLM_BACKEND` environment variable (defaulting to "azure").
+    The Azure credentials are read from the environment, loaded from the `.env` file (if any) on first use. Use
+    `get_client` instead to share the clients (and their connection pools) within a process.
+    """
+    backend = backend or os.environ.get(BACKEND_ENV_VARIABLE, "azure")
+    # Finish the lazy import here, before the client is used by several threads (LazyLoader isn't thread-safe on
+    # Python < 3.12), and the openai errors are needed by all backends
+    finish_import(openai)
+    match backend:
+        case "azure":
+            _load_dotenv()
+            client_class = openai.AsyncAzureOpenAI if asynchronous else openai.AzureOpenAI
+            return client_class(http_client=_http_client(asynchronous), **client_kwargs)
+        case "fake":
+            return AsyncFakeClient.from_env() if asynchronous else FakeClient.from_env()
+        case _:
+            raise ValueError(f"Unknown LLM backend '{backend}', valid backends are {BACKENDS}")
+
+
+_dotenv_loaded = False
+
+
+def _load_dotenv():
+    # Doesn't override the variables already set (e.g., by scripts/test_solutions.py, from the repo .env file)
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _dotenv_loaded = True
+
+
+class _ClientRegistry:
+    """Process-wide registry of clients, so all the `LLM` instances of a process share their connection pools.
+
+    Clients are created lazily on first use, and the registry is emptied in forked children (the parent connections
+    must not be reused there), so it is safe to use with the multiprocessing driver. Asynchronous clients are also
+    bound to the event loop they are created in, so each loop gets its own, which must be closed (see `aclose`)
+    before the loop ends.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._clients = {}
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def get(self, backend: str | None = None, asynchronous: bool = False, **client_kwargs):
+        key = (backend or os.environ.get(BACKEND_ENV_VARIABLE, "azure"), tuple(sorted(client_kwargs.items())))
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._clients = {}
+                self._async_clients = weakref.WeakKeyDictionary()
+
+            clients = self._clients
+            if asynchronous:
+                clients = self._async_clients.setdefault(asyncio.get_running_loop(), {})
+            if key not in clients:
+                clients[key] = create_client(key[0], asynchronous=asynchronous, **client_kwargs)
+            return clients[key]
+
+    async def aclose(self):
+        """Close the asynchronous clients of the running event loop (and forget them)."""
+        with self._lock:
+            clients = {}
+            if self._pid == os.getpid():
+                clients = self._async_clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            await client.close()
+
+
+_registry = _ClientRegistry()
+
+
+def get_client(backend: str | None = None, asynchronous: bool = False, **client_kwargs):
+    """Return the client of the given backend (see `create_client`) shared by the whole process.
+
+    Asynchronous clients can only be requested from a running event loop, and are shared within that loop.
+    """
+    return _registry.get(backend, asynchronous=asynchronous, **client_kwargs)
+
+
+async def close_async_clients():
+    """Close the asynchronous clients shared within the running event loop (see `get_client`), before it ends."""
+    await _registry.aclose()
+
+
+class LatencyDistribution:
+    """Distribution of the simulated latency of the fake backend, parsed from a spec like "lognormal:-1,0.5".
+
+    Supported specs are "constant:SECONDS", "uniform:MIN,MAX" and "lognormal:MU,SIGMA" (a bare number is a
+    constant latency).
+    """
+
+    def __init__(self, spec: str = "0"):
+        kind, _, parameters = spec.partition(":") if ":" in spec else ("constant", "", spec)
+        self.kind = kind
+        self.parameters = [float(parameter) for parameter in parameters.split(",")]
+        expected_parameters = {"constant": 1, "uniform": 2, "lognormal": 2}
+        if expected_parameters.get(kind) != len(self.parameters):
+            raise ValueError(f"Invalid latency distribution '{spec}'")
+
+    def sample(self, rng: random.Random) -> float:
+        match self.kind:
+            case "constant":
+                return self.parameters[0]
+            case "uniform":
+                return rng.uniform(*self.parameters)
+            case "lognormal":
+                return rng.lognormvariate(*self.parameters)
+
+
+class _FakeBackend:
+    """Deterministic stand-in for the Azure OpenAI endpoint: answers only depend on the request content.
+
+    Completions answer the guesser prompts (per-hint and batched) with the last word of each hint, and any other
+    prompt with a hint built from the prompt itself; embeddings are pseudo-random unit vectors seeded by the text.
+    Latency and errors (rate limit and content filter) are drawn from a generator seeded once, so a run with the same
+    sequence of requests is reproducible.
+    """
+
+    def __init__(
+        self,
+        latency: str = "0",
+        rate_limit_error_rate: float = 0.0,
+        content_filter_error_rate: float = 0.0,
+        seed: int = 0,
+        embedding_dimensions: int = 3072,
+    ):
+        self.latency = LatencyDistribution(latency)
+        self.rate_limit_error_rate = rate_limit_error_rate
+        self.content_filter_error_rate = content_filter_error_rate
+        self.embedding_dimensions = embedding_dimensions
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            latency=os.environ.get(FAKE_LATENCY_ENV_VARIABLE, "0"),
+            rate_limit_error_rate=float(os.environ.get(FAKE_RATE_LIMIT_ERROR_RATE_ENV_VARIABLE, 0)),
+            content_filter_error_rate=float(os.environ.get(FAKE_CONTENT_FILTER_ERROR_RATE_ENV_VARIABLE, 0)),
+            seed=int(os.environ.get(FAKE_SEED_ENV_VARIABLE, 0)),
+        )
+
+    def _draw(self) -> tuple[float, float]:
+        with self._lock:
+            return self.latency.sample(self._rng), self._rng.random()
+
+    def _maybe_raise(self, draw: float):
+        request = httpx.Request("POST", "http://localhost/fake")
+        if draw < self.rate_limit_error_rate:
+            response = httpx.Response(429, headers={"retry-after-ms": "10"}, request=request)
+            raise openai.RateLimitError("Fake rate limit error", response=response, body=None)
+        if draw < self.rate_limit_error_rate + self.content_filter_error_rate:
+            body = {"error": {"code": "content_filter", "message": "Fake content filter error"}}
+            response = httpx.Response(400, json=body, request=request)
+            raise openai.BadRequestError("Fake content filter error", response=response, body=body)
+
+    @staticmethod
+    def _guess(hint: str) -> str:
+        words = re.findall(r"\w+", hint)
+        return words[-1].lower() if words else ""
+
+    @classmethod
+    def _answer(cls, messages: list[dict]) -> str:
+        prompt = messages[-1]["content"]
+        match = re.match(r"Guess a single work based on the hint: (.*)\. Respond only with the guess", prompt, re.DOTALL)
+        if match:
+            return cls._guess(match.group(1))
+        # Batched guesser prompt, answered in JSON with the same guesses as the per-hint one
+        match = re.match(r"Guess a single word for each of the following independent hints\..*\nHints: (.*)", prompt, re.DOTALL)
+        if match:
+            hints = json.loads(match.group(1))
+            return json.dumps({"guesses": {str(item["id"]): cls._guess(item["hint"]) for item in hints}})
+        words = re.findall(r"\w+", prompt)
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        return " ".join(words[byte % len(words)] for byte in digest[:5]) if words else ""
+
+    def _completion(self, model: str, messages: list[dict]):
+        answer = self._answer(messages)
+        prompt_tokens = sum(len(message["content"]) for message in messages) // 4
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(index=0, message=SimpleNamespace(role="assistant", content=answer))],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=len(answer) // 4 + 1,
+                total_tokens=prompt_tokens + len(answer) // 4 + 1,
+            ),
+        )
+
+    def _embeddings(self, model: str, input: str | list[str]):
+        texts = [input] if isinstance(input, str) else input
+        data = []
+        for i, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            embedding = np.random.default_rng(seed).standard_normal(self.embedding_dimensions)
+            data.append(SimpleNamespace(index=i, embedding=(embedding / np.linalg.norm(embedding)).tolist()))
+        tokens = sum(len(text) for text in texts) // 4
+        return SimpleNamespace(model=model, data=data, usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens))
+
+
+class FakeClient(_FakeBackend):
+    """In-process fake of `AzureOpenAI`, exposing `chat.completions.create` and `embeddings.create`."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_completion))
+        self.embeddings = SimpleNamespace(create=self._create_embeddings)
+
+    def _create_completion(self, model: str, messages: list[dict], **kwargs):
+        latency, draw = self._draw()
+        time.sleep(latency)
+        self._maybe_raise(draw)
+        return self._completion(model, messages)
+
+    def _create_embeddings(self, input: str | list[str], model: str, **kwargs):
+        latency, _ = self._draw()
+        time.sleep(latency)
+        return self._embeddings(model, input)
+
+
+class AsyncFakeClient(_FakeBackend):
+    """In-process fake of `AsyncAzureOpenAI`, exposing `chat.completions.create` and `embeddings.create`."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_completion))
+        self.embeddings = SimpleNamespace(create=self._create_embeddings)
+
+    async def _create_completion(self, model: str, messages: list[dict], **kwargs):
+        latency, draw = self._draw()
+        await asyncio.sleep(latency)
+        self._maybe_raise(draw)
+        return self._completion(model, messages)
+
+    async def _create_embeddings(self, input: str | list[str], model: str, **kwargs):
+        latency, _ = self._draw()
+        await asyncio.sleep(latency)
+        return self._embeddings(model, input)
+
+    async def close(self):
+        pass
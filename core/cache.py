@@ -0,0 +1,345 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+from core.errors import CacheMissError
+
+# Set (e.g., by `scripts/test_solutions.py --official`) for official scoring runs, where approximations like the guess
+# cache are not allowed. It is inherited by all the processes of the run
+OFFICIAL_ENV_VARIABLE = "TABOO_OFFICIAL"
+
+
+class SQLiteStore:
+    """Base class for SQLite-backed state shared by processes, handling per-thread connections and pickling."""
+
+    SCHEMA: list[str] = []
+
+    def __init__(self, path: str | Path):
+        self.path = str(path)
+        self._local = threading.local()
+
+    def __getstate__(self):
+        # Connections and thread-locals can't cross process boundaries, each process reconnects lazily
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+
+class ResponseCache(SQLiteStore):
+    """Content-addressed, SQLite-backed cache for LLM completions.
+
+    Entries are keyed by a hash of the model name and the full request, so the same prompt sent by different
+    agents (e.g., the guesser prompt) or by different runs is only paid for once. The database runs in WAL mode,
+    and every process/thread opens its own connection lazily, so the cache can be shared by the multiprocessing
+    workers of `scripts/test_solutions.py` (and pickled into them).
+
+    Args:
+        path (str | Path): The path of the SQLite database file (created if missing).
+        max_size_mb (float, optional): If set, least recently used entries are evicted above this size.
+        max_age_seconds (float, optional): If set, entries older than this are evicted (and never returned).
+        replay_only (bool, optional): If True, a miss raises `CacheMissError` instead of calling the API.
+    """
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS responses ("
+        "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+        "created_at REAL NOT NULL, accessed_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)",
+    ]
+    EVICTION_INTERVAL = 100
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_size_mb: float | None = None,
+        max_age_seconds: float | None = None,
+        replay_only: bool = False,
+    ):
+        super().__init__(path)
+        self.max_size_mb = max_size_mb
+        self.max_age_seconds = max_age_seconds
+        self.replay_only = replay_only
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+
+    @staticmethod
+    def make_key(model_name: str, request: dict) -> str:
+        payload = json.dumps({"model": model_name, "request": request}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        """Return the cached value for `key` (or None), raising `CacheMissError` on a miss in replay-only mode."""
+        now = time.time()
+        row = self._connection.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None and self.max_age_seconds is not None and now - row[1] > self.max_age_seconds:
+            row = None
+
+        if row is None:
+            self.misses += 1
+            if self.replay_only:
+                raise CacheMissError(f"Request '{key}' not found in replay-only cache {self.path}")
+            return None
+
+        self.hits += 1
+        self._connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, key: str, value: str):
+        now = time.time()
+        self._connection.execute(
+            "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value.encode("utf-8")), now, now),
+        )
+        self._puts += 1
+        if self._puts % self.EVICTION_INTERVAL == 0:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones until the cache fits in `max_size_mb`."""
+        connection = self._connection
+        if self.max_age_seconds is not None:
+            connection.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age_seconds,))
+
+        if self.max_size_mb is not None:
+            max_size = self.max_size_mb * 1024 * 1024
+            total_size = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total_size > max_size:
+                # Walk entries from the least recently used, until enough space has been freed
+                to_free, freed, last_accessed_at = total_size - max_size, 0, None
+                for size, accessed_at in connection.execute("SELECT size, accessed_at FROM responses ORDER BY accessed_at"):
+                    freed += size
+                    last_accessed_at = accessed_at
+                    if freed >= to_free:
+                        break
+                connection.execute("DELETE FROM responses WHERE accessed_at <= ?", (last_accessed_at,))
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+class EmbeddingCache(SQLiteStore):
+    """Persistent per-model cache of text embeddings, stored as float64 blobs in SQLite (so a cache hit returns exactly
+    the embedding the API returned).
+
+    Args:
+        path (str | Path): The path of the SQLite database file (created if missing, can be shared with a `ResponseCache`).
+    """
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS embeddings ("
+        "model TEXT NOT NULL, key TEXT NOT NULL, vector BLOB NOT NULL, PRIMARY KEY (model, key))",
+    ]
+
+    def __init__(self, path: str | Path):
+        super().__init__(path)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model_name: str, texts: list[str]) -> dict[str, list[float]]:
+        """Return the cached embeddings of `texts` for the given model, as a `{text: embedding}` dict."""
+        keys = {self.make_key(text): text for text in texts}
+        found = {}
+        # Stay well below SQLite's limit on the number of query parameters
+        key_list = list(keys)
+        for i in range(0, len(key_list), 500):
+            chunk = key_list[i : i + 500]
+            rows = self._connection.execute(
+                f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({', '.join('?' * len(chunk))})",
+                (model_name, *chunk),
+            )
+            for key, vector in rows:
+                found[keys[key]] = array("d", vector).tolist()
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, model_name: str, embeddings: dict[str, list[float]]):
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, key, vector) VALUES (?, ?, ?)",
+            [(model_name, self.make_key(text), array("d", vector).tobytes()) for text, vector in embeddings.items()],
+        )
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+def cache_counts(cache: ResponseCache | EmbeddingCache | None) -> tuple[int, int]:
+    """Snapshot the `(hits, misses)` counters of a cache (zeros without a cache), see `cache_stats_since`."""
+    return (cache.hits, cache.misses) if cache is not None else (0, 0)
+
+
+def cache_stats_since(cache: ResponseCache | EmbeddingCache, counts: tuple[int, int]) -> dict:
+    """Return the stats of the lookups made since the `cache_counts` snapshot `counts` (the caches are shared by all
+    the agents tested in a process, so their own stats add up across agents)."""
+    hits, misses = cache.hits - counts[0], cache.misses - counts[1]
+    return {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else 0.0}
+
+
+def official_mode() -> bool:
+    return os.environ.get(OFFICIAL_ENV_VARIABLE, "") not in ("", "0")
+
+
+class GuessCache(SQLiteStore):
+    """Development-only, SQLite-backed cache of the guesses, by guesser model and hint (see `CachedGuesser`).
+
+    A hint is first looked up by its normalized text (see `normalize_hint`), then by its nearest neighbour among the
+    embeddings of the hints already guessed: if they are similar enough, the guess of the neighbour is reused. The
+    latter is an approximation (two close hints don't always get the same guess), so the cache is strictly for
+    development runs: it can't be created, nor used, in official scoring mode (see `official_mode`).
+
+    Each process keeps the embeddings of each model in memory, and only loads the entries added since its last lookup.
+    Like the response cache, it can be pickled into the worker processes (each of which reconnects lazily).
+
+    Args:
+        path (str | Path): The path of the SQLite database file (created if missing).
+        similarity_threshold (float, optional): The minimum cosine similarity of a neighbour whose guess is reused.
+            Defaults to 0.95.
+    """
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS guesses ("
+        "id INTEGER PRIMARY KEY, model TEXT NOT NULL, key TEXT NOT NULL, hint TEXT NOT NULL, guess TEXT NOT NULL, "
+        "vector BLOB, UNIQUE (model, key))",
+    ]
+
+    def __init__(self, path: str | Path, similarity_threshold: float = 0.95):
+        self._check_allowed()
+        super().__init__(path)
+        self.similarity_threshold = similarity_threshold
+        self._init_state()
+
+    def _init_state(self):
+        self._lock = threading.Lock()
+        # By model: the last loaded id, the guesses and the (normalized) embeddings of the hints
+        self._vectors = {}
+        self._reset_stats()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        for key in ["_lock", "_vectors", "_stats"]:
+            del state[key]
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._init_state()
+
+    def _reset_stats(self):
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+
+    def collect_stats(self) -> dict:
+        """Return the `exact_hits`, `semantic_hits` and `misses` since the last call, and reset them."""
+        with self._lock:
+            stats = self._stats
+            self._reset_stats()
+        return stats
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    @staticmethod
+    def _check_allowed():
+        if official_mode():
+            raise RuntimeError("The guess cache is disabled in official scoring mode")
+
+    @staticmethod
+    def normalize_hint(hint: str) -> str:
+        """Case-fold the hint, and drop its punctuation and extra whitespace."""
+        return " ".join(re.sub(r"[^\w\s]", " ", hint.casefold()).split())
+
+    def get_exact(self, model_name: str, hint: str) -> str | None:
+        """Return the guess of a hint with the same normalized text (or None). Only hits are counted."""
+        self._check_allowed()
+        row = self._connection.execute(
+            "SELECT guess FROM guesses WHERE model = ? AND key = ?", (model_name, self.normalize_hint(hint))
+        ).fetchone()
+        if row is None:
+            return None
+        self._count("exact_hits")
+        return row[0]
+
+    def get_similar(self, model_name: str, embedding: list[float] | None) -> str | None:
+        """Return the guess of the nearest hint, if its similarity reaches the threshold (or None, a counted miss)."""
+        self._check_allowed()
+        guess = None
+        if embedding is not None:
+            query = np.asarray(embedding, dtype=np.float32)
+            query /= max(float(np.linalg.norm(query)), 1e-12)
+            guesses, matrix = self._load_vectors(model_name)
+            if len(guesses) and matrix.shape[1] == query.shape[0]:
+                similarities = matrix @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    guess = guesses[best]
+        self._count("misses" if guess is None else "semantic_hits")
+        return guess
+
+    def _load_vectors(self, model_name: str) -> tuple[list[str], np.ndarray]:
+        with self._lock:
+            last_id, guesses, matrix = self._vectors.get(model_name, (0, [], None))
+            rows = self._connection.execute(
+                "SELECT id, guess, vector FROM guesses WHERE model = ? AND id > ? AND vector IS NOT NULL ORDER BY id",
+                (model_name, last_id),
+            ).fetchall()
+            if rows:
+                vectors = np.stack([np.frombuffer(vector, dtype=np.float32) for _, _, vector in rows])
+                matrix = vectors if matrix is None else np.concatenate([matrix, vectors])
+                guesses = guesses + [guess for _, guess, _ in rows]
+                self._vectors[model_name] = (rows[-1][0], guesses, matrix)
+        return guesses, matrix
+
+    def put(self, model_name: str, hint: str, guess: str, embedding: list[float] | None = None):
+        """Store the guess of a hint, with the embedding of the hint (normalized), if any."""
+        self._check_allowed()
+        vector = None
+        if embedding is not None:
+            vector = np.asarray(embedding, dtype=np.float32)
+            vector = (vector / max(float(np.linalg.norm(vector)), 1e-12)).tobytes()
+        self._connection.execute(
+            "INSERT OR IGNORE INTO guesses (model, key, hint, guess, vector) VALUES (?, ?, ?, ?, ?)",
+            (model_name, self.normalize_hint(hint), hint, guess, vector),
+        )
+
+
+def merge_guess_cache_stats(stats) -> dict:
+    """Merge the stats collected by `GuessCache.collect_stats` (e.g., by different agents or processes)."""
+    merged = {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+    for el in stats:
+        for key, value in el.items():
+            merged[key] += value
+    return merged
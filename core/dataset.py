@@ -0,0 +1,98 @@
+import hashlib
+from collections.abc import Iterator, Sequence
+from pathlib import Path
+
+# Separator of the fields of a compact word entry (a control character, never found in the words files)
+_FIELD_SEPARATOR = "\x1f"
+
+
+def parse_words_line(line: str) -> tuple[str, list[str]] | None:
+    """Parse a `word: taboo1, taboo2, ...` line into `(guess_word, taboo_list)`, lowercased.
+
+    A bare `word` line has no taboo words. Returns None for blank lines and comments (starting with "#"), and raises
+    `ValueError` on lines without a word.
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+
+    guess_word, _, taboo_words = line.partition(":")
+    guess_word = guess_word.strip().lower()
+    if not guess_word:
+        raise ValueError(f"Invalid words line (expected 'word: taboo1, taboo2, ...'): '{line}'")
+    taboo_list = [word.strip().lower() for word in taboo_words.split(",") if word.strip()]
+    return guess_word, taboo_list
+
+
+def _in_sample(guess_word: str, sample_fraction: float, seed: int) -> bool:
+    # Hash-based, so the same words are sampled regardless of the order of the file and of the sharding
+    digest = hashlib.sha256(f"{seed}:{guess_word}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little") / 2**64 < sample_fraction
+
+
+def iter_words(
+    path: str | Path,
+    shard_index: int = 0,
+    num_shards: int = 1,
+    sample_fraction: float | None = None,
+    seed: int = 0,
+    max_words: int | None = None,
+) -> Iterator[tuple[str, list[str]]]:
+    """Stream the `(guess_word, taboo_list)` pairs of a words file, one line at a time.
+
+    Args:
+        path (str | Path): The path of the words file, with one `word: taboo1, taboo2, ...` line per word.
+        shard_index (int, optional): The shard to read (from 0 to `num_shards - 1`). Defaults to 0.
+        num_shards (int, optional): The number of shards: the words are dealt round-robin (by line) to the shards,
+            so the shards are disjoint and, together, cover the whole file. Defaults to 1.
+        sample_fraction (float, optional): If set, only a deterministic, pseudo-random fraction of the words (picked
+            by hashing them with the seed) is read. Defaults to None.
+        seed (int, optional): The seed of the sampling. Defaults to 0.
+        max_words (int, optional): If set, stop after this many words. Defaults to None.
+    """
+    if not 0 <= shard_index < num_shards:
+        raise ValueError(f"Invalid shard {shard_index} of {num_shards}")
+
+    num_words, word_index = 0, 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if max_words is not None and num_words >= max_words:
+                return
+            entry = parse_words_line(line)
+            if entry is None:
+                continue
+
+            word_index += 1
+            if (word_index - 1) % num_shards != shard_index:
+                continue
+            if sample_fraction is not None and not _in_sample(entry[0], sample_fraction, seed):
+                continue
+            num_words += 1
+            yield entry
+
+
+class WordList(Sequence):
+    """Compact, read-only list of `(guess_word, taboo_list)` pairs.
+
+    Each pair is stored as a single string, and only decoded when accessed, so a large list takes a fraction of the
+    memory (and of the pickled size, when shipped to the worker processes) of the equivalent list of tuples.
+    """
+
+    def __init__(self, words: Iterator[tuple[str, list[str]]] = ()):
+        self._entries = [_FIELD_SEPARATOR.join([guess_word, *taboo_list]) for guess_word, taboo_list in words]
+
+    @classmethod
+    def load(cls, path: str | Path, **kwargs) -> "WordList":
+        """Load a words file (see `iter_words` for the sharding and sampling arguments)."""
+        return cls(iter_words(path, **kwargs))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            sliced = WordList()
+            sliced._entries = self._entries[index]
+            return sliced
+        guess_word, *taboo_list = self._entries[index].split(_FIELD_SEPARATOR)
+        return guess_word, taboo_list
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,4 +1,5 @@
 import concurrent.futures
+import contextvars
 import functools
 
 
@@ -6,15 +7,22 @@ def timeout(seconds):
     """
     A decorator to timeout a function after a specified number of seconds.
     Uses concurrent.futures for thread-safe and cross-platform compatibility.
+
+    Note that a thread can't be killed: on timeout the caller gets a `TimeoutError` right away, but the function
+    keeps running in background until it returns (use `core.agent_runner.IsolatedAgent` for hard timeouts).
     """
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(func, *args, **kwargs)
-                try:
-                    return future.result(timeout=seconds)
-                except concurrent.futures.TimeoutError:
-                    raise TimeoutError(f"Function '{func.__name__}' timed out after {seconds} seconds")
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+            # Run in a copy of the caller context, so that context variables (e.g., the tracing attributes) follow
+            future = executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+            try:
+                return future.result(timeout=seconds)
+            except concurrent.futures.TimeoutError:
+                raise TimeoutError(f"Function '{func.__name__}' timed out after {seconds} seconds")
+            finally:
+                # Don't wait for a runaway function to complete, otherwise the timeout would be pointless
+                executor.shutdown(wait=False)
         return wrapper
     return decorator
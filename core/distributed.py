@@ -0,0 +1,395 @@
+import hashlib
+import itertools
+import multiprocessing
+import os
+import pickle
+import queue
+import socket
+import threading
+import time
+import traceback
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from core.backends import BACKEND_ENV_VARIABLE
+from core.cache import OFFICIAL_ENV_VARIABLE
+from core.scheduler import (
+    group_sample_tasks,
+    init_worker,
+    run_sample_group_task,
+    store_sample_result,
+    stored_sample_result,
+)
+from core.tester import repo_root_folder
+from core.vector_index import HintsIndex
+
+# The shared secret of the coordinator and its workers (the messages are pickled, so it must be kept private)
+AUTHKEY_ENV_VARIABLE = "TABOO_DISTRIBUTED_AUTHKEY"
+# Settings of the coordinator process that the workers inherit (through their environment)
+SHARED_ENV_VARIABLES = [BACKEND_ENV_VARIABLE, OFFICIAL_ENV_VARIABLE]
+# Host-local state of the evaluation context (files of the coordinator host), not shipped to the workers
+_LOCAL_CONTEXT_KEYS = [
+    "cache",
+    "embedding_cache",
+    "guess_cache",
+    "rate_limiter",
+    "tracer",
+    "profiler",
+    "results_store",
+    "results_stream",
+]
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    """Parse a `host:port` address."""
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Invalid address '{address}' (expected host:port)")
+    return host, int(port)
+
+
+def get_authkey() -> bytes:
+    authkey = os.environ.get(AUTHKEY_ENV_VARIABLE)
+    if not authkey:
+        raise RuntimeError(f"The {AUTHKEY_ENV_VARIABLE} env variable must be set (to the same secret on every host)")
+    return authkey.encode("utf-8")
+
+
+def _source_digest(agent_path) -> str | None:
+    path = repo_root_folder / agent_path
+    return hashlib.sha256(path.read_bytes()).hexdigest() if path.exists() else None
+
+
+class Coordinator:
+    """Serves the (agent, level, word) units of the sample scheduler to workers on any host (see `run_worker`), over
+    TCP, instead of a local `multiprocessing.Pool`.
+
+    The coordinator holds the task queue and the evaluation context, which every worker process gets when it connects
+    (with the hints index shipped by value, and without the host-local state: caches, rate limiter, tracer, profiler
+    and results store). The results store stays on the coordinator, which only dispatches the samples missing from it
+    and stores the new ones. The workers must run from a checkout with the same agents: an agent whose source differs
+    on a worker fails there.
+
+    The samples are dispatched in groups (see `group_sample_tasks`), of a single sample unless the workers keep
+    several in flight (with `max_concurrency` in the context). A group whose worker disconnects (e.g., dies, or its
+    host does) or doesn't answer within `task_timeout` is queued again; after `max_attempts` attempts, its samples
+    are counted as `agent_error`s (like samples where the agent crashed), so the rest of the agent's samples still
+    count.
+
+    Args:
+        address (tuple[str, int]): The (host, port) address to listen on.
+        authkey (bytes): The secret shared with the workers (see `get_authkey`).
+        context (dict): The evaluation context (see `init_worker`).
+        agent_paths (list): The agents to test.
+        task_timeout (float, optional): How long (in seconds) a group can run before being queued again. Defaults to
+            600.
+        max_attempts (int, optional): The number of times a group is dispatched before giving up. Defaults to 3.
+    """
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        authkey: bytes,
+        context: dict,
+        agent_paths: list,
+        task_timeout: float = 600,
+        max_attempts: int = 3,
+    ):
+        self.address = address
+        self.authkey = authkey
+        self.context = context
+        self.task_timeout = task_timeout
+        self.max_attempts = max_attempts
+        self.workers = set()
+        self.requeued_tasks = 0
+        # Pickled once, instead of once per worker process
+        self._worker_context = pickle.dumps(
+            (
+                self._make_worker_context(context, agent_paths),
+                {name: os.environ[name] for name in SHARED_ENV_VARIABLES if name in os.environ},
+            )
+        )
+        self._tasks = queue.Queue()
+        self._results = queue.Queue()
+        self._lock = threading.Lock()
+        # By task id: the group of samples, its attempts, and the start time and connection of its current attempt
+        self._in_flight = {}
+        self._task_ids = itertools.count()
+        self._closed = threading.Event()
+        self._listener = None
+
+    @staticmethod
+    def _make_worker_context(context: dict, agent_paths: list) -> dict:
+        worker_context = {key: value for key, value in context.items() if key not in ["pool_start_time"]}
+        worker_context.update({key: None for key in _LOCAL_CONTEXT_KEYS})
+        hints_db = context["hints_db"]
+        if hints_db.path is not None:
+            # Pickled by path otherwise, which only exists on this host
+            worker_context["hints_db"] = HintsIndex(
+                list(hints_db.hints),
+                np.array(hints_db.matrix),
+                scales=np.array(hints_db.scales) if hints_db.scales is not None else None,
+            )
+        worker_context["agent_digests"] = {agent_path: _source_digest(agent_path) for agent_path in agent_paths}
+        return worker_context
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self):
+        self._listener = Listener(self.address, authkey=self.authkey)
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def close(self):
+        """Stop serving: the connected workers are told to exit."""
+        self._closed.set()
+        if self._listener is not None:
+            self._listener.close()
+
+    def _accept(self):
+        while not self._closed.is_set():
+            try:
+                connection = self._listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                # The listener was closed, or the client failed the authentication
+                if self._closed.is_set():
+                    return
+                continue
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        task_id = None
+        try:
+            worker = connection.recv()
+            with self._lock:
+                self.workers.add(worker)
+            connection.send_bytes(self._worker_context)
+            while True:
+                message = connection.recv()
+                if message is not None:
+                    # The results of the previous task (the first message only asks for a task)
+                    self._complete(*message)
+                    task_id = None
+                task_id, group = self._next_task(connection)
+                if task_id is None:
+                    connection.send(None)
+                    return
+                connection.send((task_id, group))
+        except (OSError, EOFError):
+            # The worker is gone: its task (if any) is dispatched again
+            if task_id is not None:
+                self._retry(task_id, connection)
+        finally:
+            connection.close()
+
+    def _next_task(self, connection) -> tuple[int | None, list[tuple] | None]:
+        while not self._closed.is_set():
+            try:
+                task_id = self._tasks.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            with self._lock:
+                entry = self._in_flight.get(task_id)
+                if entry is None:
+                    # Completed by another worker in the meantime (after a timeout)
+                    continue
+                entry[2:] = [time.monotonic(), connection]
+            return task_id, entry[0]
+        return None, None
+
+    def _complete(self, task_id: int, results: list[dict]):
+        with self._lock:
+            # The late results of a task already completed by another worker are dropped
+            if self._in_flight.pop(task_id, None) is None:
+                return
+        self._results.put(results)
+
+    def _retry(self, task_id: int, connection=None, reason: str = "its worker disconnected"):
+        with self._lock:
+            entry = self._in_flight.get(task_id)
+            if entry is None or (connection is not None and entry[3] is not connection):
+                return
+            entry[1] += 1
+            if entry[1] < self.max_attempts:
+                entry[2:] = [None, None]
+                self.requeued_tasks += 1
+                self._tasks.put(task_id)
+                return
+            del self._in_flight[task_id]
+        group = entry[0]
+        agent_path, level, _ = group[0]
+        word_indices = ", ".join(str(word_index) for _, _, word_index in group)
+        print(
+            f"Samples of {agent_path} (level {level}, words {word_indices}) lost after {entry[1]} attempts ({reason}), "
+            "counted as agent errors"
+        )
+        self._results.put(
+            [
+                {
+                    "agent_path": agent_path,
+                    "level": level,
+                    "word_index": word_index,
+                    # Unknown, the agent may not have been loaded by any worker
+                    "agent_name": None,
+                    "outcomes": {model: "agent_error" for model in self.context["guesser_models"]},
+                    "execution_time": 0.0,
+                }
+                for _, _, word_index in group
+            ]
+        )
+
+    def _check_timeouts(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                task_id
+                for task_id, (_, _, start_time, _) in self._in_flight.items()
+                if start_time is not None and now - start_time > self.task_timeout
+            ]
+        for task_id in expired:
+            self._retry(task_id, reason=f"timed out after {self.task_timeout}s")
+
+    def imap_unordered(self, tasks: list[tuple]):
+        """Run the given (agent, level, word) tasks on the workers, yielding their results (in the format of
+        `run_sample_task`) in completion order."""
+        untested_tasks = []
+        for task in tasks:
+            stored_result = stored_sample_result(self.context, task)
+            if stored_result is not None:
+                yield stored_result
+            else:
+                untested_tasks.append(task)
+
+        pending = 0
+        for group in group_sample_tasks(untested_tasks, self.context["max_concurrency"] or 1):
+            task_id = next(self._task_ids)
+            with self._lock:
+                self._in_flight[task_id] = [group, 0, None, None]
+            self._tasks.put(task_id)
+            pending += 1
+
+        last_check = time.monotonic()
+        while pending:
+            if time.monotonic() - last_check > 1:
+                self._check_timeouts()
+                last_check = time.monotonic()
+            try:
+                results = self._results.get(timeout=1)
+            except queue.Empty:
+                continue
+            pending -= 1
+            for result in results:
+                store_sample_result(self.context, result)
+                yield result
+
+
+def run_worker(
+    address: tuple[str, int],
+    authkey: bytes,
+    processes: int = 1,
+    overrides: dict | None = None,
+    connect_timeout: float = 60,
+    max_restarts: int = 10,
+):
+    """Run `processes` worker processes pulling tasks from a `Coordinator`, until it is done.
+
+    A worker process that dies (e.g., killed by a crashing agent) is replaced, up to `max_restarts` times in total (so
+    a worker that can't run at all, e.g. failing to initialize, is not restarted forever): the coordinator queues its
+    task again. Since the host-local state of the coordinator is not shipped, the workers can use their own (e.g., a
+    response cache), given in `overrides` (context keys and values).
+    """
+    mp_context = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+
+    def start_process():
+        process = mp_context.Process(target=_worker_main, args=(address, authkey, overrides or {}, connect_timeout))
+        process.start()
+        return process
+
+    workers = [start_process() for _ in range(processes)]
+    restarts = 0
+    while workers:
+        time.sleep(0.2)
+        for process in [process for process in workers if process.exitcode is not None]:
+            workers.remove(process)
+            # A clean exit means there are no more tasks (or the coordinator is gone)
+            if process.exitcode == 0:
+                continue
+            if restarts >= max_restarts:
+                print(f"Worker process {process.pid} died (exit code {process.exitcode}), {max_restarts} restarts reached")
+                continue
+            restarts += 1
+            print(f"Worker process {process.pid} died (exit code {process.exitcode}), restarting it")
+            workers.append(start_process())
+
+
+def _connect(address: tuple[str, int], authkey: bytes, connect_timeout: float):
+    # The coordinator may not be listening yet
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        try:
+            return Client(address, authkey=authkey)
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+
+
+def _worker_main(address: tuple[str, int], authkey: bytes, overrides: dict, connect_timeout: float):
+    try:
+        connection = _connect(address, authkey, connect_timeout)
+    except (OSError, AuthenticationError) as e:
+        print(f"Could not connect to the coordinator at {address[0]}:{address[1]}: {e}")
+        return
+    try:
+        connection.send(f"{socket.gethostname()}:{os.getpid()}")
+        context, environment = connection.recv()
+        os.environ.update(environment)
+        init_worker(dict(context, **overrides))
+        mismatched_agents = {
+            agent_path
+            for agent_path, digest in context["agent_digests"].items()
+            if _source_digest(agent_path) != digest
+        }
+
+        message = None
+        while True:
+            connection.send(message)
+            request = connection.recv()
+            if request is None:
+                return
+            task_id, group = request
+            agent_path = group[0][0]
+            if agent_path in mismatched_agents:
+                error = RuntimeError(f"The source of {agent_path} differs on worker host {socket.gethostname()}")
+                results = [
+                    {"agent_path": agent_path, "level": level, "word_index": word_index, "error": error}
+                    for _, level, word_index in group
+                ]
+            else:
+                results = run_sample_group_task(group)
+            message = (task_id, [_picklable_result(result) for result in results])
+    except (OSError, EOFError):
+        # The coordinator is gone
+        return
+    except Exception:
+        traceback.print_exc()
+        raise
+    finally:
+        connection.close()
+
+
+def _picklable_result(result: dict) -> dict:
+    # Errors that can't be rebuilt by the coordinator (e.g., with extra constructor arguments) are sent as text
+    error = result.get("error")
+    if error is not None:
+        try:
+            pickle.loads(pickle.dumps(error))
+        except Exception:
+            result = dict(result, error=RuntimeError(f"{type(error).__name__}: {error}"))
+    return result
@@ -0,0 +1,129 @@
+import random
+from collections.abc import Iterator
+
+from core.tester import new_results_by_level, score_interval
+
+
+class EarlyStopping:
+    """Adaptive evaluation: the agents are tested on the words in rounds, in a random order, and an agent stops being
+    tested as soon as its position in the ranking is settled.
+
+    After each round, the score each agent would get on all the words is estimated with a confidence interval (see
+    `score_interval`). The position of an agent is settled when its interval doesn't overlap the interval of any other
+    agent or, with `top_k`, when it is certainly in (or certainly out of) the top k. The intervals of the stopped
+    agents are kept, so the agents still tested are compared with them too.
+
+    The confidence is the one of the whole evaluation: every agent is checked after every round, so the intervals are
+    computed at the Bonferroni-corrected `interval_confidence`, with the error rate split over all the agents and
+    all the rounds where they can be stopped.
+
+    Args:
+        agent_paths (list): The agents to test.
+        levels (list[int]): The levels to test.
+        num_words (int): The number of words (of each level).
+        confidence (float, optional): The confidence that no interval misses its score. Defaults to 0.95.
+        min_words (int, optional): The number of words tested (at each level) before any agent is stopped. Defaults to 20.
+        round_words (int, optional): The number of words tested (at each level) in each round. Defaults to 10.
+        top_k (int, optional): If set, only settle whether each agent is in the top k (not its exact position).
+            Defaults to None.
+        seed (int, optional): The seed of the order of the words. Defaults to 0.
+    """
+
+    def __init__(
+        self,
+        agent_paths: list,
+        levels: list[int],
+        num_words: int,
+        confidence: float = 0.95,
+        min_words: int = 20,
+        round_words: int = 10,
+        top_k: int | None = None,
+        seed: int = 0,
+    ):
+        self.levels = levels
+        self.num_words = num_words
+        self.confidence = confidence
+        self.min_words = min_words
+        self.round_words = round_words
+        self.top_k = top_k
+        self.word_order = list(range(num_words))
+        random.Random(seed).shuffle(self.word_order)
+        self.active = list(agent_paths)
+        self.stopped = set()
+        self._results = {agent_path: new_results_by_level(levels) for agent_path in agent_paths}
+        self._failed = set()
+        self._tested_words = 0
+        self.interval_confidence = 1 - (1 - confidence) / (max(1, len(agent_paths)) * self.num_checks())
+
+    def num_checks(self) -> int:
+        """The number of rounds after which the agents are checked (at most, they can all stop before)."""
+        checked_words = range(self.round_words, self.num_words, self.round_words)
+        return max(1, sum(words >= self.min_words for words in checked_words))
+
+    def rounds(self) -> Iterator[list[int]]:
+        """Yield the word indices of each round (to test with the agents still `active`), settling the agents after
+        each round. Stops once all the words are tested, or no agent is active anymore."""
+        while self._tested_words < self.num_words and self.active:
+            word_indices = self.word_order[self._tested_words : self._tested_words + self.round_words]
+            yield word_indices
+            self._tested_words += len(word_indices)
+            # The agents still active after the last round were tested on every word, they didn't stop early
+            if self._tested_words < self.num_words:
+                self.settle()
+
+    def update(self, sample_result: dict):
+        """Count the outcome of a sample result of `run_sample_task` (of the first guesser model, in a sweep)."""
+        agent_path = sample_result["agent_path"]
+        if "error" in sample_result:
+            # An agent that can't be loaded has no position to settle
+            self._failed.add(agent_path)
+            return
+        outcome = next(iter(sample_result["outcomes"].values()))
+        self._results[agent_path][sample_result["level"]][outcome] += 1
+
+    def intervals(self) -> dict:
+        """Return the `(estimate, low, high)` score interval of each agent (except the ones that failed to load), at
+        the corrected `interval_confidence`."""
+        return {
+            agent_path: score_interval(results, self.num_words, self.interval_confidence)
+            for agent_path, results in self._results.items()
+            if agent_path not in self._failed
+        }
+
+    def settle(self) -> list:
+        """Stop testing the agents whose position is settled (and the ones that failed to load), and return them."""
+        settled = [agent_path for agent_path in self.active if agent_path in self._failed]
+        if self._tested_words >= min(self.min_words, self.num_words):
+            intervals = self.intervals()
+            settled += [
+                agent_path
+                for agent_path in self.active
+                if agent_path in intervals and self._is_settled(agent_path, intervals)
+            ]
+        self.active = [agent_path for agent_path in self.active if agent_path not in settled]
+        self.stopped.update(agent_path for agent_path in settled if agent_path not in self._failed)
+        return settled
+
+    def _is_settled(self, agent_path, intervals: dict) -> bool:
+        _, low, high = intervals[agent_path]
+        above, overlapping = 0, 0
+        for other_path, (_, other_low, other_high) in intervals.items():
+            if other_path == agent_path:
+                continue
+            if other_low > high:
+                above += 1
+            elif other_high >= low:
+                overlapping += 1
+        if self.top_k is None:
+            return overlapping == 0
+        # Certainly out of the top k, or certainly in it
+        return above >= self.top_k or above + overlapping < self.top_k
+
+    def remaining_samples(self) -> int:
+        """The number of samples left to test (at most, agents can stop before), including the current round."""
+        return len(self.active) * len(self.levels) * (self.num_words - self._tested_words)
+
+    def tested_samples(self) -> int:
+        return sum(
+            sum(results.values()) for level_results in self._results.values() for results in level_results.values()
+        )
@@ -10,3 +10,11 @@ class GuesserError(Exception):
         self.message = message
         self.original_error = original_error
         super().__init__(self.message)
+
+
+class CacheMissError(Exception):
+    """Raised by a replay-only response cache when a request is not already cached."""
+
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(self.message)
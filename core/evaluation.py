@@ -0,0 +1,265 @@
+import os
+import time
+from argparse import Namespace
+
+from tqdm import tqdm
+
+from core.cache import OFFICIAL_ENV_VARIABLE, official_mode
+from core.distributed import AUTHKEY_ENV_VARIABLE, Coordinator
+from core.early_stopping import EarlyStopping
+from core.scheduler import (
+    SampleResultsMerger,
+    group_sample_tasks,
+    init_worker,
+    make_sample_tasks,
+    run_agent_task,
+    run_sample_group_task,
+)
+from core.streaming import JSONLWriter, agent_record, sample_record
+from core.tester import add_confidence_intervals
+
+# Options whose state lives in files of the coordinator host, which its workers can't share
+_HOST_LOCAL_OPTIONS = [
+    "cache_path",
+    "embedding_cache_path",
+    "guess_cache_path",
+    "requests_per_minute",
+    "tokens_per_minute",
+    "trace_path",
+    "profile_dir",
+]
+
+
+def _option(name: str) -> str:
+    return "--" + name.replace("_", "-")
+
+
+def check_options(args: Namespace):
+    """Check the options of `scripts/test_solutions.py` and their combinations, before loading any data.
+
+    Raises:
+        ValueError: If an option is invalid, or not supported with the other options.
+    """
+    if (args.coordinator is not None or args.worker is not None) and not os.environ.get(AUTHKEY_ENV_VARIABLE):
+        raise ValueError(
+            f"--coordinator and --worker require the {AUTHKEY_ENV_VARIABLE} env variable (a shared secret)"
+        )
+    if args.worker_max_restarts < 0:
+        raise ValueError("--worker-max-restarts must be non-negative")
+    if not 0 <= args.shard_index < args.num_shards:
+        raise ValueError("--shard-index must be between 0 and --num-shards - 1")
+    if args.sample_fraction is not None and not 0 < args.sample_fraction <= 1:
+        raise ValueError("--sample-fraction must be in (0, 1]")
+    if args.cache_replay_only and args.cache_path is None:
+        raise ValueError("--cache-replay-only requires --cache-path")
+    if args.guess_cache_path is not None:
+        if official_mode():
+            raise ValueError(
+                f"--guess-cache-path is not allowed in official scoring mode (--official or {OFFICIAL_ENV_VARIABLE})"
+            )
+        if not 0 < args.guess_cache_threshold <= 1:
+            raise ValueError("--guess-cache-threshold must be in (0, 1]")
+    if args.max_retries is not None and args.max_retries < 0:
+        raise ValueError("--max-retries must be non-negative")
+    if args.hedge_percentile is not None and not 0 < args.hedge_percentile < 100:
+        raise ValueError("--hedge-percentile must be between 0 and 100")
+    if args.max_concurrency is not None and args.max_concurrency < 1:
+        raise ValueError("--max-concurrency must be positive")
+    if args.guesser_batch_size is not None:
+        if args.max_concurrency is None:
+            raise ValueError("--guesser-batch-size requires --max-concurrency")
+        if args.guesser_batch_size < 1:
+            raise ValueError("--guesser-batch-size must be positive")
+        if official_mode():
+            raise ValueError(
+                f"--guesser-batch-size is not allowed in official scoring mode (--official or {OFFICIAL_ENV_VARIABLE})"
+            )
+    if args.coordinator is not None:
+        if args.scheduler != "sample":
+            raise ValueError("--coordinator requires --scheduler sample")
+        for name in _HOST_LOCAL_OPTIONS:
+            if getattr(args, name) is not None:
+                raise ValueError(
+                    f"{_option(name)} is not supported with --coordinator (caches can be set on each --worker)"
+                )
+    if args.adaptive and args.scheduler != "sample":
+        raise ValueError("--adaptive requires --scheduler sample")
+    if not 0 < args.adaptive_confidence < 1:
+        raise ValueError("--adaptive-confidence must be in (0, 1)")
+    if args.adaptive_round_words < 1:
+        raise ValueError("--adaptive-round-words must be positive")
+    resource_limits = [args.agent_max_memory_mb, args.agent_max_cpu_seconds, args.agent_max_open_files]
+    if any(limit is not None for limit in resource_limits) and not args.isolate_agents:
+        raise ValueError(
+            "--agent-max-memory-mb, --agent-max-cpu-seconds and --agent-max-open-files require --isolate-agents"
+        )
+
+
+def _write_agent_records(results_stream: JSONLWriter, result, guesser_models: list[str]):
+    agent_path, agent_result = result if isinstance(result, tuple) else (result["agent_path"], result)
+    for guesser_model in guesser_models:
+        if isinstance(agent_result, dict) and "sweep" in agent_result:
+            results_stream.write(agent_record(agent_path, agent_result["sweep"][guesser_model], guesser_model))
+        else:
+            results_stream.write(agent_record(agent_path, agent_result, guesser_model))
+
+
+def run_agents(context: dict, agent_paths: list, mp_context, max_workers: int, chunksize: int | None = None):
+    """Test the agents in a pool of worker processes, with one task per agent (see `run_agent_task`).
+
+    The result of each agent is streamed to the `results_stream` of the context as soon as the agent is done.
+
+    Args:
+        context (dict): The evaluation context (see `init_worker`).
+        agent_paths (list): The agents to test.
+        mp_context: The multiprocessing context starting the worker processes.
+        max_workers (int): The maximum number of worker processes.
+        chunksize (int, optional): The number of agents submitted to a worker at a time. Defaults to None.
+
+    Returns:
+        tuple: The results of the agents (in completion order, in the format of `test_solution`) and the startup time
+            of each worker process (by pid).
+    """
+    tasks = list(enumerate(agent_paths))
+    processes = max(1, min(max_workers, len(tasks)))
+    if chunksize is not None:
+        chunksize = min(chunksize, len(tasks) // processes + 1)
+    results, worker_startups = [], {}
+    context["pool_start_time"] = time.time()
+    with mp_context.Manager() as manager, mp_context.Pool(
+        processes=processes, initializer=init_worker, initargs=(context, manager.Lock())
+    ) as pool:
+        for result in pool.imap_unordered(run_agent_task, tasks, chunksize=chunksize or 1):
+            results.append(result)
+            if isinstance(result, dict):
+                worker_startups.update(result.pop("worker_startup", {}))
+            if context["results_stream"] is not None:
+                _write_agent_records(context["results_stream"], result, context["guesser_models"])
+
+    # Only if the progress bars were shown, leave some space
+    if not context["verbose"]:
+        print("\n" * len(tasks))
+    return results, worker_startups
+
+
+def run_samples(
+    context: dict,
+    agent_paths: list,
+    mp_context,
+    max_workers: int,
+    chunksize: int | None = None,
+    coordinator: Coordinator | None = None,
+    early_stopping: EarlyStopping | None = None,
+):
+    """Test the agents with one task per (agent, level, word) unit, dispatched to whichever worker is free.
+
+    The units are tested in a pool of worker processes, or by the workers of a `Coordinator`. With `max_concurrency`
+    in the context, the units of each agent and level are dispatched in groups of this size, kept in flight together
+    (see `group_sample_tasks`). Each sample is streamed to the `results_stream` of the context as soon as it is done,
+    and so is each agent once all of its samples are. With `early_stopping`, the words are tested in rounds, each one
+    with the agents still active after the previous one, and the scores are reported with their confidence intervals.
+
+    Args:
+        context (dict): The evaluation context (see `init_worker`).
+        agent_paths (list): The agents to test.
+        mp_context: The multiprocessing context starting the worker processes (unless there is a `coordinator`).
+        max_workers (int): The maximum number of worker processes (unless there is a `coordinator`).
+        chunksize (int, optional): The number of groups submitted to a worker at a time. Defaults to None.
+        coordinator (Coordinator, optional): If set, the coordinator serving the units to its workers, instead of a
+            local pool. Defaults to None.
+        early_stopping (EarlyStopping, optional): If set, the adaptive evaluation of the agents. Defaults to None.
+
+    Returns:
+        tuple: The results of the agents (in the order of `agent_paths`, in the format of `test_solution`) and the
+            startup time of each worker process (by pid).
+    """
+    levels, test_list, results_stream = context["levels"], context["test_list"], context["results_stream"]
+    sample_tasks = make_sample_tasks(agent_paths, levels=levels, num_words=len(test_list))
+    group_size = context["max_concurrency"] or 1
+    merger = SampleResultsMerger(
+        agent_paths, levels=levels, test_list=test_list, guesser_models=context["guesser_models"]
+    )
+    # The result of each agent, once all of its samples are merged
+    agent_results, worker_startups = {}, {}
+
+    def complete_agent(agent_path):
+        result = agent_results[agent_path] = merger.result(agent_path)
+        if early_stopping is not None and isinstance(result, dict):
+            # The scores are estimated on all the words, from the samples tested before the agent was stopped
+            add_confidence_intervals(result, len(test_list), confidence=early_stopping.confidence)
+            result["stopped_early"] = agent_path in early_stopping.stopped
+        if results_stream is not None:
+            _write_agent_records(results_stream, result, context["guesser_models"])
+
+    def add_sample_result(sample_result):
+        worker_startups.update(sample_result.pop("worker_startup", {}))
+        if results_stream is not None and "outcomes" in sample_result:
+            for guesser_model, outcome in sample_result["outcomes"].items():
+                results_stream.write(
+                    sample_record(
+                        sample_result["agent_path"],
+                        sample_result["agent_name"],
+                        sample_result["level"],
+                        test_list[sample_result["word_index"]][0],
+                        outcome,
+                        sample_result["execution_time"],
+                        sample_result.get("reused", False),
+                        guesser_model,
+                    )
+                )
+        merger.add(sample_result)
+        agent_path = sample_result["agent_path"]
+        if merger.num_samples(agent_path) == len(levels) * len(test_list):
+            complete_agent(agent_path)
+
+    context["pool_start_time"] = time.time()
+    if coordinator is None:
+        processes = max(1, min(max_workers, len(group_sample_tasks(sample_tasks, group_size))))
+        pool = mp_context.Pool(processes=processes, initializer=init_worker, initargs=(context,))
+    else:
+        pool = coordinator
+    with pool:
+
+        def run_tasks(tasks):
+            if coordinator is not None:
+                yield from coordinator.imap_unordered(tasks)
+                return
+            groups = group_sample_tasks(tasks, group_size)
+            for group_results in pool.imap_unordered(run_sample_group_task, groups, chunksize=chunksize or 1):
+                yield from group_results
+
+        progress_bar = tqdm(total=len(sample_tasks), colour="#872452", disable=context["verbose"])
+        if early_stopping is None:
+            for sample_result in run_tasks(sample_tasks):
+                add_sample_result(sample_result)
+                progress_bar.update()
+        else:
+            # Each round is only submitted once the previous one is done, to the agents still being tested
+            for word_indices in early_stopping.rounds():
+                # The agents stopped after the previous round are done
+                for agent_path in agent_paths:
+                    if agent_path not in early_stopping.active and agent_path not in agent_results:
+                        complete_agent(agent_path)
+                # The samples of the stopped agents are never tested
+                progress_bar.total = progress_bar.n + early_stopping.remaining_samples()
+                progress_bar.refresh()
+                round_tasks = make_sample_tasks(
+                    early_stopping.active, levels=levels, num_words=len(test_list), word_indices=word_indices
+                )
+                for sample_result in run_tasks(round_tasks):
+                    early_stopping.update(sample_result)
+                    add_sample_result(sample_result)
+                    progress_bar.update()
+            # The rounds end early once every agent is stopped
+            progress_bar.total = progress_bar.n
+            progress_bar.refresh()
+        progress_bar.close()
+
+        for agent_path in agent_paths:
+            if agent_path not in agent_results:
+                complete_agent(agent_path)
+        if context["profiler"] is not None and coordinator is None:
+            # The workers write the profiles of their agents when exiting, so they must not be terminated
+            pool.close()
+            pool.join()
+    return [agent_results[agent_path] for agent_path in agent_paths], worker_startups
@@ -1,4 +1,8 @@
-from core.answer_generation import LLM
+import asyncio
+import json
+
+from core.answer_generation import LLM, is_error_answer
+from core.cache import GuessCache, official_mode
 
 
 class Guesser:
@@ -13,3 +17,227 @@ class Guesser:
         guess = self.llm.generate_answer(prompt=prompt)
         guess = guess.strip().lower()
         return guess
+
+    async def aget_guess(self, hint):
+        """Async counterpart of `get_guess`, requires the guesser to be backed by an `AsyncLLM`."""
+        prompt = self.create_prompt_guess(hint=hint)
+        guess = await self.llm.agenerate_answer(prompt=prompt)
+        guess = guess.strip().lower()
+        return guess
+
+
+class BatchedGuesser(Guesser):
+    """Guesser answering many independent hints with a single (JSON mode) request.
+
+    `get_guesses` packs the hints in batches of `batch_size`, and maps the answers back to the hints by their id. With
+    the asyncio engine, `aget_guess` collects the hints of the samples in flight, and sends them together as soon as
+    `batch_size` of them are waiting, or `max_wait` seconds after the first one. Hints whose answer is missing or
+    can't be parsed (e.g., on API errors) fall back to the per-hint path, so a malformed answer never turns into a
+    wrong guess. Use `guesser_parity` to check that batching doesn't change the guesses of a given model.
+
+    The hints of different samples share a prompt, so a hint can leak the answer of another one: only hints that
+    passed `check_hint` must be batched (the tester only guesses those), and batching is a development-only mode,
+    refused in official scoring mode (see `official_mode`).
+
+    Args:
+        llm (LLM): The LLM used to generate the guesses (an `AsyncLLM` to use `aget_guess`).
+        batch_size (int, optional): The maximum number of hints sent in a single request. Defaults to 16.
+        max_wait (float, optional): How long (in seconds) `aget_guess` waits for a batch to fill up. Defaults to 0.05.
+    """
+
+    def __init__(self, llm: LLM, batch_size: int = 16, max_wait: float = 0.05):
+        if official_mode():
+            raise RuntimeError("The batched guesser is disabled in official scoring mode")
+        super().__init__(llm)
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self.fallbacks = 0
+        self._pending = []
+        self._flush_handle = None
+        self._tasks = set()
+
+    def create_prompt_batch(self, hints: list[str]) -> str:
+        items = json.dumps([{"id": i, "hint": hint} for i, hint in enumerate(hints)], ensure_ascii=False)
+        return (
+            "Guess a single word for each of the following independent hints. Respond only with a JSON object "
+            'like {"guesses": {"<id>": "<guess>"}}, with one guess for each id. Don\'t use punctuation or articles '
+            f"in the guesses.\nHints: {items}"
+        )
+
+    def _max_completion_tokens(self, num_hints: int) -> int:
+        # Enough for a short guess and the JSON punctuation around it, for every hint
+        return 50 + 20 * num_hints
+
+    @staticmethod
+    def _parse_guesses(answer: str, num_hints: int) -> list[str | None]:
+        """Map a batched answer back to the hints, returning None for the hints without a valid guess."""
+        try:
+            guesses = json.loads(answer)["guesses"]
+        except (json.JSONDecodeError, KeyError, TypeError):
+            return [None] * num_hints
+        if not isinstance(guesses, dict):
+            return [None] * num_hints
+
+        parsed = []
+        for i in range(num_hints):
+            guess = guesses.get(str(i))
+            parsed.append(guess.strip().lower() if isinstance(guess, str) else None)
+        return parsed
+
+    def get_guesses(self, hints: list[str]) -> list[str]:
+        """Guess the words of many hints, in batches of `batch_size` (returns one guess per hint, in order)."""
+        guesses = []
+        for start in range(0, len(hints), self.batch_size):
+            batch = hints[start : start + self.batch_size]
+            self.batches += 1
+            answer = self.llm.generate_json_answer(
+                prompt=self.create_prompt_batch(batch), max_completion_tokens=self._max_completion_tokens(len(batch))
+            )
+            for hint, guess in zip(batch, self._parse_guesses(answer, len(batch))):
+                if guess is None:
+                    self.fallbacks += 1
+                    guess = super().get_guess(hint)
+                guesses.append(guess)
+        return guesses
+
+    async def aget_guesses(self, hints: list[str]) -> list[str]:
+        """Async counterpart of `get_guesses`."""
+        guesses = []
+        for start in range(0, len(hints), self.batch_size):
+            batch = hints[start : start + self.batch_size]
+            self.batches += 1
+            answer = await self.llm.agenerate_json_answer(
+                prompt=self.create_prompt_batch(batch), max_completion_tokens=self._max_completion_tokens(len(batch))
+            )
+            parsed = self._parse_guesses(answer, len(batch))
+            missing = [i for i, guess in enumerate(parsed) if guess is None]
+            self.fallbacks += len(missing)
+            fallback_guesses = await asyncio.gather(
+                *(super(BatchedGuesser, self).aget_guess(batch[i]) for i in missing)
+            )
+            for i, guess in zip(missing, fallback_guesses):
+                parsed[i] = guess
+            guesses.extend(parsed)
+        return guesses
+
+    async def aget_guess(self, hint):
+        """Guess the word of a hint, batched with the other hints waiting at the same time."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((hint, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if pending:
+            # Keep a reference to the task, the event loop only holds weak ones
+            task = asyncio.ensure_future(self._answer_pending(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _answer_pending(self, pending: list):
+        try:
+            guesses = await self.aget_guesses([hint for hint, _ in pending])
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), guess in zip(pending, guesses):
+            if not future.done():
+                future.set_result(guess)
+
+
+class CachedGuesser:
+    """Wraps a guesser with a `GuessCache` (development runs only): hints with the same normalized text, or close
+    enough embeddings, as a hint already guessed by the same model get its guess instead of a new request.
+
+    The hint embeddings are computed with the LLM of the guesser (so they go through its embedding cache, if any). If
+    the embedding of a hint fails, only the exact lookup is used for it. Like the response cache, only successful
+    guesses are cached: the error string of a failed request is returned, and the hint is guessed again next time.
+
+    Args:
+        guesser (Guesser): The guesser answering the cache misses.
+        cache (GuessCache): The guess cache.
+    """
+
+    def __init__(self, guesser: Guesser, cache: GuessCache):
+        self.guesser = guesser
+        self.cache = cache
+
+    def _embed(self, hint: str) -> list[float] | None:
+        try:
+            return self.guesser.llm.embed_text(GuessCache.normalize_hint(hint))
+        except Exception:
+            return None
+
+    def get_guess(self, hint):
+        model_name = self.guesser.llm.model_name
+        guess = self.cache.get_exact(model_name, hint)
+        if guess is not None:
+            return guess
+        embedding = self._embed(hint)
+        guess = self.cache.get_similar(model_name, embedding)
+        if guess is None:
+            guess = self.guesser.get_guess(hint)
+            if not is_error_answer(guess):
+                self.cache.put(model_name, hint, guess, embedding)
+        return guess
+
+    async def aget_guess(self, hint):
+        """Async counterpart of `get_guess` (the embedding request runs in a worker thread)."""
+        model_name = self.guesser.llm.model_name
+        guess = self.cache.get_exact(model_name, hint)
+        if guess is not None:
+            return guess
+        embedding = await asyncio.to_thread(self._embed, hint)
+        guess = self.cache.get_similar(model_name, embedding)
+        if guess is None:
+            guess = await self.guesser.aget_guess(hint)
+            if not is_error_answer(guess):
+                self.cache.put(model_name, hint, guess, embedding)
+        return guess
+
+    def __getattr__(self, name):
+        return getattr(self.guesser, name)
+
+
+def guesser_parity(
+    guesser: Guesser, batched_guesser: BatchedGuesser, hints: list[str], targets: list[str] | None = None
+) -> dict:
+    """Compare the guesses of the per-hint and batched paths on the same hints.
+
+    Args:
+        guesser (Guesser): The per-hint guesser.
+        batched_guesser (BatchedGuesser): The batched guesser.
+        hints (list[str]): The hints to guess.
+        targets (list[str], optional): The words to guess, to also compare the accuracy of the two paths. Defaults to None.
+
+    Returns:
+        dict: The `agreement` rate of the two paths, the `single_guesses` and `batched_guesses`, the number of
+            `batches` and `fallbacks` (hints answered by the per-hint path) of the batched guesser and, if targets are
+            given, the `single_accuracy` and `batched_accuracy`.
+    """
+    batches, fallbacks = batched_guesser.batches, batched_guesser.fallbacks
+    single_guesses = [guesser.get_guess(hint) for hint in hints]
+    batched_guesses = batched_guesser.get_guesses(hints)
+    agreement = sum(single == batched for single, batched in zip(single_guesses, batched_guesses))
+    parity = {
+        "agreement": agreement / max(1, len(hints)),
+        "single_guesses": single_guesses,
+        "batched_guesses": batched_guesses,
+        "batches": batched_guesser.batches - batches,
+        "fallbacks": batched_guesser.fallbacks - fallbacks,
+    }
+    if targets is not None:
+        targets = [target.lower() for target in targets]
+        parity["single_accuracy"] = sum(map(str.__eq__, single_guesses, targets)) / max(1, len(hints))
+        parity["batched_accuracy"] = sum(map(str.__eq__, batched_guesses, targets)) / max(1, len(hints))
+    return parity
@@ -0,0 +1,225 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from core.tracing import PERCENTILES, set_trace_attributes
+
+
+class HedgingPolicy:
+    """Hedged completion requests: if a request is still running after a given percentile of the recently observed
+    latencies, a duplicate is sent, the first successful answer is used and the other request is dropped.
+
+    Hedging only starts once `min_samples` latencies have been observed, and the duplicates are capped to a fraction
+    of the requests, so a slow endpoint can't double the load. With the asyncio engine the losing request is
+    cancelled; the synchronous client can't abort a request in flight, so with it the loser runs to completion in
+    the background and its answer is discarded. Like the retry policy, a policy can be pickled into worker
+    processes (each of which keeps its own latency window and budget).
+
+    Args:
+        percentile (float, optional): The percentile of the recent latencies after which a request is hedged. Defaults to 95.
+        max_hedge_ratio (float, optional): The maximum number of hedges, as a fraction of the requests. Defaults to 0.05.
+        min_samples (int, optional): The number of latencies to observe before hedging. Defaults to 20.
+        window (int, optional): The number of recent latencies the percentile is computed on. Defaults to 500.
+        min_delay (float, optional): The minimum delay (in seconds) before hedging a request. Defaults to 0.1.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95,
+        max_hedge_ratio: float = 0.05,
+        min_samples: int = 20,
+        window: int = 500,
+        min_delay: float = 0.1,
+    ):
+        self.percentile = percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_samples = min_samples
+        self.window = window
+        self.min_delay = min_delay
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._executor = None
+        self._pid = None
+        # Lifetime counters, used for the budget
+        self._requests = 0
+        self._hedges = 0
+        self._reset_stats()
+
+    def __getstate__(self):
+        return {
+            "percentile": self.percentile,
+            "max_hedge_ratio": self.max_hedge_ratio,
+            "min_samples": self.min_samples,
+            "window": self.window,
+            "min_delay": self.min_delay,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _reset_stats(self):
+        self._stats = {"requests": 0, "hedges": 0, "hedge_wins": 0, "over_budget": 0}
+        self._request_latencies = []
+        self._unhedged_latencies = []
+
+    def collect_stats(self) -> dict:
+        """Return the stats since the last call (see `merge_hedging_stats`), and reset them."""
+        with self._lock:
+            stats = dict(
+                self._stats, latencies=self._request_latencies, unhedged_latencies=self._unhedged_latencies
+            )
+            self._reset_stats()
+        return stats
+
+    def _start_request(self) -> float | None:
+        """Count a new request, and return how long to wait before hedging it (None to never hedge it)."""
+        with self._lock:
+            self._requests += 1
+            self._stats["requests"] += 1
+            if not self._latencies or len(self._latencies) < self.min_samples:
+                return None
+            return max(self.min_delay, float(np.percentile(self._latencies, self.percentile)))
+
+    def _acquire_hedge(self) -> bool:
+        with self._lock:
+            if self._hedges + 1 > self.max_hedge_ratio * self._requests:
+                self._stats["over_budget"] += 1
+                return False
+            self._hedges += 1
+            self._stats["hedges"] += 1
+            return True
+
+    def _record(self, latency: float, hedge_won: bool = False):
+        with self._lock:
+            self._latencies.append(latency)
+            self._request_latencies.append(latency)
+            self._stats["hedge_wins"] += hedge_won
+
+    def _record_unhedged(self, latency: float):
+        with self._lock:
+            self._unhedged_latencies.append(latency)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Threads don't survive a fork, so every process needs its own pool
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=256, thread_name_prefix="hedging")
+            self._pid = os.getpid()
+        return self._executor
+
+    def run(self, call, span=None):
+        """Call `call` (a function sending a request), hedging it if it's too slow. Returns the first answer.
+
+        If both requests fail, the error of the first one is raised. Whether the request was hedged (and the hedge
+        answered first) is added to `span`, if given.
+        """
+        delay = self._start_request()
+        start = time.perf_counter()
+        if delay is None:
+            try:
+                return call()
+            finally:
+                self._record(time.perf_counter() - start)
+                self._record_unhedged(time.perf_counter() - start)
+
+        executor = self._get_executor()
+        # Copy the context, so the requests are traced with the attributes of the caller
+        primary = executor.submit(contextvars.copy_context().run, call)
+        primary.add_done_callback(lambda _: self._record_unhedged(time.perf_counter() - start))
+        if not wait([primary], timeout=delay).done and self._acquire_hedge():
+            hedge_context = contextvars.copy_context()
+            hedge_context.run(set_trace_attributes, hedge=True)
+            hedge = executor.submit(hedge_context.run, call)
+            pending, winner = {primary, hedge}, None
+            while pending and winner is None:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                winner = next((future for future in done if future.exception() is None), None)
+            for future in pending:
+                future.cancel()
+            self._record(time.perf_counter() - start, hedge_won=winner is hedge)
+            if span is not None:
+                span.set(hedged=True, hedge_won=winner is hedge)
+            return (winner or primary).result()
+
+        try:
+            return primary.result()
+        finally:
+            self._record(time.perf_counter() - start)
+
+    async def arun(self, call, span=None):
+        """Async counterpart of `run`, where `call` returns a coroutine. The losing request is cancelled.
+
+        The latency the request would have had without hedging is unknown when the first request is cancelled, so
+        the time it ran for (a lower bound) is used in the stats instead.
+        """
+        delay = self._start_request()
+        start = time.perf_counter()
+        if delay is None:
+            try:
+                return await call()
+            finally:
+                self._record(time.perf_counter() - start)
+                self._record_unhedged(time.perf_counter() - start)
+
+        async def hedge_call():
+            # Tasks run in a copy of the context, so this only marks the spans of the hedge
+            set_trace_attributes(hedge=True)
+            return await call()
+
+        primary = asyncio.ensure_future(call())
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and self._acquire_hedge():
+                hedge = asyncio.ensure_future(hedge_call())
+                tasks.add(hedge)
+                pending, winner = set(tasks), None
+                while pending and winner is None:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    winner = next((task for task in done if task.exception() is None), None)
+                latency = time.perf_counter() - start
+                self._record(latency, hedge_won=winner is hedge)
+                self._record_unhedged(latency)
+                if span is not None:
+                    span.set(hedged=True, hedge_won=winner is hedge)
+                return (winner or primary).result()
+
+            try:
+                return await primary
+            finally:
+                self._record(time.perf_counter() - start)
+                self._record_unhedged(time.perf_counter() - start)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def merge_hedging_stats(stats: Iterable[dict]) -> dict:
+    """Merge the stats collected by `HedgingPolicy.collect_stats` (e.g., by different agents or processes)."""
+    merged = {"requests": 0, "hedges": 0, "hedge_wins": 0, "over_budget": 0, "latencies": [], "unhedged_latencies": []}
+    for el in stats:
+        for key, value in el.items():
+            merged[key] += value
+    return merged
+
+
+def summarize_hedging(stats: dict) -> dict:
+    """Compute the hedge rate and the latency percentiles with and without hedging from (merged) hedging stats.
+
+    Returns:
+        dict: The number of `requests`, `hedges`, `hedge_wins` (hedges answering first) and `over_budget` (requests
+            not hedged because of the budget), the `hedge_rate`, and the `p50`/`p95`/`p99` latencies of the requests
+            (`latency`) and of their first request alone (`unhedged_latency`), in seconds.
+    """
+    summary = {key: stats[key] for key in ["requests", "hedges", "hedge_wins", "over_budget"]}
+    summary["hedge_rate"] = stats["hedges"] / max(1, stats["requests"])
+    for key, latencies in [("latency", stats["latencies"]), ("unhedged_latency", stats["unhedged_latencies"])]:
+        values = np.percentile(latencies, PERCENTILES) if latencies else [0.0] * len(PERCENTILES)
+        summary[key] = {f"p{percentile}": float(value) for percentile, value in zip(PERCENTILES, values)}
+    return summary
@@ -0,0 +1,209 @@
+import cProfile
+import json
+import os
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+repo_root_folder = Path(__file__).parent.parent
+
+# Subfolder of the profiles folder where each process writes its own profiles, merged by `merge_profiles`
+WORKERS_SUBFOLDER = "workers"
+
+
+class AgentProfiler:
+    """Opt-in profiling of the agents: the deterministic profile (cProfile) of their calls, and their top allocation
+    sites (tracemalloc).
+
+    The loading of the agents (the import of their module included) and their `get_hint` calls are profiled (see
+    `ProfiledAgent`), in the thread running them. Each process collects its own profiles and writes them with `dump`
+    (one `.prof` file and one allocations file per agent and process), then `merge_profiles` aggregates them into one
+    of each per agent. Like the tracer, a profiler can be pickled into worker processes (by folder).
+
+    The allocation sites are the lines that allocated the memory still held at the time of the dump by code called
+    from the agent module (i.e., what the agent keeps in memory, like an index or a model).
+
+    Args:
+        folder (str | Path): The folder where the profiles are written.
+        top_allocations (int, optional): The number of allocation sites kept per agent. Defaults to 20.
+        traceback_frames (int, optional): The number of frames stored by tracemalloc per allocation. Defaults to 10.
+    """
+
+    def __init__(self, folder: str | Path, top_allocations: int = 20, traceback_frames: int = 10):
+        self.folder = str(folder)
+        self.top_allocations = top_allocations
+        self.traceback_frames = traceback_frames
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._calls = {}
+        self._module_paths = {}
+
+    def __getstate__(self):
+        return {
+            "folder": self.folder,
+            "top_allocations": self.top_allocations,
+            "traceback_frames": self.traceback_frames,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @contextmanager
+    def profile(self, module_path: str, count_call: bool = False):
+        """Profile the code run (in the current thread) inside the `with` block, as part of the given agent."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.traceback_frames)
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            key = Path(module_path).stem
+            with self._lock:
+                self._module_paths[key] = module_path
+                self._calls[key] = self._calls.get(key, 0) + count_call
+                if key in self._stats:
+                    self._stats[key].add(profile)
+                else:
+                    self._stats[key] = pstats.Stats(profile)
+
+    def wrap(self, agent, module_path: str) -> "ProfiledAgent":
+        return ProfiledAgent(agent, self, module_path)
+
+    def dump(self, module_path: str | None = None):
+        """Write (and forget) the profiles collected by this process for the given agent (all of them, if None).
+
+        Should be called once the agent is done, but before it is released, so its allocations are still held. The
+        allocations traced so far are cleared, so an agent tested next by the process starts from a clean slate.
+        """
+        folder = Path(self.folder) / WORKERS_SUBFOLDER
+        folder.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            keys = list(self._stats) if module_path is None else [Path(module_path).stem]
+            keys = [key for key in keys if key in self._stats]
+            snapshot = None
+            if keys and tracemalloc.is_tracing():
+                # Tracing (restarted by the next profiled call) would slow the analysis of the snapshot down a lot
+                snapshot = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+            for key in keys:
+                self._stats.pop(key).dump_stats(folder / f"{key}.{os.getpid()}.prof")
+                allocations = {"calls": self._calls.pop(key), "sites": []}
+                if snapshot is not None:
+                    allocations["sites"] = self._allocation_sites(snapshot, self._module_paths[key])
+                with open(folder / f"{key}.{os.getpid()}.json", "w") as f:
+                    json.dump(allocations, f)
+
+    def _allocation_sites(self, snapshot: tracemalloc.Snapshot, module_path: str) -> list[dict]:
+        # The allocations made by code called (at any depth) from the agent module, by allocating line
+        agent_filename = str(repo_root_folder / module_path)
+        raw_traces = getattr(snapshot.traces, "_traces", None)
+        if not isinstance(raw_traces, list):
+            # The raw traces are private to CPython: use the (much slower) public API without them
+            agent_filter = tracemalloc.Filter(True, agent_filename, all_frames=True)
+            statistics = snapshot.filter_traces([agent_filter]).statistics("lineno")
+            return [
+                {
+                    "site": f"{statistic.traceback[0].filename}:{statistic.traceback[0].lineno}",
+                    "size": statistic.size,
+                    "count": statistic.count,
+                }
+                for statistic in statistics[: self.top_allocations]
+            ]
+
+        # The public `Snapshot` API builds a Python object per trace and frame (about 10 times slower on a large
+        # process), so the raw traces are used when available: their tracebacks are deduplicated, so each one is
+        # only checked once
+        by_traceback = {}
+        for _, size, frames, *_ in raw_traces:
+            allocations = by_traceback.get(id(frames))
+            if allocations is None:
+                allocations = by_traceback[id(frames)] = [frames, 0, 0]
+            allocations[1] += size
+            allocations[2] += 1
+
+        sites = {}
+        for frames, size, count in by_traceback.values():
+            # The raw frames are (filename, lineno) tuples, the most recent one first
+            if frames and any(filename == agent_filename for filename, _ in frames):
+                site = sites.setdefault(f"{frames[0][0]}:{frames[0][1]}", {"size": 0, "count": 0})
+                site["size"] += size
+                site["count"] += count
+        return [
+            {"site": site, **allocations}
+            for site, allocations in sorted(sites.items(), key=lambda item: item[1]["size"], reverse=True)
+        ][: self.top_allocations]
+
+
+class ProfiledAgent:
+    """Wraps an agent, profiling its `get_hint` calls with an `AgentProfiler`."""
+
+    def __init__(self, agent, profiler: AgentProfiler, module_path: str):
+        self.agent = agent
+        self.profiler = profiler
+        self.module_path = module_path
+
+    def get_name(self) -> str:
+        return self.agent.get_name()
+
+    def get_hint(self, *args, **kwargs) -> str:
+        with self.profiler.profile(self.module_path, count_call=True):
+            return self.agent.get_hint(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.agent, name)
+
+
+def merge_profiles(folder: str | Path, top_allocations: int = 20) -> dict:
+    """Merge the profiles written by all the processes of a run (see `AgentProfiler.dump`) into a `<agent>.prof` file
+    and a `<agent>.allocations.json` file per agent (named after the stem of the agent module).
+
+    Returns:
+        dict: By agent module stem, the number of profiled hint `calls`, the total `time` spent in the profiled code
+            (in seconds, waiting for the LLM included), the `hotspots` (the functions with the highest own time, as
+            `(function, seconds)`) and the top allocation `sites` (summed over the processes).
+    """
+    folder = Path(folder)
+    workers_folder = folder / WORKERS_SUBFOLDER
+    profile_paths = {}
+    for path in sorted(workers_folder.glob("*.prof")):
+        key = path.name.rsplit(".", 2)[0]
+        profile_paths.setdefault(key, []).append(path)
+
+    summaries = {}
+    for key, paths in profile_paths.items():
+        stats = pstats.Stats(*map(str, paths))
+        stats.dump_stats(folder / f"{key}.prof")
+
+        calls, sites = 0, {}
+        for path in paths:
+            allocations_path = path.with_suffix(".json")
+            if not allocations_path.exists():
+                continue
+            with open(allocations_path) as f:
+                allocations = json.load(f)
+            calls += allocations["calls"]
+            for site in allocations["sites"]:
+                merged_site = sites.setdefault(site["site"], {"site": site["site"], "size": 0, "count": 0})
+                merged_site["size"] += site["size"]
+                merged_site["count"] += site["count"]
+        sites = sorted(sites.values(), key=lambda site: site["size"], reverse=True)[:top_allocations]
+        with open(folder / f"{key}.allocations.json", "w") as f:
+            json.dump(sites, f, indent=2)
+
+        functions = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)
+        summaries[key] = {
+            "calls": calls,
+            "time": stats.total_tt,
+            "hotspots": [(_function_label(*function), entry[2]) for function, entry in functions[:3]],
+            "sites": sites,
+        }
+    return summaries
+
+
+def _function_label(filename: str, lineno: int, name: str) -> str:
+    # Built-in functions have no file ("~")
+    return name if filename == "~" else f"{Path(filename).name}:{lineno}({name})"
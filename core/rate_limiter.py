@@ -0,0 +1,147 @@
+import random
+import time
+from pathlib import Path
+
+from core.cache import SQLiteStore
+from core.startup import lazy_import
+
+openai = lazy_import("openai")
+
+
+class RateLimiter(SQLiteStore):
+    """Client-side token bucket limiting requests per minute and tokens per minute, shared by processes.
+
+    The state of the buckets lives in a small SQLite database, updated in exclusive transactions, so every process
+    using the same file (pool workers, isolated agent workers, ...) draws from the same budget.
+
+    Args:
+        path (str | Path): The path of the SQLite database file holding the buckets (created if missing).
+        requests_per_minute (float, optional): The maximum number of requests per minute. Defaults to no limit.
+        tokens_per_minute (float, optional): The maximum number of tokens per minute. Defaults to no limit.
+    """
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL NOT NULL, updated_at REAL NOT NULL)",
+    ]
+
+    def __init__(
+        self, path: str | Path, requests_per_minute: float | None = None, tokens_per_minute: float | None = None
+    ):
+        super().__init__(path)
+        # Each bucket holds up to one minute worth of budget, and starts full
+        self.capacities = {}
+        if requests_per_minute is not None:
+            self.capacities["requests"] = requests_per_minute
+        if tokens_per_minute is not None:
+            self.capacities["tokens"] = tokens_per_minute
+        self.total_wait = 0.0
+
+    def _refill(self, now: float) -> dict:
+        connection = self._connection
+        levels = {}
+        for name, capacity in self.capacities.items():
+            row = connection.execute("SELECT level, updated_at FROM buckets WHERE name = ?", (name,)).fetchone()
+            level, updated_at = row if row is not None else (capacity, now)
+            levels[name] = min(capacity, level + (now - updated_at) * capacity / 60)
+        return levels
+
+    def acquire(self, tokens: int = 0):
+        """Block until one request using (an estimate of) `tokens` tokens fits in the budget, then consume it."""
+        if not self.capacities:
+            return
+
+        # A single request can never need more than a full bucket
+        needed = {"requests": 1, "tokens": min(tokens, self.capacities.get("tokens", 0))}
+        while True:
+            connection = self._connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                levels = self._refill(now)
+                wait = max(
+                    (needed[name] - level) * 60 / self.capacities[name]
+                    for name, level in levels.items()
+                )
+                if wait <= 0:
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO buckets (name, level, updated_at) VALUES (?, ?, ?)",
+                        [(name, level - needed[name], now) for name, level in levels.items()],
+                    )
+            finally:
+                connection.execute("COMMIT")
+
+            if wait <= 0:
+                return
+            self.total_wait += wait
+            time.sleep(wait)
+
+    def record_usage(self, tokens_delta: int):
+        """Correct the tokens bucket once the actual usage of a request is known (`tokens_delta` = actual - estimated)."""
+        if "tokens" not in self.capacities or tokens_delta == 0:
+            return
+
+        connection = self._connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            level = self._refill(now)["tokens"]
+            connection.execute(
+                "INSERT OR REPLACE INTO buckets (name, level, updated_at) VALUES (?, ?, ?)",
+                ("tokens", level - tokens_delta, now),
+            )
+        finally:
+            connection.execute("COMMIT")
+
+
+class RetryPolicy:
+    """Retry with jittered exponential backoff for transient Azure OpenAI errors, honoring Retry-After headers.
+
+    Rate limit errors, connection errors and server-side (5xx) errors are retried; content filter and other client
+    errors are not.
+
+    Args:
+        max_retries (int, optional): The maximum number of retries of a single request. Defaults to 6.
+        base_delay (float, optional): The backoff delay (in seconds) of the first retry, doubled at every retry. Defaults to 1.
+        max_delay (float, optional): The maximum backoff delay (in seconds). Defaults to 60.
+    """
+
+    def __init__(self, max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+
+    @staticmethod
+    def _retry_after(error: "openai.OpenAIError") -> float | None:
+        response = getattr(error, "response", None)
+        if response is None:
+            return None
+
+        headers = response.headers
+        try:
+            if "retry-after-ms" in headers:
+                return float(headers["retry-after-ms"]) / 1000
+            if "retry-after" in headers:
+                return float(headers["retry-after"])
+        except ValueError:
+            # Retry-After can also be an HTTP date, in that case we just fall back to the backoff
+            pass
+        return None
+
+    def get_delay(self, attempt: int, error: "openai.OpenAIError") -> float | None:
+        """Return how long to wait before retrying after the given (0-based) attempt failed, or None to give up."""
+        if attempt >= self.max_retries:
+            return None
+        retryable = isinstance(error, (openai.RateLimitError, openai.APIConnectionError)) or (
+            isinstance(error, openai.APIStatusError) and error.status_code >= 500
+        )
+        if not retryable:
+            return None
+
+        self.retries += 1
+        # Full jitter, so that workers hitting the limit at the same time don't retry all together
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        retry_after = self._retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
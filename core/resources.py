@@ -0,0 +1,138 @@
+import math
+import os
+import signal
+import subprocess
+import sys
+import time
+from collections.abc import Iterable
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def peak_rss_mb(children: bool = False) -> float | None:
+    """Return the peak resident set size (in MB) of the current process, or of its largest (terminated) child.
+
+    Returns None where it can't be measured (i.e., on Windows).
+    """
+    if resource is None:
+        return None
+
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    return _maxrss_mb(usage)
+
+
+def _maxrss_mb(usage) -> float:
+    # ru_maxrss is in bytes on macOS, in kilobytes elsewhere
+    return usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def process_usage() -> dict | None:
+    """Return the resource usage of the current process: its `peak_rss_mb` and `cpu_time` (user + system, in
+    seconds). Returns None where it can't be measured (i.e., on Windows)."""
+    if resource is None:
+        return None
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return {"peak_rss_mb": _maxrss_mb(usage), "cpu_time": usage.ru_utime + usage.ru_stime}
+
+
+def wait_with_usage(process: subprocess.Popen, timeout: float | None = None) -> dict | None:
+    """Wait for a child process to terminate, and return its resource usage (like `process_usage`).
+
+    The usage is the one of the whole life of the child, even if it was killed. Raises `subprocess.TimeoutExpired` if
+    the child is still running after `timeout` seconds. Returns None where it can't be measured (the process is
+    still waited for).
+    """
+    if not hasattr(os, "wait4"):
+        process.wait(timeout=timeout)
+        return None
+
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    while True:
+        try:
+            pid, status, usage = os.wait4(process.pid, os.WNOHANG if deadline is not None else 0)
+        except ChildProcessError:
+            # Already waited for
+            process.wait()
+            return None
+        if pid != 0:
+            break
+        if time.monotonic() > deadline:
+            raise subprocess.TimeoutExpired(process.args, timeout)
+        time.sleep(0.01)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return {"peak_rss_mb": _maxrss_mb(usage), "cpu_time": usage.ru_utime + usage.ru_stime}
+
+
+def merge_resource_usage(usages: Iterable[dict | None]) -> dict | None:
+    """Merge the resource usage of several processes (e.g., the worker processes of an agent): the largest peak RSS,
+    and the total CPU time. Returns None if none of them was measured."""
+    usages = [usage for usage in usages if usage is not None]
+    if not usages:
+        return None
+    return {
+        "peak_rss_mb": max(usage["peak_rss_mb"] for usage in usages),
+        "cpu_time": sum(usage["cpu_time"] for usage in usages),
+    }
+
+
+class ResourceLimits:
+    """Limits on the resources of a process, enforced by the OS with POSIX rlimits (see `apply`).
+
+    Exceeding the memory limit makes allocations fail (raising `MemoryError`), exceeding the CPU time limit kills the
+    process (with SIGXCPU), and exceeding the open files limit makes opening files fail (raising `OSError`).
+
+    Args:
+        max_memory_mb (float, optional): The maximum address space (virtual memory) of the process, in MB. Linux
+            doesn't enforce limits on the resident set size, so this is what caps the memory. Defaults to None.
+        max_cpu_seconds (float, optional): The maximum CPU time (user + system) used from `apply` on, in seconds.
+            Defaults to None.
+        max_open_files (int, optional): The maximum number of open file descriptors. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        max_memory_mb: float | None = None,
+        max_cpu_seconds: float | None = None,
+        max_open_files: int | None = None,
+    ):
+        self.max_memory_mb = max_memory_mb
+        self.max_cpu_seconds = max_cpu_seconds
+        self.max_open_files = max_open_files
+
+    def __bool__(self) -> bool:
+        return any(limit is not None for limit in [self.max_memory_mb, self.max_cpu_seconds, self.max_open_files])
+
+    def apply(self):
+        """Set the limits of the current process (capped to its hard limits, which unprivileged users can't raise).
+
+        Raises `RuntimeError` where rlimits are not available (i.e., on Windows).
+        """
+        if resource is None:
+            raise RuntimeError("Resource limits are not supported on this platform")
+
+        if self.max_memory_mb is not None:
+            _lower_rlimit(resource.RLIMIT_AS, int(self.max_memory_mb * 1024 * 1024))
+        if self.max_cpu_seconds is not None:
+            # The limit is on the CPU time of the whole life of the process, which already used some
+            cpu_time = process_usage()["cpu_time"]
+            _lower_rlimit(resource.RLIMIT_CPU, math.ceil(cpu_time + self.max_cpu_seconds))
+        if self.max_open_files is not None:
+            _lower_rlimit(resource.RLIMIT_NOFILE, self.max_open_files)
+
+    def describe_exit(self, returncode: int | None) -> str | None:
+        """Return the limit a process terminated with `returncode` was killed for exceeding, if any."""
+        if self.max_cpu_seconds is not None and hasattr(signal, "SIGXCPU") and returncode == -signal.SIGXCPU:
+            return f"CPU time limit of {self.max_cpu_seconds}s"
+        return None
+
+
+def _lower_rlimit(limit: int, value: int):
+    soft, hard = resource.getrlimit(limit)
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    # The soft limit is the one enforced, the hard one is kept so the process can be sent SIGXCPU (not SIGKILL)
+    resource.setrlimit(limit, (value, hard))
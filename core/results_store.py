@@ -0,0 +1,133 @@
+import hashlib
+import json
+import time
+from pathlib import Path
+
+from core.cache import SQLiteStore
+
+# The outcomes of a sample that are stored: the errors (agent, guesser or uncaught) can be transient (e.g., timeouts,
+# rate limits, or cache misses when replaying a cache), so these samples are tested again by the next run
+FINAL_OUTCOMES = ("correct", "incorrect")
+
+
+def hash_files(paths: list[str | Path]) -> str:
+    """Return a digest of the content of the given files (missing files are hashed as such, not skipped)."""
+    digest = hashlib.sha256()
+    for path in paths:
+        path = Path(path)
+        digest.update(path.name.encode("utf-8"))
+        digest.update(path.read_bytes() if path.exists() else b"<missing>")
+    return digest.hexdigest()
+
+
+class ResultsStore(SQLiteStore):
+    """Checkpoint of the per-sample outcomes of a run, so an interrupted or repeated run only tests what is missing.
+
+    Samples are stored under the fingerprint of everything that can change their outcome (the agent source, the data
+    files, the model and the backend), plus their level and word index: editing an agent or a data file invalidates
+    its samples, while the unchanged agents are not tested again. Outcomes are written as soon as each sample
+    completes, by whichever process tested it, unless they are errors (see `FINAL_OUTCOMES`).
+
+    Args:
+        path (str | Path): The path of the SQLite database file (created if missing).
+    """
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS samples ("
+        "fingerprint TEXT NOT NULL, level INTEGER NOT NULL, word_index INTEGER NOT NULL, agent_name TEXT NOT NULL, "
+        "outcome TEXT NOT NULL, execution_time REAL NOT NULL, created_at REAL NOT NULL, "
+        "PRIMARY KEY (fingerprint, level, word_index))",
+    ]
+
+    @staticmethod
+    def fingerprint(agent_path: str | Path, data_digest: str, model_name: str, backend: str) -> str:
+        """Return the fingerprint of an agent tested on the data hashed in `data_digest` (see `hash_files`)."""
+        payload = json.dumps(
+            {
+                "agent": hashlib.sha256(Path(agent_path).read_bytes()).hexdigest(),
+                "data": data_digest,
+                "model": model_name,
+                "backend": backend,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def guesser_fingerprints(fingerprint: str, model_name: str, guesser_models: list[str]) -> dict[str, str]:
+        """Return the fingerprint of the samples of each guesser model, in a sweep of guesser models.
+
+        The samples guessed by the agent model itself (i.e., those of a run without a sweep) keep the fingerprint of
+        the agent, so a sweep reuses them and vice versa.
+        """
+        return {
+            guesser_model: (
+                fingerprint
+                if guesser_model == model_name
+                else hashlib.sha256(f"{fingerprint}:{guesser_model}".encode("utf-8")).hexdigest()
+            )
+            for guesser_model in guesser_models
+        }
+
+    def load(self, fingerprint: str) -> dict[tuple[int, int], dict]:
+        """Return the stored samples of a fingerprint, as a `{(level, word_index): sample}` dict."""
+        rows = self._connection.execute(
+            "SELECT level, word_index, agent_name, outcome, execution_time FROM samples WHERE fingerprint = ?",
+            (fingerprint,),
+        )
+        return {
+            (level, word_index): {"agent_name": agent_name, "outcome": outcome, "execution_time": execution_time}
+            for level, word_index, agent_name, outcome, execution_time in rows
+        }
+
+    def get(self, fingerprint: str, level: int, word_index: int) -> dict | None:
+        row = self._connection.execute(
+            "SELECT agent_name, outcome, execution_time FROM samples WHERE fingerprint = ? AND level = ? AND word_index = ?",
+            (fingerprint, level, word_index),
+        ).fetchone()
+        if row is None:
+            return None
+        agent_name, outcome, execution_time = row
+        return {"agent_name": agent_name, "outcome": outcome, "execution_time": execution_time}
+
+    def put(self, fingerprint: str, level: int, word_index: int, agent_name: str, outcome: str, execution_time: float):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO samples "
+            "(fingerprint, level, word_index, agent_name, outcome, execution_time, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (fingerprint, level, word_index, agent_name, outcome, execution_time, time.time()),
+        )
+
+    def load_outcomes(self, fingerprints: dict[str, str]) -> dict[tuple[int, int], dict]:
+        """Return the samples stored for all the guesser models (see `guesser_fingerprints`), with their `outcomes`
+        by model, as a `{(level, word_index): sample}` dict."""
+        stored_by_model = {model: self.load(fingerprint) for model, fingerprint in fingerprints.items()}
+        first_stored, *other_stored = stored_by_model.values()
+        return {
+            key: dict(sample, outcomes={model: stored[key]["outcome"] for model, stored in stored_by_model.items()})
+            for key, sample in first_stored.items()
+            if all(key in stored for stored in other_stored)
+        }
+
+    def get_outcomes(self, fingerprints: dict[str, str], level: int, word_index: int) -> dict | None:
+        """Return a sample with its `outcomes` by guesser model, or None if it isn't stored for all of them."""
+        samples = {model: self.get(fingerprint, level, word_index) for model, fingerprint in fingerprints.items()}
+        if any(sample is None for sample in samples.values()):
+            return None
+        outcomes = {model: sample["outcome"] for model, sample in samples.items()}
+        return dict(next(iter(samples.values())), outcomes=outcomes)
+
+    def put_outcomes(
+        self,
+        fingerprints: dict[str, str],
+        level: int,
+        word_index: int,
+        agent_name: str,
+        outcomes: dict[str, str],
+        execution_time: float,
+    ):
+        """Store the outcomes of a sample for all the guesser models, unless one of them is not final."""
+        if any(outcome not in FINAL_OUTCOMES for outcome in outcomes.values()):
+            return
+        for model, outcome in outcomes.items():
+            self.put(fingerprints[model], level, word_index, agent_name, outcome, execution_time)
@@ -1,4 +1,93 @@
 # Rules regarding the hints
+class _AlnumTable(dict):
+    """`str.translate` table dropping non-alphanumeric characters, filled lazily as new characters are seen."""
+
+    def __missing__(self, code: int) -> int | None:
+        value = code if chr(code).isalnum() else None
+        self[code] = value
+        return value
+
+
+_ALNUM_TABLE = _AlnumTable()
+
+
+class HintValidator:
+    """Precompiled version of `check_hint` for a given guess word, taboo list and level.
+
+    The forbidden words are lowercased once, and the level 3 hints are hashed into a set as soon as more than one
+    hint is checked, so validating many candidate hints for the same word is cheap. Taboo lists are short, so each
+    forbidden word is searched with a plain (C-level) substring search. The results are exactly the same as
+    `check_hint`, which is a thin wrapper around this class.
+
+    Args:
+        taboo_list (list[str]): The list of taboo words.
+        guess_word (str): The word to guess.
+        level (int): The level of the game.
+        hints_list (list[str], optional): The list of hints for level 3. Defaults to None.
+        french_translations_dict (dict, optional): The dictionary of french translations for level 2. Defaults to None.
+    """
+
+    def __init__(self, taboo_list: list[str], guess_word: str, level: int, hints_list: list[str] = None, french_translations_dict: dict = None):
+        self.level = level
+        self._hints_list = hints_list
+        self._hints_set = None
+        self._hints_checked = False
+        self._forbidden_words = None
+
+        if level in [1, 2, 4]:
+            forbidden_words = taboo_list + [guess_word]
+
+            # Level 2: Add the french translation of the guess_word to the forbidden words
+            if level == 2:
+                guess_word_translation = french_translations_dict.get(guess_word, None)
+                if guess_word_translation:
+                    forbidden_words.append(guess_word_translation)
+
+            self._forbidden_words = [word.lower() for word in forbidden_words]
+
+    def validate(self, hint: str) -> bool:
+        """Check if the hint respects the rules of the game (see `check_hint`)."""
+
+        # Check for validity of the inputs
+        if hint is None or not isinstance(hint, str):
+            raise ValueError(f"Invalid hint: '{hint}'")
+
+        if self.level not in [1, 2, 3, 4]:
+            return False
+
+        # Level 3: Check if hint is in the predefined list
+        if self.level == 3:
+            if self._hints_set is not None:
+                return hint in self._hints_set
+            # A single check is faster on the list, the set only pays off from the second one
+            if self._hints_checked and self._hints_list is not None:
+                self._hints_set = set(self._hints_list)
+                return hint in self._hints_set
+            self._hints_checked = True
+            return hint in self._hints_list
+
+        # Check if the hint contains any of the forbidden words (in its lowered, normalized or reversed normalized form)
+        lowered_hint = hint.lower()
+        normalized_hint = lowered_hint.translate(_ALNUM_TABLE)
+        reversed_normalized_hint = normalized_hint[::-1]
+        for word in self._forbidden_words:
+            if word in lowered_hint or word in normalized_hint or word in reversed_normalized_hint:
+                return False
+
+        # Level 4: Additional word count and length restrictions
+        if self.level == 4:
+            words = hint.split()
+            if len(words) > 5 or any(len(word) > 20 for word in words):
+                return False
+
+        # Return True if all checks passed
+        return True
+
+    def validate_many(self, hints: list[str]) -> list[bool]:
+        """Check a batch of hints, returning one result per hint (in the same order)."""
+        return [self.validate(hint) for hint in hints]
+
+
 def check_hint(taboo_list: list[str], guess_word: str, hint: str, level: int, hints_list: list[str] = None, french_translations_dict: dict = None) -> bool:
     """This function checks if the hint respects the rules of the game.
     The rules, ordered by level, are:
@@ -7,6 +96,8 @@ def check_hint(taboo_list: list[str], guess_word: str, hint: str, level: int, hi
     - Level 3: The hint must be taken from a prefixed list of hints
     - Level 4: The hint must have at most 5 words, and none of them can be the guess_word or any of the taboo words or be longer than 20 characters
 
+    To check many hints for the same word, build a `HintValidator` once and use its `validate_many` method.
+
     Args:
         taboo_list (list[str]): The list of taboo words.
         guess_word (str): The word to guess.
@@ -18,47 +109,14 @@ def check_hint(taboo_list: list[str], guess_word: str, hint: str, level: int, hi
     Returns:
         bool: True if the hint respects the rules, False otherwise.
     """
-
-    # Check for validity of the inputs
-    if hint is None or not isinstance(hint, str):
-        raise ValueError(f"Invalid hint: '{hint}'")
-    
-    if level not in [1, 2, 3, 4]:
-        return False
-    
-    # Level 3: Check if hint is in the predefined list
-    if level == 3:
-        return hint in hints_list
-    
-    # Check if the hint contains any of the taboo words or the guess_word (except for level 3)
-    if level in [1,2,4]:
-
-        forbidden_words = taboo_list + [guess_word]
-
-        # Level 2: Add the french translation of the guess_word to the forbidden words
-        if level == 2:
-            guess_word_translation = french_translations_dict.get(guess_word, None)
-            if guess_word_translation:
-                forbidden_words.append(guess_word_translation)
-
-        # Check if the hint contains any of the forbidden words
-        lowered_hint = hint.lower()
-        normalized_hint = ''.join(c for c in lowered_hint if c.isalnum())
-        reversed_normalized_hint = normalized_hint[::-1]
-        for word in forbidden_words:
-            word = word.lower()
-            if word in lowered_hint or word in normalized_hint or word in reversed_normalized_hint:
-                return False
-            
-
-    # Level 4: Additional word count and length restrictions
-    if level == 4:
-        words = hint.split()
-        if len(words) > 5 or any(len(word) > 20 for word in words):
-            return False
-    
-    # Return True if all checks passed
-    return True
+    validator = HintValidator(
+        taboo_list=taboo_list,
+        guess_word=guess_word,
+        level=level,
+        hints_list=hints_list,
+        french_translations_dict=french_translations_dict,
+    )
+    return validator.validate(hint)
 
 
 # Rules regarding the guess
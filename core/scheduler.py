@@ -0,0 +1,462 @@
+import asyncio
+import os
+import time
+import traceback
+from collections.abc import Iterable
+from multiprocessing.util import Finalize
+
+from tqdm import tqdm
+
+from core.agent_runner import IsolatedAgent
+from core.cache import merge_guess_cache_stats
+from core.hedging import merge_hedging_stats
+from core.resources import merge_resource_usage
+from core.results_store import ResultsStore
+from core.tester import (
+    SharedStats,
+    arun_sample,
+    load_agent_for_test,
+    make_guessers,
+    new_results_by_level,
+    run_closing_clients,
+    run_sample,
+    summarize_sweep_results,
+    test_solution,
+)
+
+# Read-only evaluation settings and data, set once per worker process by `init_worker`
+_context: dict = {}
+# Agents (and their guessers) already loaded by the current worker process, by module path
+_loaded_agents: dict = {}
+# Load times of the agents loaded by the current worker process, until reported by a sample result
+_agent_load_times: dict = {}
+# Startup time of the current worker process (from the creation of the pool), by pid
+_worker_startup: dict = {}
+
+
+def init_worker(context: dict, tqdm_lock=None):
+    """Pool initializer storing the evaluation context (read-only data and settings) in the worker process.
+
+    The context is shipped once per worker instead of once per task (with the fork start method it is not even
+    pickled), so tasks only need to carry the agent path. It contains `test_list`, `hints_list`,
+    `french_translations_dict`, `hints_db`, `levels`, `model_name`, `verbose`, `max_concurrency`, `cache`,
+    `embedding_cache`, `isolate_agents`, `rate_limiter`, `retry_policy`, `tracer`, `results_store`,
+    `fingerprints` (the results store fingerprint of each agent path), `results_stream`, `guesser_batch_size`,
+    `hedging_policy`, `guesser_models` (the models guessing the hints of the agents), `profiler`, `resource_limits`
+    (of the isolated agents), `guess_cache` and `pool_start_time` (the time the pool was created, to measure the startup
+    time of the workers).
+
+    The isolated agents still loaded (by the sample scheduler) are closed when the worker exits, and with a profiler
+    their profiles are written then, which requires the pool to be closed and joined (not terminated).
+    """
+    if tqdm_lock is not None:
+        tqdm.set_lock(tqdm_lock)
+    _context.clear()
+    _context.update(context)
+    _loaded_agents.clear()
+    _agent_load_times.clear()
+    _worker_startup.clear()
+    if "pool_start_time" in context:
+        _worker_startup[os.getpid()] = time.time() - context["pool_start_time"]
+    Finalize(None, _close_agents, exitpriority=10)
+
+
+def _close_agents():
+    # Isolated agents write their profiles (in their own processes) when closed
+    for loaded in _loaded_agents.values():
+        if isinstance(loaded, tuple) and isinstance(loaded[0], IsolatedAgent):
+            loaded[0].close()
+    if _context.get("profiler") is not None:
+        _context["profiler"].dump()
+
+
+def run_agent_task(task: tuple):
+    """Test a whole agent in a worker process initialized with `init_worker`, given its progress bar id and path."""
+    progress_bar_id, agent_path = task
+    try:
+        result = test_solution(
+            module_path=agent_path,
+            test_list=_context["test_list"],
+            hints_list=_context["hints_list"],
+            french_translations_dict=_context["french_translations_dict"],
+            hints_db=_context["hints_db"],
+            levels=_context["levels"],
+            verbose=_context["verbose"],
+            model_name=_context["model_name"],
+            progress_bar_id=progress_bar_id,
+            max_concurrency=_context["max_concurrency"],
+            cache=_context["cache"],
+            embedding_cache=_context["embedding_cache"],
+            isolate_agent=_context["isolate_agents"],
+            rate_limiter=_context["rate_limiter"],
+            retry_policy=_context["retry_policy"],
+            tracer=_context["tracer"],
+            results_store=_context["results_store"],
+            fingerprint=_context["fingerprints"].get(agent_path),
+            results_stream=_context["results_stream"],
+            guesser_batch_size=_context["guesser_batch_size"],
+            hedging_policy=_context["hedging_policy"],
+            guesser_models=_context["guesser_models"],
+            profiler=_context["profiler"],
+            resource_limits=_context["resource_limits"],
+            guess_cache=_context["guess_cache"],
+        )
+    except Exception as e:
+        if _context["verbose"]:
+            traceback.print_exception(e)
+            print(f"There was an uncaught error while running agent {agent_path}: {e}")
+        return agent_path, e
+    # Results are collected in completion order, so they must tell which agent they belong to
+    result["agent_path"] = agent_path
+    result["worker_startup"] = dict(_worker_startup)
+    return result
+
+
+def make_sample_tasks(
+    agent_paths: list, levels: list[int], num_words: int, word_indices: list[int] | None = None
+) -> list[tuple]:
+    """Split the evaluation into (agent, level, word) units, interleaving the agents.
+
+    Since consecutive units belong to different agents, a slow agent is spread over all the workers instead of
+    keeping a single one busy for the whole run. If `word_indices` is set, only these words are tested (e.g., a round
+    of an adaptive evaluation).
+    """
+    if word_indices is None:
+        word_indices = range(num_words)
+    return [
+        (agent_path, level, word_index)
+        for level in levels
+        for word_index in word_indices
+        for agent_path in agent_paths
+    ]
+
+
+def group_sample_tasks(tasks: Iterable[tuple], group_size: int) -> list[list[tuple]]:
+    """Group the (agent, level, word) units of each agent and level, up to `group_size` at a time.
+
+    The groups keep the order of their first unit, so the agents stay interleaved. Each group is tested by a single
+    worker, which keeps its samples in flight together on the asyncio engine (see `run_sample_group_task`).
+    """
+    groups, open_groups = [], {}
+    for task in tasks:
+        group = open_groups.setdefault(task[:2], [])
+        if not group:
+            groups.append(group)
+        group.append(task)
+        if len(group) == group_size:
+            del open_groups[task[:2]]
+    return groups
+
+
+def _get_agent(agent_path):
+    # Each worker loads an agent the first time it gets one of its units, then reuses it (load errors included)
+    if agent_path not in _loaded_agents:
+        start_time = time.time()
+        try:
+            llm_kwargs = dict(
+                hints_db=_context["hints_db"],
+                model_name=_context["model_name"],
+                verbose=_context["verbose"],
+                cache=_context["cache"],
+                embedding_cache=_context["embedding_cache"],
+                rate_limiter=_context["rate_limiter"],
+                retry_policy=_context["retry_policy"],
+                tracer=_context["tracer"],
+                hedging_policy=_context["hedging_policy"],
+            )
+            agent = load_agent_for_test(
+                agent_path,
+                llm_kwargs=llm_kwargs,
+                isolate_agent=_context["isolate_agents"],
+                num_workers=_context["max_concurrency"] or 1,
+                profiler=_context["profiler"],
+                resource_limits=_context["resource_limits"],
+            )
+            guessers = make_guessers(
+                llm_kwargs,
+                _context["guesser_models"],
+                guess_cache=_context["guess_cache"],
+                asynchronous=_context["max_concurrency"] is not None,
+                guesser_batch_size=_context["guesser_batch_size"],
+            )
+            _loaded_agents[agent_path] = (agent, guessers)
+        except Exception as e:
+            _loaded_agents[agent_path] = e
+        _agent_load_times[agent_path] = time.time() - start_time
+
+    loaded = _loaded_agents[agent_path]
+    if isinstance(loaded, Exception):
+        raise loaded
+    return loaded
+
+
+def run_sample_task(task: tuple) -> dict:
+    """Run a single (agent, level, word) unit in a worker process initialized with `init_worker`."""
+    return run_sample_group_task([task])[0]
+
+
+def run_sample_group_task(tasks: list[tuple]) -> list[dict]:
+    """Run a group of (agent, level, word) units of the same agent (see `group_sample_tasks`) in a worker process
+    initialized with `init_worker`, returning the result of each unit.
+
+    With `max_concurrency` in the context, the samples of the group are in flight together on the asyncio engine (so
+    their hints can be guessed in batches, with `guesser_batch_size`), otherwise they run one after the other. The
+    stats of the shared objects (caches, retries, ...) and the load time of the agent are reported by the first
+    sample tested.
+    """
+    agent_path = tasks[0][0]
+    results = [
+        {"agent_path": agent_path, "level": level, "word_index": word_index, "worker_startup": dict(_worker_startup)}
+        for _, level, word_index in tasks
+    ]
+
+    # Samples already in the results store are not tested again (so the agent is not even loaded if all of its are)
+    untested_results = []
+    for task, result in zip(tasks, results):
+        stored_result = stored_sample_result(_context, task)
+        if stored_result is not None:
+            result.update(stored_result)
+        else:
+            untested_results.append(result)
+    if not untested_results:
+        return results
+
+    try:
+        agent, guessers = _get_agent(agent_path)
+    except Exception as e:
+        for result in untested_results:
+            result["error"] = e
+        return results
+    if agent_path in _agent_load_times:
+        untested_results[0]["agent_load_time"] = _agent_load_times.pop(agent_path)
+
+    shared_stats = SharedStats(
+        cache=_context["cache"],
+        embedding_cache=_context["embedding_cache"],
+        guess_cache=_context["guess_cache"],
+        retry_policy=_context["retry_policy"],
+        rate_limiter=_context["rate_limiter"],
+        hedging_policy=_context["hedging_policy"],
+    )
+    # The guessers are reused by the groups of the agent, so their batches are counted since the start of this one
+    batched_guessers = _context["guesser_batch_size"] is not None
+    if batched_guessers:
+        batches = sum(guesser.batches for guesser in guessers.values())
+        fallbacks = sum(guesser.fallbacks for guesser in guessers.values())
+
+    if _context["max_concurrency"] is None:
+        for result in untested_results:
+            _run_sample(agent, guessers, result)
+    else:
+        asyncio.run(run_closing_clients(_arun_samples(agent, guessers, untested_results)))
+
+    shared_stats.add_to(untested_results[0])
+    if batched_guessers:
+        untested_results[0]["guesser_batches"] = sum(guesser.batches for guesser in guessers.values()) - batches
+        untested_results[0]["guesser_fallbacks"] = sum(guesser.fallbacks for guesser in guessers.values()) - fallbacks
+    if isinstance(agent, IsolatedAgent):
+        # The usage so far of the agent worker processes of this process (the last report of each process is merged)
+        for result in untested_results:
+            result["agent_resources"] = {os.getpid(): agent.resource_usage()}
+    return results
+
+
+def _sample_kwargs(result: dict) -> dict:
+    guess_word, taboo_list = _context["test_list"][result["word_index"]]
+    return dict(
+        guess_word=guess_word,
+        taboo_list=taboo_list,
+        hints_list=_context["hints_list"],
+        french_translations_dict=_context["french_translations_dict"],
+        level=result["level"],
+        verbose=_context["verbose"],
+        tracer=_context["tracer"],
+    )
+
+
+def _complete_sample(agent, result: dict, execution_time: float):
+    result["execution_time"] = execution_time
+    result["agent_name"] = agent.get_name()
+    store_sample_result(_context, result)
+
+
+def _run_sample(agent, guessers: dict, result: dict):
+    start_time = time.time()
+    result["outcomes"] = run_sample(agent=agent, guessers=guessers, **_sample_kwargs(result))
+    _complete_sample(agent, result, time.time() - start_time)
+
+
+async def _arun_samples(agent, guessers: dict, results: list[dict]):
+    async def run(result: dict):
+        start_time = time.time()
+        result["outcomes"] = await arun_sample(agent=agent, guessers=guessers, **_sample_kwargs(result))
+        _complete_sample(agent, result, time.time() - start_time)
+
+    await asyncio.gather(*(run(result) for result in results))
+
+
+def _sample_fingerprints(context: dict, agent_path) -> dict[str, str]:
+    return ResultsStore.guesser_fingerprints(
+        context["fingerprints"][agent_path], context["model_name"], context["guesser_models"]
+    )
+
+
+def stored_sample_result(context: dict, task: tuple) -> dict | None:
+    """Return the result of an (agent, level, word) unit already in the results store of the context (or None)."""
+    agent_path, level, word_index = task
+    if context["results_store"] is None:
+        return None
+    stored_sample = context["results_store"].get_outcomes(_sample_fingerprints(context, agent_path), level, word_index)
+    if stored_sample is None:
+        return None
+    return dict(stored_sample, agent_path=agent_path, level=level, word_index=word_index, reused=True)
+
+
+def store_sample_result(context: dict, result: dict):
+    """Store the outcomes of a (newly tested) unit in the results store of the context, if any."""
+    if context["results_store"] is None or "outcomes" not in result or result.get("reused"):
+        return
+    context["results_store"].put_outcomes(
+        _sample_fingerprints(context, result["agent_path"]),
+        result["level"],
+        result["word_index"],
+        result["agent_name"],
+        result["outcomes"],
+        result["execution_time"],
+    )
+
+
+class SampleResultsMerger:
+    """Reassemble the results of the units into one result per agent, in the same format as `test_solution`
+    (including the results of each model, in a sweep of guesser models).
+
+    The sample results are added one at a time, so they can be streamed straight from the pool, and the result of an
+    agent can be built as soon as its last unit is added (see `num_samples`).
+
+    The execution time of an agent is the sum of the time spent on its units. Agents that failed to load are
+    reported as `(agent_path, error)` tuples, like in the per-agent mode. An agent without any unit (e.g., with no
+    words to test), or only with units lost by the workers of a `Coordinator`, is named after its path, with empty
+    results for each of the `guesser_models`. The resource usage of an isolated agent merges the last usage reported
+    by each worker process.
+
+    Args:
+        agent_paths (list): The agents tested.
+        levels (list[int]): The levels tested.
+        test_list (list): The words tested.
+        guesser_models (list[str], optional): The guesser models. Defaults to None (the models of the units).
+    """
+
+    def __init__(self, agent_paths: list, levels: list[int], test_list: list, guesser_models: list[str] | None = None):
+        self.levels = levels
+        self.test_list = test_list
+        self._agents = {
+            agent_path: {
+                "agent_name": None,
+                "results_by_model": {model: new_results_by_level(levels) for model in guesser_models or []},
+                "execution_time": 0.0,
+                "num_samples": 0,
+                "error": None,
+                "cache_stats": None,
+                "embedding_cache_stats": None,
+                "retries": None,
+                "rate_limiter_wait": None,
+                "agent_load_time": None,
+                "guesser_batches": None,
+                "guesser_fallbacks": None,
+                "reused_samples": 0,
+                "hedging_stats": [],
+                "guess_cache_stats": [],
+                "agent_resources": {},
+            }
+            for agent_path in agent_paths
+        }
+
+    def num_samples(self, agent_path) -> int:
+        """Return the number of units of an agent added so far (failed ones included)."""
+        return self._agents[agent_path]["num_samples"]
+
+    def add(self, sample_result: dict):
+        agent = self._agents[sample_result["agent_path"]]
+        agent["num_samples"] += 1
+        if "error" in sample_result:
+            if agent["error"] is None:
+                agent["error"] = sample_result["error"]
+            return
+
+        if sample_result["agent_name"] is not None:
+            agent["agent_name"] = sample_result["agent_name"]
+        for model, outcome in sample_result["outcomes"].items():
+            results_by_level = agent["results_by_model"].setdefault(model, new_results_by_level(self.levels))
+            results_by_level[sample_result["level"]][outcome] += 1
+        agent["execution_time"] += sample_result["execution_time"]
+        if sample_result.get("reused"):
+            agent["reused_samples"] += 1
+        for key in ["cache_stats", "embedding_cache_stats"]:
+            if key in sample_result:
+                stats = agent[key] = agent[key] or {"hits": 0, "misses": 0}
+                stats["hits"] += sample_result[key]["hits"]
+                stats["misses"] += sample_result[key]["misses"]
+        for key in ["retries", "rate_limiter_wait", "agent_load_time", "guesser_batches", "guesser_fallbacks"]:
+            if key in sample_result:
+                agent[key] = (agent[key] or 0) + sample_result[key]
+        if "hedging_stats" in sample_result:
+            agent["hedging_stats"].append(sample_result["hedging_stats"])
+        if "guess_cache_stats" in sample_result:
+            agent["guess_cache_stats"].append(sample_result["guess_cache_stats"])
+        if "agent_resources" in sample_result:
+            agent["agent_resources"].update(sample_result["agent_resources"])
+
+    def result(self, agent_path) -> dict | tuple:
+        """Build the result of an agent from the units added so far."""
+        agent = self._agents[agent_path]
+        if agent["error"] is not None:
+            return agent_path, agent["error"]
+
+        result = summarize_sweep_results(
+            agent["agent_name"] or str(agent_path),
+            agent["results_by_model"] or {None: new_results_by_level(self.levels)},
+            self.test_list,
+            agent["execution_time"],
+            verbose=False,
+        )
+        result["agent_path"] = agent_path
+        for key in [
+            "cache_stats",
+            "embedding_cache_stats",
+            "retries",
+            "rate_limiter_wait",
+            "guesser_batches",
+            "guesser_fallbacks",
+        ]:
+            if agent[key] is not None:
+                result[key] = agent[key]
+        if agent["hedging_stats"]:
+            result["hedging_stats"] = merge_hedging_stats(agent["hedging_stats"])
+        if agent["guess_cache_stats"]:
+            result["guess_cache_stats"] = merge_guess_cache_stats(agent["guess_cache_stats"])
+        if agent["agent_load_time"] is not None:
+            result["agent_load_time"] = agent["agent_load_time"]
+        if agent["reused_samples"]:
+            result["reused_samples"] = agent["reused_samples"]
+        resource_usage = merge_resource_usage(agent["agent_resources"].values())
+        if resource_usage is not None:
+            result["agent_resources"] = resource_usage
+        return result
+
+    def results(self) -> list:
+        """Build the result of every agent (in the order of the agent paths)."""
+        return [self.result(agent_path) for agent_path in self._agents]
+
+
+def merge_sample_results(
+    sample_results: Iterable[dict],
+    agent_paths: list,
+    levels: list[int],
+    test_list: list,
+    guesser_models: list[str] | None = None,
+) -> list:
+    """Merge all the results of the units into one result per agent (see `SampleResultsMerger`)."""
+    merger = SampleResultsMerger(agent_paths, levels, test_list, guesser_models=guesser_models)
+    for sample_result in sample_results:
+        merger.add(sample_result)
+    return merger.results()
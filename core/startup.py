@@ -0,0 +1,79 @@
+import ast
+import importlib.util
+import sys
+from pathlib import Path
+
+# Imported once before starting the pool workers (by the main process or the forkserver), so that the workers forked
+# from it start with them already loaded
+PRELOAD_MODULES = ["openai", "httpx", "numpy", "tqdm", "core.scheduler", "core.backends"]
+
+
+def lazy_import(name: str):
+    """Return the module `name`, which is only actually imported when one of its attributes is first accessed.
+
+    Used for the heavyweight dependencies (e.g., `openai`, which takes most of the import time of the `core`
+    modules), so that the processes that never use them don't pay for their import.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def finish_import(module):
+    """Actually import a module returned by `lazy_import`, if it isn't yet (does nothing for a regular module)."""
+    # Accessing any attribute of a lazily imported module actually imports it
+    getattr(module, "__dict__")
+
+
+def preload(modules: list[str]):
+    """Import the given modules (finishing their lazy import, if any), skipping the ones that can't be imported.
+
+    Used before forking the worker processes, so that they all inherit the modules instead of importing them.
+    """
+    for name in modules:
+        try:
+            finish_import(importlib.import_module(name))
+        except ImportError:
+            pass
+
+
+def agent_dependencies(agent_paths: list) -> list[str]:
+    """Return the top-level packages imported by the agent modules (and installed), to preload them (see `preload`).
+
+    Only the imports at the top level of the agent modules are considered, and they are not imported here (only
+    looked up), so preloading never runs code of the agents themselves. Agents that can't be parsed are skipped (they
+    fail later, when loaded).
+    """
+    dependencies = set()
+    for agent_path in agent_paths:
+        try:
+            tree = ast.parse(Path(agent_path).read_text(encoding="utf-8"))
+        except (OSError, SyntaxError, ValueError):
+            continue
+        for node in tree.body:
+            if isinstance(node, ast.Import):
+                dependencies.update(alias.name.split(".")[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module is not None:
+                dependencies.add(node.module.split(".")[0])
+
+    return sorted(
+        name
+        for name in dependencies
+        if name not in sys.builtin_module_names and name != "__future__" and _is_installed(name)
+    )
+
+
+def _is_installed(name: str) -> bool:
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
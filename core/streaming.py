@@ -0,0 +1,134 @@
+import csv
+import json
+import os
+import threading
+from pathlib import Path
+
+
+class JSONLWriter:
+    """Appends records (one JSON object per line) to a JSONL file, shared by all the processes of a run.
+
+    Every line is written with a single `os.write` on a file opened in append mode, so lines written concurrently by
+    different processes and threads are never interleaved, and readers can consume the file while it grows. Like the
+    caches, a writer can be pickled into worker processes, which reopen the file lazily.
+
+    Args:
+        path (str | Path): The path of the JSONL file (appended to if it exists).
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = str(path)
+        self._fd = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def write(self, record: dict):
+        line = (json.dumps(record, default=str) + "\n").encode("utf-8")
+        with self._lock:
+            if self._fd is None or self._pid != os.getpid():
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                self._pid = os.getpid()
+            os.write(self._fd, line)
+
+
+def sample_record(
+    agent_path,
+    agent_name: str,
+    level: int,
+    word: str,
+    outcome: str,
+    execution_time: float,
+    reused: bool = False,
+    guesser_model: str | None = None,
+) -> dict:
+    """Build the results stream record of a single tested (or reused, from the results store) sample.
+
+    In a sweep of guesser models, each sample has a record per model, telling the `guesser_model`.
+    """
+    return {
+        "type": "sample",
+        "agent_path": str(agent_path),
+        "agent_name": agent_name,
+        "level": level,
+        "word": word,
+        "outcome": outcome,
+        "execution_time": execution_time,
+        "reused": reused,
+        "guesser_model": guesser_model,
+    }
+
+
+def agent_record(agent_path, result: dict | Exception, guesser_model: str | None = None) -> dict:
+    """Build the results stream record of a whole agent, from its `test_solution` result (or its error).
+
+    In a sweep of guesser models, pass the result of each model (from the `sweep` of the result) and the model.
+    """
+    if isinstance(result, Exception):
+        return {"type": "agent", "agent_path": str(agent_path), "error": repr(result)}
+
+    return {
+        "type": "agent",
+        "agent_path": str(agent_path),
+        "guesser_model": guesser_model,
+        "agent_name": result["agent_name"],
+        "score": result["score"],
+        "execution_time": result["execution_time"],
+        "exceptions": result["exceptions"],
+        "raw_results": result["raw_results"],
+    }
+
+
+def leaderboard_rows(results: list) -> list[dict]:
+    """Rank the results of `test_solution` (or `(agent_path, error)` tuples) by score, as flat leaderboard rows."""
+    rows = []
+    for i, result in enumerate(
+        sorted(results, key=lambda el: el["score"] if isinstance(el, dict) else -1000, reverse=True)
+    ):
+        if not isinstance(result, dict):
+            agent_path, error = result
+            rows.append({"position": None, "agent_path": str(agent_path), "error": repr(error)})
+            continue
+
+        row = {
+            "position": i + 1,
+            "agent_path": str(result.get("agent_path", "")),
+            "agent_name": result["agent_name"],
+            "execution_time": result["execution_time"],
+            "correct": sum(el["correct"] for el in result["raw_results"].values()),
+            "score": result["score"],
+            "exceptions": result["exceptions"],
+        }
+        for level, level_results in result["raw_results"].items():
+            row[f"level_{level}_correct"] = level_results["correct"]
+        if "score_interval" in result:
+            row["score_low"], row["score_high"] = result["score_interval"]
+            row["tested_samples"] = result["tested_samples"]
+            row["stopped_early"] = result.get("stopped_early", False)
+        if "agent_resources" in result:
+            row["peak_rss_mb"] = result["agent_resources"]["peak_rss_mb"]
+            row["cpu_time"] = result["agent_resources"]["cpu_time"]
+        rows.append(row)
+    return rows
+
+
+def write_leaderboard(path: str | Path, rows: list[dict]):
+    """Write the leaderboard rows to a CSV or JSON file, depending on the extension of `path`."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix == ".json":
+        path.write_text(json.dumps(rows, indent=2))
+        return
+
+    # Error rows lack most columns, and the per-level columns depend on the levels
+    fieldnames = list(dict.fromkeys(key for row in rows for key in row))
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
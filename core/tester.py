@@ -1,22 +1,39 @@
+import asyncio
+import contextvars
 import importlib
 import importlib.util
 import inspect
 import time
 import builtins
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from math import sqrt
+from statistics import NormalDist
 import traceback
 from tqdm import tqdm
 
 from core.agent import Agent
+from core.agent_runner import IsolatedAgent
 from core.errors import AgentError, GuesserError
-from core.guesser import Guesser
+from core.guesser import BatchedGuesser, CachedGuesser, Guesser
 from core.rules import check_guess, check_hint
-from core.answer_generation import LLM
+from core.answer_generation import LLM, AsyncLLM, is_error_answer
+from core.backends import close_async_clients
+from core.cache import EmbeddingCache, GuessCache, ResponseCache, cache_counts, cache_stats_since
+from core.hedging import HedgingPolicy
+from core.profiling import AgentProfiler
+from core.rate_limiter import RateLimiter, RetryPolicy
+from core.resources import ResourceLimits
+from core.results_store import ResultsStore
+from core.streaming import JSONLWriter, sample_record
 from core.decorators import timeout
+from core.tracing import Tracer, reset_trace_attributes, set_trace_attributes, trace
 
 repo_root_folder = Path(__file__).parent.parent
 
+# Maximum time (in seconds) an agent is given to generate a single hint
+HINT_TIMEOUT_SECONDS = 20
+
 
 def load_agent(module_path: str, llm: LLM):
     full_module_path = repo_root_folder / module_path
@@ -49,57 +66,290 @@ def load_agent(module_path: str, llm: LLM):
     except ModuleNotFoundError as e:
         raise ValueError(f"Unable to import code for agent in path {full_module_path}")
 
-@timeout(20)
-def get_hint_with_timeout(agent: Agent, guess_word: str, taboo_list: list[str], level: int) -> str:
+@timeout(HINT_TIMEOUT_SECONDS)
+def get_hint_with_timeout(
+    agent: Agent, guess_word: str, taboo_list: list[str], level: int, tracer: Tracer | None = None
+) -> str:
     try:
-        hint = agent.get_hint(taboo_list=taboo_list, guess_word=guess_word, level=level)
+        with trace(tracer, "agent_get_hint"):
+            hint = agent.get_hint(taboo_list=taboo_list, guess_word=guess_word, level=level)
     except Exception as e:
         raise AgentError(f"Failed to generate hint for word '{guess_word}'", original_error=e)
     return hint
 
-def _test_sample(
-    agent: Agent,
-    guesser: Guesser,
+def _generate_hint(
+    agent: Agent | IsolatedAgent, guess_word: str, taboo_list: list[str], level: int, tracer: Tracer | None = None
+) -> str:
+    """Generate a hint with the given agent within the time limit, raising `AgentError` on failures."""
+    if isinstance(agent, IsolatedAgent):
+        # The agent runs in a separate process, which is killed (and replaced) on timeout
+        return agent.get_hint(taboo_list=taboo_list, guess_word=guess_word, level=level, timeout=HINT_TIMEOUT_SECONDS)
+
+    try:
+        return get_hint_with_timeout(
+            agent=agent, guess_word=guess_word, taboo_list=taboo_list, level=level, tracer=tracer
+        )
+    except TimeoutError as e:
+        raise AgentError(f"Timeout error when generating hint for word '{guess_word}'", original_error=e)
+
+
+class _Sample:
+    """A single (agent, level, word) test, with the steps shared by the sequential and asyncio paths (which only
+    differ in how they wait for the hint and the guesses)."""
+
+    def __init__(
+        self,
+        guess_word: str,
+        taboo_list: list[str],
+        hints_list: list,
+        french_translations_dict: dict,
+        level: int,
+        verbose: bool = True,
+        tracer: Tracer | None = None,
+    ):
+        self.guess_word = guess_word
+        self.taboo_list = taboo_list
+        self.hints_list = hints_list
+        self.french_translations_dict = french_translations_dict
+        self.level = level
+        self.verbose = verbose
+        self.tracer = tracer
+
+    def print(self, msg):
+        if self.verbose:
+            builtins.print(msg)
+
+    def check_hint(self, hint: str) -> bool:
+        """Check if the hint respects the rules of the level."""
+        with trace(self.tracer, "check_hint"):
+            valid_hint = check_hint(
+                taboo_list=self.taboo_list,
+                guess_word=self.guess_word,
+                hint=hint,
+                level=self.level,
+                hints_list=self.hints_list,
+                french_translations_dict=self.french_translations_dict,
+            )
+        if not valid_hint:
+            self.print(f"Bad Hint lvl{self.level}: {self.guess_word} - Hint: {hint}")
+        return valid_hint
+
+    def guess_outcome(self, hint: str, guess: str | None = None, error: Exception | None = None) -> str:
+        """Return the outcome of a guess of the hint, or of the error raised while guessing it."""
+        if error is None and guess is not None and is_error_answer(guess):
+            # The guesser's request failed: its error string is not a guess of the word
+            error = RuntimeError(guess)
+        if error is not None:
+            # TODO: catch errors related to content filter (to possibly award score differently)
+            error = GuesserError(f"Guess generation failed for hint '{hint}'", original_error=error)
+            return _classify_error(error, guess_word=self.guess_word, verbose=self.verbose)
+
+        # Check if guess respects the current level rules
+        if check_guess(
+            guess_word=self.guess_word,
+            guess=guess,
+            level=self.level,
+            french_translations_dict=self.french_translations_dict,
+        ):
+            self.print(f"Lvl{self.level} - Target: {self.guess_word} - Hint: {hint} - Guess: {guess}\n\n")
+            return "correct"
+        self.print(f"Bad Guess! Lvl{self.level} - Target {self.guess_word} - Hint: {hint} - Guess: {guess}\n\n")
+        return "incorrect"
+
+    def error_outcomes(self, error: Exception, guessers: dict[str, Guesser]) -> dict[str, str]:
+        """Return the outcomes of a sample that failed (e.g., on an agent error): the same for all the models."""
+        outcome = _classify_error(error, guess_word=self.guess_word, verbose=self.verbose)
+        return {model: outcome for model in guessers}
+
+    def trace_attributes(self, agent: Agent | IsolatedAgent):
+        return set_trace_attributes(agent=agent.get_name(), level=self.level, word=self.guess_word)
+
+
+def _test_sample(agent: Agent | IsolatedAgent, guessers: dict[str, Guesser], sample: _Sample) -> dict[str, str]:
+    sample.print(f"Lvl{sample.level} - Current guess word - taboo: {sample.guess_word} - {sample.taboo_list}")
+
+    # Generate hint with the Agent that the player created (the span includes the timeout wrapper)
+    with trace(sample.tracer, "hint"):
+        hint = _generate_hint(
+            agent=agent,
+            guess_word=sample.guess_word,
+            taboo_list=sample.taboo_list,
+            level=sample.level,
+            tracer=sample.tracer,
+        )
+    if not sample.check_hint(hint):
+        return {model: "incorrect" for model in guessers}
+
+    # Generate the guess of every guesser model (concurrently, in a sweep) for the same hint
+    def guess_outcome(model: str, guesser: Guesser) -> str:
+        try:
+            with trace(sample.tracer, "guess", guesser_model=model):
+                guess = guesser.get_guess(hint)
+        except Exception as e:
+            return sample.guess_outcome(hint, error=e)
+        return sample.guess_outcome(hint, guess)
+
+    if len(guessers) == 1:
+        return {model: guess_outcome(model, guesser) for model, guesser in guessers.items()}
+    with ThreadPoolExecutor(max_workers=len(guessers)) as executor:
+        futures = {
+            model: executor.submit(contextvars.copy_context().run, guess_outcome, model, guesser)
+            for model, guesser in guessers.items()
+        }
+        return {model: future.result() for model, future in futures.items()}
+
+
+async def _run_in_own_thread(func, *args, **kwargs):
+    # Each call gets its own thread (like `get_hint_with_timeout`), not one of the event loop's default executor: a
+    # thread can't be killed, so a runaway agent would keep its slot (starving the other users of the executor) and
+    # `asyncio.run` would wait for it when shutting the default executor down
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        future = executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+        return await asyncio.wrap_future(future)
+    finally:
+        executor.shutdown(wait=False)
+
+
+async def _async_generate_hint(
+    agent: Agent | IsolatedAgent, guess_word: str, taboo_list: list[str], level: int, tracer: Tracer | None = None
+) -> str:
+    """Async counterpart of `_generate_hint`: the (blocking) agent runs in a thread, without blocking the event loop."""
+    if isinstance(agent, IsolatedAgent):
+        return await _run_in_own_thread(
+            _generate_hint, agent=agent, guess_word=guess_word, taboo_list=taboo_list, level=level, tracer=tracer
+        )
+
+    try:
+        return await asyncio.wait_for(
+            _run_in_own_thread(
+                get_hint_with_timeout.__wrapped__,
+                agent=agent,
+                guess_word=guess_word,
+                taboo_list=taboo_list,
+                level=level,
+                tracer=tracer,
+            ),
+            timeout=HINT_TIMEOUT_SECONDS,
+        )
+    except TimeoutError as e:
+        raise AgentError(f"Timeout error when generating hint for word '{guess_word}'", original_error=e)
+
+
+async def _async_test_sample(
+    agent: Agent | IsolatedAgent, guessers: dict[str, Guesser], sample: _Sample
+) -> dict[str, str]:
+    """Async counterpart of `_test_sample`: the agent runs in a thread, the guessers are awaited."""
+    sample.print(f"Lvl{sample.level} - Current guess word - taboo: {sample.guess_word} - {sample.taboo_list}")
+
+    with trace(sample.tracer, "hint"):
+        hint = await _async_generate_hint(
+            agent=agent,
+            guess_word=sample.guess_word,
+            taboo_list=sample.taboo_list,
+            level=sample.level,
+            tracer=sample.tracer,
+        )
+    if not sample.check_hint(hint):
+        return {model: "incorrect" for model in guessers}
+
+    async def guess_outcome(model: str, guesser: Guesser) -> str:
+        try:
+            with trace(sample.tracer, "guess", guesser_model=model):
+                guess = await guesser.aget_guess(hint)
+        except Exception as e:
+            return sample.guess_outcome(hint, error=e)
+        return sample.guess_outcome(hint, guess)
+
+    outcomes = await asyncio.gather(*(guess_outcome(model, guesser) for model, guesser in guessers.items()))
+    return dict(zip(guessers, outcomes))
+
+
+def _classify_error(error: Exception, guess_word: str, verbose: bool = True) -> str:
+    """Return the results key under which an error raised while testing a sample is counted."""
+
+    def print(msg):
+        if verbose:
+            builtins.print(msg)
+
+    if isinstance(error, AgentError):
+        print(error)
+        if verbose:
+            traceback.print_exception(error.original_error)
+        return "agent_error"
+    if isinstance(error, GuesserError):
+        print(error)
+        if verbose:
+            traceback.print_exception(error.original_error)
+        return "guesser_error"
+    print(f"Uncaught error when guessing word '{guess_word}': {error}")
+    return "uncaught_error"
+
+
+def run_sample(
+    agent: Agent | IsolatedAgent,
+    guessers: dict[str, Guesser],
     guess_word: str,
     taboo_list: list[str],
     hints_list: list,
     french_translations_dict: dict,
     level: int,
     verbose: bool = True,
-) -> bool:
-    def print(msg):
-        if verbose:
-            builtins.print(msg)
-
-    print(f"Lvl{level} - Current guess word - taboo: {guess_word} - {taboo_list}")
-
-    # Generate hint with the Agent that the player created
+    tracer: Tracer | None = None,
+) -> dict[str, str]:
+    """Test a single sample, returning the outcome of each guesser model as a results key (e.g., "correct").
+
+    The hint is generated (and checked) once, and guessed by all the guessers (by model, several in a sweep). Agent
+    errors are the outcome of all the models. If a tracer is given, the sample and its stages (hint, check_hint,
+    guess and the LLM calls) are traced.
+    """
+    sample = _Sample(guess_word, taboo_list, hints_list, french_translations_dict, level, verbose, tracer)
+    token = sample.trace_attributes(agent) if tracer is not None else None
     try:
-        hint = get_hint_with_timeout(agent=agent, guess_word=guess_word, taboo_list=taboo_list, level=level)
-    except TimeoutError as e:
-        raise AgentError(f"Timeout error when generating hint for word '{guess_word}'", original_error=e)
+        with trace(tracer, "sample") as span:
+            try:
+                outcomes = _test_sample(agent, guessers, sample)
+            except Exception as e:
+                outcomes = sample.error_outcomes(e, guessers)
+            span.set(outcome=_span_outcome(outcomes))
+            return outcomes
+    finally:
+        if token is not None:
+            reset_trace_attributes(token)
+
 
-    # Check if hint respects the current level rules
-    if check_hint(taboo_list=taboo_list, guess_word=guess_word, hint=hint, level=level, hints_list=hints_list, french_translations_dict=french_translations_dict):
-        # Generate guess
+async def arun_sample(
+    agent: Agent | IsolatedAgent,
+    guessers: dict[str, Guesser],
+    guess_word: str,
+    taboo_list: list[str],
+    hints_list: list,
+    french_translations_dict: dict,
+    level: int,
+    verbose: bool = True,
+    tracer: Tracer | None = None,
+) -> dict[str, str]:
+    """Async counterpart of `run_sample`."""
+    sample = _Sample(guess_word, taboo_list, hints_list, french_translations_dict, level, verbose, tracer)
+    # Each sample runs in its own task, so its trace attributes don't leak to the other ones
+    if tracer is not None:
+        sample.trace_attributes(agent)
+    with trace(tracer, "sample") as span:
         try:
-            guess = guesser.get_guess(hint)
+            outcomes = await _async_test_sample(agent, guessers, sample)
         except Exception as e:
-            # TODO: catch errors related to content filter (to possibly award score differently)
-            raise GuesserError(f"Guess generation failed for hint '{hint}'", original_error=e)
+            outcomes = sample.error_outcomes(e, guessers)
+        span.set(outcome=_span_outcome(outcomes))
+        return outcomes
 
-        # Check if guess respects the current level rules
-        if check_guess(
-            guess_word=guess_word, guess=guess, level=level, french_translations_dict=french_translations_dict
-        ):
-            print(f"Lvl{level} - Target: {guess_word} - Hint: {hint} - Guess: {guess}\n\n")
-            return True
-        else:
-            print(f"Bad Guess! Lvl{level} - Target {guess_word} - Hint: {hint} - Guess: {guess}\n\n")
-    else:
-        print(f"Bad Hint lvl{level}: {guess_word} - Hint: {hint}")
 
-    return False
+def _span_outcome(outcomes: dict[str, str]) -> str | dict[str, str]:
+    # A single outcome, unless the sample was guessed by several models
+    return next(iter(outcomes.values())) if len(outcomes) == 1 else outcomes
+
+
+def level_weight(level: int) -> float:
+    return pow(level, 1/3)
 
 
 def compute_score(results_by_level: dict) -> float:
@@ -107,83 +357,100 @@ def compute_score(results_by_level: dict) -> float:
 
     for level, results in results_by_level.items():
         # TODO: implement some proper scoring logic (e.g., do we want to weight levels differently, or treat incorrect answers and runtime errors in a different way?)
-        score += results["correct"] * pow(level, 1/3)
+        score += results["correct"] * level_weight(level)
 
     return round(score, 1)
 
 
-def test_solution(
-    module_path: str,
-    test_list: list,
-    hints_list: list,
-    french_translations_dict: dict,
-    hints_db: dict,
-    levels: list[int] = [1, 2, 3, 4],
-    verbose: bool = True,
-    model_name: str = "gpt-4o-mini",
-    progress_bar_id: int | None = None,
-):
-    agent = load_agent(module_path, llm=LLM(hints_db=hints_db, model_name=model_name, verbose=verbose))
-    guesser = Guesser(llm=LLM(hints_db=hints_db, model_name=model_name, verbose=verbose))
+def _z_score(confidence: float) -> float:
+    # Two-sided critical value of the standard normal distribution
+    return NormalDist().inv_cdf(1 - (1 - confidence) / 2)
 
-    def print(msg):
-        if verbose:
-            builtins.print(msg)
 
-    results_by_level = {
-        level: {"correct": 0, "incorrect": 0, "agent_error": 0, "guesser_error": 0, "uncaught_error": 0}
-        for level in levels
-    }
+def accuracy_interval(correct: int, num_samples: int, confidence: float = 0.95) -> tuple[float, float]:
+    """Wilson score interval of an accuracy (the fraction of correct samples), which stays meaningful at 0% or 100%.
 
-    # Test with the test_list
-    start_time = time.time()
+    Returns:
+        tuple[float, float]: The lower and upper bounds of the accuracy (between 0 and 1).
+    """
+    if num_samples == 0:
+        return 0.0, 1.0
+    z = _z_score(confidence)
+    p = correct / num_samples
+    denominator = 1 + z**2 / num_samples
+    center = (p + z**2 / (2 * num_samples)) / denominator
+    margin = z * sqrt(p * (1 - p) / num_samples + z**2 / (4 * num_samples**2)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
 
-    use_tqdm = progress_bar_id is not None and not verbose
-    if use_tqdm:
-        progress_bar = tqdm(
-            total=len(levels) * len(test_list), colour="#872452", position=progress_bar_id, desc=agent.get_name()
-        )
 
-    for level in levels:
-        print(f"\nLevel {level}\n")
-        for guess_word, taboo_list in test_list:
-            try:
-                success = _test_sample(
-                    agent=agent,
-                    guesser=guesser,
-                    guess_word=guess_word,
-                    taboo_list=taboo_list,
-                    hints_list=hints_list,
-                    french_translations_dict=french_translations_dict,
-                    level=level,
-                    verbose=verbose,
-                )
-                results_by_level[level]["correct" if success else "incorrect"] += 1
-            except AgentError as e:
-                print(e)
-                if verbose:
-                    traceback.print_exception(e.original_error)
-                results_by_level[level]["agent_error"] += 1
-            except GuesserError as e:
-                print(e)
-                if verbose:
-                    traceback.print_exception(e.original_error)
-                results_by_level[level]["guesser_error"] += 1
-            except Exception as e:
-                print(f"Uncaught error when guessing word '{guess_word}': {e}")
-                results_by_level[level]["uncaught_error"] += 1
+def score_interval(results_by_level: dict, num_words: int, confidence: float = 0.95) -> tuple[float, float, float]:
+    """Estimate the score an agent would get on all the words of each level from the samples tested so far.
 
-            if use_tqdm:
-                progress_bar.update(1)
+    The samples of each level must be a random subset of the words. The words of a level are finite, so the
+    uncertainty shrinks to zero as all of them get tested (finite population correction); the accuracy is smoothed
+    (Agresti-Coull), so a level with no correct (or no incorrect) sample yet doesn't get a zero-width interval. The
+    interval never leaves the range of the scores still possible.
+
+    Returns:
+        tuple[float, float, float]: The estimated score, and the lower and upper bounds of its interval.
+    """
+    z = _z_score(confidence)
+    estimate, variance, min_score, max_score = 0.0, 0.0, 0.0, 0.0
+    for level, results in results_by_level.items():
+        weight = level_weight(level)
+        num_samples = sum(results.values())
+        min_score += weight * results["correct"]
+        max_score += weight * (results["correct"] + num_words - num_samples)
+        if num_samples == 0:
+            estimate += weight * num_words / 2
+            variance = float("inf")
+            continue
+        estimate += weight * num_words * results["correct"] / num_samples
+        p = (results["correct"] + z**2 / 2) / (num_samples + z**2)
+        variance += weight**2 * num_words**2 * (1 - num_samples / num_words) * p * (1 - p) / num_samples
+    margin = z * sqrt(variance)
+    return estimate, max(min_score, estimate - margin), min(max_score, estimate + margin)
+
+
+def add_confidence_intervals(result: dict, num_words: int, confidence: float = 0.95):
+    """Replace the score and accuracy of a (possibly partial) result of `summarize_results` by their estimates on all
+    the words, with their confidence intervals (in `score_interval` and in the accuracy of each level).
+
+    The results of each model of a sweep are updated too.
+    """
+    for model_result in [result, *result.get("sweep", {}).values()]:
+        if "score_interval" in model_result:
+            continue
+        accuracy = {}
+        for level, results in model_result["raw_results"].items():
+            num_samples = sum(results.values())
+            low, high = accuracy_interval(results["correct"], num_samples, confidence)
+            accuracy[level] = (
+                f"{results['correct']}/{num_samples} ({round(results['correct'] / max(1, num_samples) * 100, 2)}%, "
+                f"{low * 100:.0f}-{high * 100:.0f}%)"
+            )
+        estimate, low, high = score_interval(model_result["raw_results"], num_words, confidence)
+        model_result["accuracy"] = accuracy
+        model_result["score"] = round(estimate, 1)
+        model_result["score_interval"] = (round(low, 1), round(high, 1))
+        model_result["tested_samples"] = sum(sum(results.values()) for results in model_result["raw_results"].values())
+
+
+def new_results_by_level(levels: list[int]) -> dict:
+    return {
+        level: {"correct": 0, "incorrect": 0, "agent_error": 0, "guesser_error": 0, "uncaught_error": 0}
+        for level in levels
+    }
 
-    if use_tqdm:
-        progress_bar.display(msg=f"{agent.get_name()} COMPLETED")
-        progress_bar.disable = True
 
-    end_time = time.time()
-    execution_time = end_time - start_time
+def summarize_results(
+    agent_name: str, results_by_level: dict, test_list: list, execution_time: float, verbose: bool = True
+) -> dict:
+    def print(msg):
+        if verbose:
+            builtins.print(msg)
 
-    print(f"Execution Time: {end_time - start_time:.2f} seconds")
+    print(f"Execution Time: {execution_time:.2f} seconds")
     accuracy = {
         level: f"{data['correct']}/{len(test_list)} ({round(data['correct'] / (max(1, len(test_list))) * 100, 2)}%)"
         for level, data in results_by_level.items()
@@ -195,10 +462,493 @@ def test_solution(
     )
 
     return {
-        "agent_name": agent.get_name(),
+        "agent_name": agent_name,
         "execution_time": execution_time,
         "raw_results": results_by_level,
         "accuracy": accuracy,
         "score": compute_score(results_by_level=results_by_level),
         "exceptions": num_exceptions,
     }
+
+
+def summarize_sweep_results(
+    agent_name: str, results_by_model: dict, test_list: list, execution_time: float, verbose: bool = True
+) -> dict:
+    """Summarize the results of each guesser model (see `summarize_results`).
+
+    With a single model, this is just its result. With several (a sweep), the result is the one of the first model,
+    with the results of all of them (by model) under `sweep`.
+    """
+    results = {}
+    for model, results_by_level in results_by_model.items():
+        if verbose and len(results_by_model) > 1:
+            builtins.print(f"Guesser model: {model}")
+        results[model] = summarize_results(agent_name, results_by_level, test_list, execution_time, verbose=verbose)
+
+    result = next(iter(results.values()))
+    if len(results) > 1:
+        result = dict(result, sweep=results)
+    return result
+
+
+def split_sweep_results(results: list, guesser_models: list[str]) -> dict[str, list]:
+    """Split the results of `test_solution` (or `(agent_path, error)` tuples) into the results of each guesser model.
+
+    Agent errors (and the resource usage of the agents, and whether they were stopped early) are part of the results
+    of every model.
+    """
+    if len(guesser_models) == 1:
+        return {guesser_models[0]: results}
+
+    def model_result(result, model: str):
+        if not isinstance(result, dict):
+            return result
+        split_result = dict(result["sweep"][model], agent_path=result.get("agent_path"))
+        for key in ["agent_resources", "stopped_early"]:
+            if key in result:
+                split_result[key] = result[key]
+        return split_result
+
+    return {model: [model_result(result, model) for result in results] for model in guesser_models}
+
+
+def _write_sample_records(
+    results_stream: JSONLWriter,
+    module_path: str,
+    agent_name: str,
+    level: int,
+    guess_word: str,
+    outcomes: dict[str, str],
+    execution_time: float,
+    reused: bool = False,
+):
+    for model, outcome in outcomes.items():
+        results_stream.write(
+            sample_record(module_path, agent_name, level, guess_word, outcome, execution_time, reused, model)
+        )
+
+
+def _summarize_stored_results(
+    module_path: str,
+    stored_results: dict,
+    levels: list[int],
+    test_list: list,
+    guesser_models: list[str],
+    verbose: bool = True,
+    results_stream: JSONLWriter | None = None,
+) -> dict:
+    """Rebuild the result of an agent whose samples are all in the results store, without loading it."""
+    agent_name = next(iter(stored_results.values()))["agent_name"]
+    results_by_model = {model: new_results_by_level(levels) for model in guesser_models}
+    execution_time = 0.0
+    for level in levels:
+        for word_index, (guess_word, _) in enumerate(test_list):
+            sample = stored_results[(level, word_index)]
+            for model, outcome in sample["outcomes"].items():
+                results_by_model[model][level][outcome] += 1
+            execution_time += sample["execution_time"]
+            if results_stream is not None:
+                _write_sample_records(
+                    results_stream,
+                    module_path,
+                    agent_name,
+                    level,
+                    guess_word,
+                    sample["outcomes"],
+                    sample["execution_time"],
+                    reused=True,
+                )
+
+    result = summarize_sweep_results(agent_name, results_by_model, test_list, execution_time, verbose=verbose)
+    result["reused_samples"] = len(levels) * len(test_list)
+    return result
+
+
+def _count_stored_samples(stored_results: dict, levels: list[int], num_words: int) -> int:
+    return sum((level, word_index) in stored_results for level in levels for word_index in range(num_words))
+
+
+def load_agent_for_test(
+    module_path: str,
+    llm_kwargs: dict,
+    isolate_agent: bool,
+    num_workers: int,
+    profiler: AgentProfiler | None = None,
+    resource_limits: ResourceLimits | None = None,
+) -> Agent | IsolatedAgent:
+    if isolate_agent:
+        # Isolated agents are profiled (and limited) in their own worker processes
+        return IsolatedAgent(
+            module_path=module_path,
+            llm_kwargs=llm_kwargs,
+            num_workers=num_workers,
+            profiler=profiler,
+            limits=resource_limits,
+        )
+    if resource_limits:
+        raise ValueError("Resource limits require isolated agents")
+    if profiler is None:
+        return load_agent(module_path, llm=LLM(**llm_kwargs))
+
+    with profiler.profile(module_path):
+        agent = load_agent(module_path, llm=LLM(**llm_kwargs))
+    return profiler.wrap(agent, module_path)
+
+
+async def run_closing_clients(coroutine):
+    """Await the main coroutine of an event loop, then close the asynchronous clients bound to the loop."""
+    try:
+        return await coroutine
+    finally:
+        await close_async_clients()
+
+
+class SharedStats:
+    """The stats of the objects shared by the agents tested in a process (the caches, the retry policy, the rate
+    limiter, the hedging policy and the guess cache), counted from the creation of this object, so that each agent
+    (or sample) reports its own share.
+    """
+
+    def __init__(
+        self,
+        cache: ResponseCache | None = None,
+        embedding_cache: EmbeddingCache | None = None,
+        guess_cache: GuessCache | None = None,
+        retry_policy: RetryPolicy | None = None,
+        rate_limiter: RateLimiter | None = None,
+        hedging_policy: HedgingPolicy | None = None,
+    ):
+        self.cache = cache
+        self.embedding_cache = embedding_cache
+        self.guess_cache = guess_cache
+        self.retry_policy = retry_policy
+        self.rate_limiter = rate_limiter
+        self.hedging_policy = hedging_policy
+        self._cache_counts, self._embedding_cache_counts = cache_counts(cache), cache_counts(embedding_cache)
+        self._retries = retry_policy.retries if retry_policy is not None else 0
+        self._rate_limiter_wait = rate_limiter.total_wait if rate_limiter is not None else 0.0
+        # The hedging policy and the guess cache count their stats since they were last collected
+        if hedging_policy is not None:
+            hedging_policy.collect_stats()
+        if guess_cache is not None:
+            guess_cache.collect_stats()
+
+    def add_to(self, result: dict):
+        """Add the stats since the creation of this object to a result (only the ones of the objects in use)."""
+        if self.cache is not None:
+            result["cache_stats"] = cache_stats_since(self.cache, self._cache_counts)
+        if self.embedding_cache is not None:
+            result["embedding_cache_stats"] = cache_stats_since(self.embedding_cache, self._embedding_cache_counts)
+        if self.guess_cache is not None:
+            result["guess_cache_stats"] = self.guess_cache.collect_stats()
+        if self.retry_policy is not None:
+            result["retries"] = self.retry_policy.retries - self._retries
+        if self.rate_limiter is not None:
+            result["rate_limiter_wait"] = self.rate_limiter.total_wait - self._rate_limiter_wait
+        if self.hedging_policy is not None:
+            result["hedging_stats"] = self.hedging_policy.collect_stats()
+
+
+def make_guessers(
+    llm_kwargs: dict,
+    guesser_models: list[str],
+    guess_cache: GuessCache | None = None,
+    asynchronous: bool = False,
+    guesser_batch_size: int | None = None,
+) -> dict[str, Guesser]:
+    """Build the guesser of each model, with the same LLM settings as the agent (the agent keeps its own model).
+
+    With `asynchronous`, the guessers are backed by an `AsyncLLM` and, with `guesser_batch_size`, batched (see
+    `BatchedGuesser`). With a `guess_cache`, they reuse the guesses of the same or similar hints (see `CachedGuesser`).
+    """
+    if guesser_batch_size is not None and not asynchronous:
+        raise ValueError("Batched guessers require the asyncio engine")
+    llm_class = AsyncLLM if asynchronous else LLM
+    guessers = {}
+    for model in guesser_models:
+        guesser_llm = llm_class(**dict(llm_kwargs, model_name=model))
+        if guesser_batch_size is not None:
+            guessers[model] = BatchedGuesser(llm=guesser_llm, batch_size=guesser_batch_size)
+        else:
+            guessers[model] = Guesser(llm=guesser_llm)
+        if guess_cache is not None:
+            guessers[model] = CachedGuesser(guessers[model], guess_cache)
+    return guessers
+
+
+class _AgentOutcomes:
+    """Aggregate the outcomes of the samples of an agent for `test_solution`, in any order: the tested ones (which
+    are stored in the results store, if any) and the ones reused from the results store. Each sample is written to the
+    results stream (if any) and updates the progress bar (if shown).
+    """
+
+    def __init__(
+        self,
+        module_path: str,
+        agent_name: str,
+        levels: list[int],
+        test_list: list,
+        guesser_models: list[str],
+        stored_results: dict,
+        fingerprints: dict,
+        results_store: ResultsStore | None = None,
+        results_stream: JSONLWriter | None = None,
+        progress_bar_id: int | None = None,
+        verbose: bool = True,
+    ):
+        self.module_path = module_path
+        self.agent_name = agent_name
+        self.test_list = test_list
+        self.stored_results = stored_results
+        self.fingerprints = fingerprints
+        self.results_store = results_store
+        self.results_stream = results_stream
+        self.results_by_model = {model: new_results_by_level(levels) for model in guesser_models}
+        self.reused_time = 0.0
+        self.progress_bar = None
+        if progress_bar_id is not None and not verbose:
+            self.progress_bar = tqdm(
+                total=len(levels) * len(test_list), colour="#872452", position=progress_bar_id, desc=agent_name
+            )
+
+    def reuse(self, level: int, word_index: int) -> bool:
+        """Count the sample from the results store, if it is there (returns whether it was)."""
+        stored_sample = self.stored_results.get((level, word_index))
+        if stored_sample is None:
+            return False
+        self.reused_time += stored_sample["execution_time"]
+        self._count(level, word_index, stored_sample["outcomes"], stored_sample["execution_time"], reused=True)
+        return True
+
+    def add(self, level: int, word_index: int, outcomes: dict[str, str], sample_time: float):
+        """Count a tested sample."""
+        if self.results_store is not None:
+            self.results_store.put_outcomes(
+                self.fingerprints, level, word_index, self.agent_name, outcomes, sample_time
+            )
+        self._count(level, word_index, outcomes, sample_time)
+
+    def _count(self, level: int, word_index: int, outcomes: dict[str, str], sample_time: float, reused: bool = False):
+        for model, outcome in outcomes.items():
+            self.results_by_model[model][level][outcome] += 1
+        if self.results_stream is not None:
+            _write_sample_records(
+                self.results_stream,
+                self.module_path,
+                self.agent_name,
+                level,
+                self.test_list[word_index][0],
+                outcomes,
+                sample_time,
+                reused=reused,
+            )
+        if self.progress_bar is not None:
+            self.progress_bar.update(1)
+
+    def close(self):
+        if self.progress_bar is not None:
+            self.progress_bar.display(msg=f"{self.agent_name} COMPLETED")
+            self.progress_bar.disable = True
+
+
+def _run_samples(
+    agent: Agent | IsolatedAgent,
+    guessers: dict[str, Guesser],
+    agent_outcomes: _AgentOutcomes,
+    levels: list[int],
+    sample_kwargs: dict,
+):
+    def print(msg):
+        if sample_kwargs["verbose"]:
+            builtins.print(msg)
+
+    for level in levels:
+        print(f"\nLevel {level}\n")
+        for word_index, (guess_word, taboo_list) in enumerate(agent_outcomes.test_list):
+            if agent_outcomes.reuse(level, word_index):
+                continue
+            sample_start_time = time.time()
+            outcomes = run_sample(
+                agent=agent,
+                guessers=guessers,
+                guess_word=guess_word,
+                taboo_list=taboo_list,
+                level=level,
+                **sample_kwargs,
+            )
+            agent_outcomes.add(level, word_index, outcomes, time.time() - sample_start_time)
+
+
+async def _arun_samples(
+    agent: Agent | IsolatedAgent,
+    guessers: dict[str, Guesser],
+    agent_outcomes: _AgentOutcomes,
+    levels: list[int],
+    sample_kwargs: dict,
+    max_concurrency: int,
+):
+    # Each sample is pipelined as hint -> check_hint -> guess, with up to `max_concurrency` of them in flight
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(level: int, word_index: int, guess_word: str, taboo_list: list[str]):
+        if agent_outcomes.reuse(level, word_index):
+            return
+        async with semaphore:
+            sample_start_time = time.time()
+            outcomes = await arun_sample(
+                agent=agent,
+                guessers=guessers,
+                guess_word=guess_word,
+                taboo_list=taboo_list,
+                level=level,
+                **sample_kwargs,
+            )
+            agent_outcomes.add(level, word_index, outcomes, time.time() - sample_start_time)
+
+    await asyncio.gather(
+        *(
+            run(level, word_index, guess_word, taboo_list)
+            for level in levels
+            for word_index, (guess_word, taboo_list) in enumerate(agent_outcomes.test_list)
+        )
+    )
+
+
+def test_solution(
+    module_path: str,
+    test_list: list,
+    hints_list: list,
+    french_translations_dict: dict,
+    hints_db: dict,
+    levels: list[int] = [1, 2, 3, 4],
+    verbose: bool = True,
+    model_name: str = "gpt-4o-mini",
+    progress_bar_id: int | None = None,
+    max_concurrency: int | None = None,
+    cache: ResponseCache | None = None,
+    embedding_cache: EmbeddingCache | None = None,
+    isolate_agent: bool = False,
+    rate_limiter: RateLimiter | None = None,
+    retry_policy: RetryPolicy | None = None,
+    tracer: Tracer | None = None,
+    results_store: ResultsStore | None = None,
+    fingerprint: str | None = None,
+    results_stream: JSONLWriter | None = None,
+    guesser_batch_size: int | None = None,
+    hedging_policy: HedgingPolicy | None = None,
+    guesser_models: list[str] | None = None,
+    profiler: AgentProfiler | None = None,
+    resource_limits: ResourceLimits | None = None,
+    guess_cache: GuessCache | None = None,
+):
+    """Test an agent on all the words of the given levels.
+
+    With `max_concurrency`, the samples run on the asyncio engine, with up to `max_concurrency` of them in flight;
+    the results are aggregated exactly as in the sequential path, so `raw_results` and `score` are the same (only the
+    verbose logs can be interleaved). If `guesser_batch_size` is set, the hints of the samples in flight are guessed
+    together by a `BatchedGuesser` (batching needs concurrent samples, so it requires `max_concurrency`). With several
+    `guesser_models`, each hint is guessed by all of them concurrently. With a `guess_cache` (development runs only),
+    the guessers reuse the guesses of the same or similar hints (see `CachedGuesser`).
+    """
+    # Samples already in the results store (for the same agent source, data and models) are not tested again
+    guesser_models = guesser_models or [model_name]
+    stored_results, fingerprints = {}, {}
+    if results_store is not None:
+        fingerprints = ResultsStore.guesser_fingerprints(fingerprint, model_name, guesser_models)
+        stored_results = results_store.load_outcomes(fingerprints)
+    num_stored_samples = _count_stored_samples(stored_results, levels, len(test_list))
+    if num_stored_samples and num_stored_samples == len(levels) * len(test_list):
+        return _summarize_stored_results(
+            module_path,
+            stored_results,
+            levels,
+            test_list,
+            guesser_models,
+            verbose=verbose,
+            results_stream=results_stream,
+        )
+
+    # Like the caches, the retry policy and the rate limiter are shared by the agents tested in a process
+    shared_stats = SharedStats(cache, embedding_cache, guess_cache, retry_policy, rate_limiter, hedging_policy)
+    llm_kwargs = dict(
+        hints_db=hints_db,
+        model_name=model_name,
+        verbose=verbose,
+        cache=cache,
+        embedding_cache=embedding_cache,
+        rate_limiter=rate_limiter,
+        retry_policy=retry_policy,
+        tracer=tracer,
+        hedging_policy=hedging_policy,
+    )
+    load_start_time = time.time()
+    agent = load_agent_for_test(
+        module_path=module_path,
+        llm_kwargs=llm_kwargs,
+        isolate_agent=isolate_agent,
+        num_workers=max_concurrency or 1,
+        profiler=profiler,
+        resource_limits=resource_limits,
+    )
+    try:
+        # The guessers of all the models are fed the same hints
+        guessers = make_guessers(
+            llm_kwargs,
+            guesser_models,
+            guess_cache=guess_cache,
+            asynchronous=max_concurrency is not None,
+            guesser_batch_size=guesser_batch_size,
+        )
+        agent_load_time = time.time() - load_start_time
+
+        agent_outcomes = _AgentOutcomes(
+            module_path,
+            agent.get_name(),
+            levels,
+            test_list,
+            guesser_models,
+            stored_results,
+            fingerprints,
+            results_store=results_store,
+            results_stream=results_stream,
+            progress_bar_id=progress_bar_id,
+            verbose=verbose,
+        )
+        sample_kwargs = dict(
+            hints_list=hints_list, french_translations_dict=french_translations_dict, verbose=verbose, tracer=tracer
+        )
+        start_time = time.time()
+        if max_concurrency is None:
+            _run_samples(agent, guessers, agent_outcomes, levels, sample_kwargs)
+        else:
+            asyncio.run(
+                run_closing_clients(
+                    _arun_samples(agent, guessers, agent_outcomes, levels, sample_kwargs, max_concurrency)
+                )
+            )
+        execution_time = time.time() - start_time + agent_outcomes.reused_time
+    finally:
+        # The agent process must not outlive a failed test
+        if isinstance(agent, IsolatedAgent):
+            agent.close()
+    agent_outcomes.close()
+
+    agent_resources = None
+    if isinstance(agent, IsolatedAgent):
+        agent_resources = agent.resource_usage()
+    elif profiler is not None:
+        profiler.dump(module_path)
+
+    result = summarize_sweep_results(
+        agent.get_name(), agent_outcomes.results_by_model, test_list, execution_time, verbose=verbose
+    )
+    result["agent_load_time"] = agent_load_time
+    if agent_resources is not None:
+        result["agent_resources"] = agent_resources
+    if results_store is not None:
+        result["reused_samples"] = num_stored_samples
+    if guesser_batch_size is not None:
+        result["guesser_batches"] = sum(guesser.batches for guesser in guessers.values())
+        result["guesser_fallbacks"] = sum(guesser.fallbacks for guesser in guessers.values())
+    shared_stats.add_to(result)
+    return result
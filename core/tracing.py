@@ -0,0 +1,124 @@
+import contextvars
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from core.streaming import JSONLWriter
+
+# Attributes (agent, level, word, parent stage) attached to the spans recorded in the current context. Context
+# variables follow asyncio tasks and `asyncio.to_thread`, and are copied into the hint threads by the timeout decorator
+_attributes = contextvars.ContextVar("trace_attributes", default={})
+
+PERCENTILES = [50, 95, 99]
+
+
+class Span:
+    """A single traced call, timed from its creation to the end of the `with` block.
+
+    Attributes can be added while the call runs (e.g., the token usage once the response is received) with `set`.
+    """
+
+    def __init__(self, tracer: "Tracer", stage: str, attributes: dict):
+        self.tracer = tracer
+        self.record = {"stage": stage, **_attributes.get(), **attributes}
+        self._token = None
+
+    def set(self, **attributes):
+        self.record.update(attributes)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self.record["start"] = time.time()
+        # Spans recorded inside this one know their parent stage
+        self._token = _attributes.set({**_attributes.get(), "parent": self.record["stage"]})
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        _attributes.reset(self._token)
+        self.record["wall_time"] = time.perf_counter() - self._start
+        if exc_type is not None:
+            self.record["error"] = exc_type.__name__
+        self.tracer.write(self.record)
+        return False
+
+
+class _NullSpan:
+    """Span used when tracing is disabled, doing nothing."""
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer(JSONLWriter):
+    """Writes spans (one JSON object per line) to a JSONL trace file, shared by all the processes of a run.
+
+    Args:
+        path (str | Path): The path of the JSONL trace file (appended to if it exists).
+    """
+
+    def span(self, stage: str, **attributes) -> Span:
+        return Span(self, stage, attributes)
+
+
+def trace(tracer: Tracer | None, stage: str, **attributes) -> Span | _NullSpan:
+    """Return a span of `stage` recorded by the tracer, or a no-op span if the tracer is None."""
+    if tracer is None:
+        return _NULL_SPAN
+    return tracer.span(stage, **attributes)
+
+
+def set_trace_attributes(**attributes) -> contextvars.Token:
+    """Attach attributes (e.g., `agent`, `level` and `word`) to the spans recorded in the current context."""
+    return _attributes.set({**_attributes.get(), **attributes})
+
+
+def reset_trace_attributes(token: contextvars.Token):
+    _attributes.reset(token)
+
+
+def load_spans(path: str | Path) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize_spans(spans: list[dict]) -> dict:
+    """Compute the wall time percentiles (and token usage) by stage, and by agent and stage.
+
+    Returns:
+        dict: `{"stages": {stage: summary}, "agents": {agent: {stage: summary}}}`, where each summary has the number
+            of spans `count`, the `p50`/`p95`/`p99` wall times (in seconds), the total `queue_wait`, `retries`,
+            `prompt_tokens` and `completion_tokens`.
+    """
+    groups = {"stages": {}, "agents": {}}
+    for span in spans:
+        groups["stages"].setdefault(span["stage"], []).append(span)
+        if span.get("agent") is not None:
+            groups["agents"].setdefault(span["agent"], {}).setdefault(span["stage"], []).append(span)
+
+    def summarize(group: list[dict]) -> dict:
+        wall_times = np.array([span["wall_time"] for span in group])
+        summary = {"count": len(group)}
+        for percentile, value in zip(PERCENTILES, np.percentile(wall_times, PERCENTILES)):
+            summary[f"p{percentile}"] = float(value)
+        for key in ["queue_wait", "retries", "prompt_tokens", "completion_tokens"]:
+            summary[key] = sum(span.get(key) or 0 for span in group)
+        return summary
+
+    return {
+        "stages": {stage: summarize(group) for stage, group in groups["stages"].items()},
+        "agents": {
+            agent: {stage: summarize(group) for stage, group in stages.items()}
+            for agent, stages in groups["agents"].items()
+        },
+    }
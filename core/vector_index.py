@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+from collections.abc import Mapping
+from pathlib import Path
+
+import numpy as np
+
+# Storage formats of the index: float16 halves the size of the embeddings, int8 (with a float32 scale per row)
+# divides it by four
+DTYPES = ["float32", "float16", "int8"]
+
+# The rows of a quantized matrix are converted to float32 this many bytes at a time when scoring them, so searching
+# never materializes a full float32 copy of the matrix
+_SCORING_BLOCK_BYTES = 16 * 1024 * 1024
+
+
+def quantize(embeddings: np.ndarray, dtype: str) -> tuple[np.ndarray, np.ndarray | None]:
+    """Convert (normalized) embeddings to a storage format (see `DTYPES`).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray | None]: The converted matrix, and the scale of each of its rows for int8 (the
+            embeddings are approximately `matrix * scales[:, None]`), None otherwise.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Invalid index dtype '{dtype}' (expected one of {', '.join(DTYPES)})")
+
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if dtype != "int8":
+        return embeddings.astype(dtype), None
+    # Symmetric quantization of each row to [-127, 127]
+    scales = np.maximum(np.abs(embeddings).max(axis=1, initial=0.0), 1e-12) / 127
+    matrix = np.clip(np.rint(embeddings / scales[:, None]), -127, 127).astype(np.int8)
+    return matrix, scales.astype(np.float32)
+
+
+def cosine_similarities(matrix: np.ndarray, query: np.ndarray, scales: np.ndarray | None = None) -> np.ndarray:
+    """Compute the similarities of the rows of a (possibly quantized, see `quantize`) matrix to a normalized query.
+
+    Quantized matrices are scored block by block, on their stored data (scaled afterwards for int8).
+    """
+    if matrix.dtype == np.float32:
+        similarities = matrix @ query
+    else:
+        block_rows = max(1, _SCORING_BLOCK_BYTES // (4 * max(1, matrix.shape[1])))
+        similarities = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), block_rows):
+            similarities[start : start + block_rows] = matrix[start : start + block_rows].astype(np.float32) @ query
+    if scales is not None:
+        similarities *= scales
+    return similarities
+
+
+def top_k_cosine(
+    matrix: np.ndarray, query: np.ndarray, k: int = 1, scales: np.ndarray | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """Find the k rows of `matrix` most similar to `query` according to the cosine similarity.
+
+    Args:
+        matrix (np.ndarray): The (n, d) matrix to search, whose rows must be already L2-normalized (or quantized from
+            normalized rows, see `quantize`).
+        query (np.ndarray): The (d,) query vector (normalized here, so it can be a raw embedding).
+        k (int, optional): The number of results to return. Defaults to 1.
+        scales (np.ndarray, optional): The scales of the rows of an int8 matrix. Defaults to None.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The indices of the top k rows and their similarities, by decreasing similarity.
+    """
+    query = np.asarray(query, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    similarities = cosine_similarities(matrix, query, scales=scales)
+
+    k = min(k, len(similarities))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    # argpartition only selects the top k in O(n), then just those k are sorted
+    if k < len(similarities):
+        top_indices = np.argpartition(-similarities, k - 1)[:k]
+    else:
+        top_indices = np.arange(len(similarities))
+    top_indices = top_indices[np.argsort(-similarities[top_indices], kind="stable")]
+    return top_indices, similarities[top_indices]
+
+
+class HintsIndex(Mapping):
+    """Read-only hints vector DB for level 3, backed by a contiguous matrix of normalized embeddings.
+
+    On disk, the index is a `.npy` file (memory-mapped when loaded, so loading is almost free and the pages are
+    shared by all the processes using it) and a `.hints.json` sidecar with the hints in row order. These files are
+    generated from the JSON hints DB (see `load_cached`, or scripts/build_hints_index.py), not versioned. The index
+    also behaves as the `{hint: embedding}` dict used so far as `llm.hints_db` (with the same `list[float]` values,
+    normalized), and is pickled by path when it is memory-mapped, so it can be passed to worker processes without
+    copying the matrix.
+
+    The matrix can be stored as float32, float16 or int8 (see `quantize`, the scales of an int8 matrix are stored in a
+    `.scales.npy` sidecar). `search` scores the stored matrix directly, while `embeddings` (and the embeddings of the
+    dict interface) are always float32: for a quantized index, they are dequantized, on first use.
+
+    Args:
+        hints (list[str]): The hints, in row order.
+        matrix (np.ndarray): The (n, d) matrix of the normalized embeddings (possibly quantized, see `quantize`).
+        path (str | Path, optional): The `.npy` file the matrix is memory-mapped from, if any. Defaults to None.
+        scales (np.ndarray, optional): The scales of the rows of an int8 matrix. Defaults to None.
+    """
+
+    def __init__(
+        self, hints: list[str], matrix: np.ndarray, path: str | Path | None = None, scales: np.ndarray | None = None
+    ):
+        if len(hints) != len(matrix):
+            raise ValueError(f"Mismatching number of hints ({len(hints)}) and embeddings ({len(matrix)})")
+        if (matrix.dtype == np.int8) != (scales is not None):
+            raise ValueError("An int8 index (and only an int8 index) requires the scales of its rows")
+        self.hints = hints
+        self.matrix = matrix
+        self.scales = scales
+        self.path = str(path) if path is not None else None
+        self._rows = {hint: i for i, hint in enumerate(hints)}
+        self._embeddings = None
+
+    @property
+    def dtype(self) -> str:
+        return self.matrix.dtype.name
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """The float32 matrix of the normalized embeddings (dequantized for a quantized index)."""
+        if self.matrix.dtype == np.float32:
+            return self.matrix
+        if self._embeddings is None:
+            self._embeddings = self._dequantize(self.matrix, self.scales)
+        return self._embeddings
+
+    @staticmethod
+    def _dequantize(matrix: np.ndarray, scales: np.ndarray | None) -> np.ndarray:
+        embeddings = matrix.astype(np.float32)
+        if scales is not None:
+            embeddings *= scales[..., None]
+        return embeddings
+
+    @staticmethod
+    def sidecar_path(path: str | Path) -> Path:
+        return Path(path).with_suffix(".hints.json")
+
+    @staticmethod
+    def scales_path(path: str | Path) -> Path:
+        return Path(path).with_suffix(".scales.npy")
+
+    @staticmethod
+    def source_hash_path(path: str | Path) -> Path:
+        return Path(path).with_suffix(".source.sha256")
+
+    @classmethod
+    def from_dict(cls, hints_db: dict) -> "HintsIndex":
+        """Build an in-memory index from a `{hint: embedding}` dict (e.g., the content of `hints_db.json`)."""
+        hints = list(hints_db)
+        embeddings = np.array([hints_db[hint] for hint in hints], dtype=np.float32)
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return cls(hints=hints, matrix=embeddings)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "HintsIndex":
+        """Load an index, memory-mapping the `.npy` file if given one, or parsing it if given a JSON hints DB."""
+        path = Path(path)
+        if path.suffix == ".json":
+            with open(path, "r") as f:
+                return cls.from_dict(json.load(f))
+
+        with open(cls.sidecar_path(path), "r") as f:
+            hints = json.load(f)
+        matrix = np.load(path, mmap_mode="r")
+        scales = np.load(cls.scales_path(path), mmap_mode="r") if matrix.dtype == np.int8 else None
+        return cls(hints=hints, matrix=matrix, path=path, scales=scales)
+
+    @classmethod
+    def load_cached(cls, json_path: str | Path, path: str | Path | None = None) -> "HintsIndex":
+        """Load a JSON hints DB through its binary index (`path`, next to it by default), which is built on first use
+        and rebuilt whenever the JSON changes (its SHA-256 is stored with the index). Falls back to parsing the JSON
+        when the index can't be written."""
+        json_path = Path(json_path)
+        path = Path(path) if path is not None else json_path.with_suffix(".npy")
+        source_hash = hashlib.sha256(json_path.read_bytes()).hexdigest()
+        hash_path = cls.source_hash_path(path)
+        if path.exists() and hash_path.exists() and hash_path.read_text().strip() == source_hash:
+            return cls.load(path)
+
+        index = cls.load(json_path)
+        try:
+            index.save(path)
+            # Written last (and atomically), so an interrupted build is never taken for an up-to-date index
+            temporary_path = hash_path.with_name(f"{hash_path.name}.{os.getpid()}.tmp")
+            temporary_path.write_text(source_hash + "\n")
+            os.replace(temporary_path, hash_path)
+        except OSError:
+            return index
+        return cls.load(path)
+
+    def quantized(self, dtype: str) -> "HintsIndex":
+        """Return an in-memory copy of the index stored in another format (see `DTYPES`)."""
+        matrix, scales = quantize(self.embeddings, dtype)
+        return HintsIndex(hints=self.hints, matrix=matrix, scales=scales)
+
+    def save(self, path: str | Path):
+        path = Path(path)
+        # Any previous source hash no longer matches what is being written
+        self.source_hash_path(path).unlink(missing_ok=True)
+        np.save(path, np.ascontiguousarray(self.matrix))
+        if self.scales is not None:
+            np.save(self.scales_path(path), np.ascontiguousarray(self.scales, dtype=np.float32))
+        with open(self.sidecar_path(path), "w") as f:
+            json.dump(self.hints, f, ensure_ascii=False, indent=0)
+            f.write("\n")
+
+    def search(self, query_embedding: list[float] | np.ndarray, k: int = 1) -> list[str]:
+        """Return the k hints most similar (cosine similarity) to the given query embedding."""
+        top_indices, _ = top_k_cosine(self.matrix, np.asarray(query_embedding), k=k, scales=self.scales)
+        return [self.hints[i] for i in top_indices]
+
+    def __getitem__(self, hint: str) -> list[float]:
+        row = self._rows[hint]
+        if self.matrix.dtype == np.float32:
+            return self.matrix[row].tolist()
+        return self._dequantize(self.matrix[row], self.scales[row] if self.scales is not None else None).tolist()
+
+    def __iter__(self):
+        return iter(self.hints)
+
+    def __len__(self) -> int:
+        return len(self.hints)
+
+    def __contains__(self, hint) -> bool:
+        return hint in self._rows
+
+    def __getstate__(self):
+        if self.path is not None:
+            return {"path": self.path}
+        return dict(self.__dict__, _embeddings=None)
+
+    def __setstate__(self, state):
+        if set(state) == {"path"}:
+            state = HintsIndex.load(state["path"]).__dict__
+        self.__dict__.update(state)
+
+
+def recall_at_k(
+    reference: HintsIndex, candidate: HintsIndex, k_values: list[int] = [1, 5, 10], max_queries: int = 500
+) -> dict:
+    """Measure how well the search of an index (e.g., a quantized one) matches the one of a reference index (e.g.,
+    the float32 one), with the same hints.
+
+    The queries are the embeddings of the hints themselves (up to `max_queries` of them, picked at random), each one
+    searched among the other hints (leave-one-out), so no embedding requests are needed.
+
+    Returns:
+        dict: The number of `queries`, the `top1_agreement` (the fraction of queries with the same top-1 hint) and
+            the recall at each k (`recall@k`, the average fraction of the reference top k found in the top k).
+    """
+    if reference.hints != candidate.hints:
+        raise ValueError("The indexes to compare must have the same hints")
+
+    rows = np.arange(len(reference))
+    if len(rows) > max_queries:
+        rows = np.sort(np.random.default_rng(0).choice(rows, size=max_queries, replace=False))
+    max_k = max(k_values)
+
+    def search(index: HintsIndex, query: np.ndarray, row: int) -> list[int]:
+        top_indices, _ = top_k_cosine(index.matrix, query, k=max_k + 1, scales=index.scales)
+        return [i for i in top_indices.tolist() if i != row][:max_k]
+
+    top1_matches, recalls = 0, {k: 0.0 for k in k_values}
+    for row in rows:
+        query = reference.embeddings[row]
+        reference_top, candidate_top = search(reference, query, row), search(candidate, query, row)
+        top1_matches += reference_top[:1] == candidate_top[:1]
+        for k in k_values:
+            expected = set(reference_top[:k])
+            recalls[k] += len(expected & set(candidate_top[:k])) / max(1, len(expected))
+
+    num_queries = max(1, len(rows))
+    return {
+        "queries": len(rows),
+        "top1_agreement": top1_matches / num_queries,
+        **{f"recall@{k}": recall / num_queries for k, recall in recalls.items()},
+    }
@@ -0,0 +1,201 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from core.backends import BACKEND_ENV_VARIABLE, FAKE_LATENCY_ENV_VARIABLE
+
+repo_folder = Path(__file__).parent.parent
+
+BENCHMARK_AGENT_SOURCE = '''
+from core.agent import Agent
+
+
+class BenchmarkAgent(Agent):
+    def get_name(self) -> str:
+        return "BENCHMARK_AGENT"
+
+    def get_hint(self, taboo_list: list[str], guess_word: str, level: int) -> str:
+        return self.llm.generate_answer(prompt=f"Give me a hint for the word {guess_word}, avoiding {taboo_list}")
+
+    def custom_similarity_search(self, query: str, k: int = 1) -> list[str]:
+        return self.llm.hints_db.search(self.llm.embed_text(query), k=k)
+'''
+
+
+def _make_words(num_words: int) -> list[tuple[str, list[str]]]:
+    return [(f"parola{i}", [f"tabu{i}a", f"tabu{i}b", f"tabu{i}c", f"tabu{i}d"]) for i in range(num_words)]
+
+
+def _print_row(name: str, parameters: str, total_time: float, num_items: int):
+    print(
+        f"{name:<24} | {parameters:<28} | {total_time:>9.3f}s | {total_time / num_items * 1e6:>12.1f}us "
+        f"| {num_items / total_time:>12.1f}/s"
+    )
+
+
+def bench_check_hint(num_hints: int):
+    from core.rules import HintValidator, check_hint
+
+    taboo_list = ["felino", "miao", "zampa", "domestico"]
+    hints = [f"un animale numero {i} che fa le fusa e dorme sul divano" for i in range(num_hints)]
+
+    for level in [1, 2, 4]:
+        start_time = time.perf_counter()
+        for hint in hints:
+            check_hint(taboo_list, "gatto", hint, level, french_translations_dict={"gatto": "chat"})
+        _print_row("check_hint", f"level {level}", time.perf_counter() - start_time, num_hints)
+
+        validator = HintValidator(taboo_list, "gatto", level, french_translations_dict={"gatto": "chat"})
+        start_time = time.perf_counter()
+        validator.validate_many(hints)
+        _print_row("HintValidator", f"level {level}", time.perf_counter() - start_time, num_hints)
+
+
+def bench_timeout_wrapper(num_calls: int, agent_path: Path):
+    from core.agent_runner import IsolatedAgent
+    from core.answer_generation import LLM
+    from core.tester import HINT_TIMEOUT_SECONDS, get_hint_with_timeout, load_agent
+
+    agent = load_agent(agent_path, llm=LLM(hints_db={}))
+
+    start_time = time.perf_counter()
+    for _ in range(num_calls):
+        agent.get_hint(taboo_list=["a"], guess_word="b", level=1)
+    _print_row("get_hint", "direct", time.perf_counter() - start_time, num_calls)
+
+    start_time = time.perf_counter()
+    for _ in range(num_calls):
+        get_hint_with_timeout(agent=agent, guess_word="b", taboo_list=["a"], level=1)
+    _print_row("get_hint", "timeout decorator", time.perf_counter() - start_time, num_calls)
+
+    isolated_agent = IsolatedAgent(agent_path, llm_kwargs={"hints_db": {}})
+    try:
+        start_time = time.perf_counter()
+        for _ in range(num_calls):
+            isolated_agent.get_hint(taboo_list=["a"], guess_word="b", level=1, timeout=HINT_TIMEOUT_SECONDS)
+        _print_row("get_hint", "isolated process", time.perf_counter() - start_time, num_calls)
+    finally:
+        isolated_agent.close()
+
+
+def bench_test_solution(word_counts: list[int], agent_path: Path, hints_db):
+    from core.tester import test_solution
+
+    for num_words in word_counts:
+        test_list = _make_words(num_words)
+        for max_concurrency in [None, 8]:
+            start_time = time.perf_counter()
+            test_solution(
+                module_path=agent_path,
+                test_list=test_list,
+                hints_list=[],
+                french_translations_dict={},
+                hints_db=hints_db,
+                levels=[1, 2, 4],
+                verbose=False,
+                max_concurrency=max_concurrency,
+            )
+            mode = "sequential" if max_concurrency is None else f"async x{max_concurrency}"
+            _print_row("test_solution", f"{num_words} words, {mode}", time.perf_counter() - start_time, 3 * num_words)
+
+
+def bench_driver(agent_counts: list[int], num_words: int, agent_source: str, folder: Path):
+    words_path = folder / "words.txt"
+    words_path.write_text("\n".join(f"{word}: {', '.join(taboo)}" for word, taboo in _make_words(num_words)))
+
+    for num_agents in agent_counts:
+        agents_folder = folder / f"agents_{num_agents}"
+        agents_folder.mkdir(exist_ok=True)
+        for i in range(num_agents):
+            (agents_folder / f"agent_{i}.py").write_text(agent_source)
+
+        for scheduler in ["agent", "sample"]:
+            start_time = time.perf_counter()
+            subprocess.run(
+                [
+                    sys.executable,
+                    repo_folder / "scripts" / "test_solutions.py",
+                    "--folder",
+                    agents_folder,
+                    "--words-path",
+                    words_path,
+                    "--levels",
+                    "1",
+                    "2",
+                    "4",
+                    "--quiet",
+                    "--scheduler",
+                    scheduler,
+                ],
+                check=True,
+                capture_output=True,
+            )
+            _print_row(
+                "test_solutions.py",
+                f"{num_agents} agents, {scheduler}",
+                time.perf_counter() - start_time,
+                3 * num_words * num_agents,
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        "benchmark.py",
+        description="Benchmark the overhead of the evaluation harness, using the offline fake LLM backend",
+    )
+    parser.add_argument(
+        "--latency",
+        type=str,
+        default="0",
+        help="The latency distribution of the fake backend (e.g., 0, constant:0.05, uniform:0.1,0.5, lognormal:-1,0.5)",
+    )
+    parser.add_argument("--num-hints", type=int, default=20000, help="The number of hints for the check_hint benchmark")
+    parser.add_argument("--num-calls", type=int, default=500, help="The number of calls for the get_hint benchmark")
+    parser.add_argument(
+        "--word-counts", type=int, nargs="+", default=[10, 100, 1000], help="The word counts for test_solution"
+    )
+    parser.add_argument(
+        "--agent-counts", type=int, nargs="+", default=[1, 4, 16], help="The agent counts for test_solutions.py"
+    )
+    parser.add_argument("--driver-words", type=int, default=50, help="The number of words for test_solutions.py")
+    parser.add_argument(
+        "--benchmarks",
+        type=str,
+        nargs="+",
+        default=["check_hint", "timeout", "test_solution", "driver"],
+        choices=["check_hint", "timeout", "test_solution", "driver"],
+        help="The benchmarks to run",
+    )
+    args = parser.parse_args()
+
+    # Configured through the environment, so that it is inherited by all the processes started by the benchmarks
+    os.environ[BACKEND_ENV_VARIABLE] = "fake"
+    os.environ[FAKE_LATENCY_ENV_VARIABLE] = args.latency
+    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [str(repo_folder), os.environ.get("PYTHONPATH")]))
+
+    from core.vector_index import HintsIndex
+
+    hints_db = HintsIndex.load_cached(repo_folder / "data" / "level3_data" / "hints_db.json")
+
+    print(f"{'BENCHMARK':<24} | {'PARAMETERS':<28} | {'TOTAL':>10} | {'PER ITEM':>14} | {'THROUGHPUT':>14}")
+    with TemporaryDirectory(prefix="taboo-benchmark-") as folder:
+        folder = Path(folder)
+        agent_path = folder / "benchmark_agent.py"
+        agent_path.write_text(BENCHMARK_AGENT_SOURCE)
+
+        if "check_hint" in args.benchmarks:
+            bench_check_hint(args.num_hints)
+        if "timeout" in args.benchmarks:
+            bench_timeout_wrapper(args.num_calls, agent_path)
+        if "test_solution" in args.benchmarks:
+            bench_test_solution(args.word_counts, agent_path, hints_db)
+        if "driver" in args.benchmarks:
+            bench_driver(args.agent_counts, args.driver_words, BENCHMARK_AGENT_SOURCE, folder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import argparse
+from pathlib import Path
+
+from core.vector_index import DTYPES, HintsIndex, recall_at_k
+
+
+def main():
+    data_folder = Path(__file__).parent.parent / "data"
+
+    parser = argparse.ArgumentParser(
+        "build_hints_index.py",
+        description="Convert the level 3 hints vector DB from JSON to the memory-mappable binary index format",
+    )
+    parser.add_argument(
+        "--hints-db-path",
+        type=str,
+        default=str(data_folder / "level3_data" / "hints_db.json"),
+        help="The path to the hints vector DB in JSON format",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="The path of the output .npy file (the hints are saved next to it, in a .hints.json file). Defaults to "
+        "hints_db_<dtype>.npy next to the JSON hints DB (hints_db.npy, the index built on first use, for float32)",
+    )
+    parser.add_argument(
+        "--dtype",
+        type=str,
+        choices=DTYPES,
+        default="float32",
+        help="The storage format of the embeddings (int8 also saves the scale of each row, in a .scales.npy file)",
+    )
+    parser.add_argument(
+        "--recall-k",
+        type=int,
+        nargs="+",
+        default=[1, 5, 10],
+        help="The k values of the recall@k of a quantized index, measured against the float32 one",
+    )
+    args = parser.parse_args()
+
+    if args.output is None:
+        suffix = "" if args.dtype == "float32" else f"_{args.dtype}"
+        args.output = str(Path(args.hints_db_path).with_name(f"{Path(args.hints_db_path).stem}{suffix}.npy"))
+
+    if args.dtype == "float32":
+        index = HintsIndex.load_cached(args.hints_db_path, args.output)
+        print(f"Index with {len(index)} hints up to date in {args.output} ({HintsIndex.sidecar_path(args.output)})")
+        return
+
+    index = HintsIndex.load(args.hints_db_path)
+    quantized_index = index.quantized(args.dtype)
+    report = recall_at_k(index, quantized_index, k_values=args.recall_k)
+    print(
+        f"{args.dtype}: {quantized_index.matrix.nbytes / 1024 / 1024:.2f} MB instead of "
+        f"{index.embeddings.nbytes / 1024 / 1024:.2f} MB - top-1 agreement {report['top1_agreement'] * 100:.1f}%, "
+        + ", ".join(f"recall@{k} {report[f'recall@{k}'] * 100:.1f}%" for k in args.recall_k)
+        + f" (over {report['queries']} leave-one-out queries)"
+    )
+    index = quantized_index
+    index.save(args.output)
+    print(f"Saved index with {len(index)} hints to {args.output} ({HintsIndex.sidecar_path(args.output)})")
+
+
+if __name__ == "__main__":
+    main()
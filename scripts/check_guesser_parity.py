@@ -0,0 +1,76 @@
+import argparse
+import os
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from core.answer_generation import LLM
+from core.backends import BACKEND_ENV_VARIABLE, BACKENDS
+from core.guesser import BatchedGuesser, Guesser, guesser_parity
+
+
+def main():
+    repo_folder = Path(__file__).parent.parent
+    data_folder = repo_folder / "data"
+
+    parser = argparse.ArgumentParser(
+        "check_guesser_parity.py",
+        description="Check that the batched guesser gives the same guesses as the per-hint one, on a list of hints",
+    )
+    parser.add_argument(
+        "--hints-path",
+        type=str,
+        default=str(data_folder / "level3_data" / "hints.txt"),
+        help="The path to the file containing the hints to guess (one per line, optionally as 'target: hint')",
+    )
+    parser.add_argument(
+        "--model-name",
+        type=str,
+        default="gpt-4o-mini",
+        choices=["gpt-4o-mini", "gpt-4.1-mini", "gpt-4.1-nano"],
+        help="The Azure OpenAI model to use for the guesser",
+    )
+    parser.add_argument("--backend", type=str, choices=BACKENDS, help="The LLM backend to use")
+    parser.add_argument("--batch-size", type=int, default=16, help="The number of hints per batched request")
+    parser.add_argument("--max-hints", type=int, help="If set, only check the first hints of the file")
+    args = parser.parse_args()
+
+    load_dotenv(dotenv_path=repo_folder / ".env", override=True)
+    if args.backend is not None:
+        os.environ[BACKEND_ENV_VARIABLE] = args.backend
+
+    lines = [line.strip() for line in open(args.hints_path).read().splitlines() if line.strip()]
+    lines = lines[: args.max_hints]
+    # Hints with a target word ('target: hint') also get their accuracy compared
+    if all(":" in line for line in lines):
+        targets, hints = zip(*(map(str.strip, line.split(":", 1)) for line in lines))
+        targets, hints = list(targets), list(hints)
+    else:
+        targets, hints = None, lines
+
+    guesser = Guesser(llm=LLM(hints_db={}, model_name=args.model_name, verbose=False))
+    batched_guesser = BatchedGuesser(
+        llm=LLM(hints_db={}, model_name=args.model_name, verbose=False), batch_size=args.batch_size
+    )
+
+    start_time = time.time()
+    parity = guesser_parity(guesser, batched_guesser, hints, targets=targets)
+    execution_time = time.time() - start_time
+
+    for hint, single, batched in zip(hints, parity["single_guesses"], parity["batched_guesses"]):
+        if single != batched:
+            print(f"Mismatch - Hint: {hint} - Per-hint guess: {single} - Batched guess: {batched}")
+
+    print(
+        f"\nAgreement: {parity['agreement'] * 100:.1f}% on {len(hints)} hints - Requests: {len(hints)} per-hint, "
+        f"{parity['batches']} batched (+{parity['fallbacks']} fallbacks) - Total time: {execution_time:.2f}s"
+    )
+    if targets is not None:
+        print(
+            f"Accuracy: {parity['single_accuracy'] * 100:.1f}% per-hint, {parity['batched_accuracy'] * 100:.1f}% batched"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,51 @@
+import time
+
+# The import time of the script (and of the core modules it uses) is reported with the other startup times
+IMPORT_START_TIME = time.perf_counter()
+
 import argparse
+import multiprocessing
 import os
+import shutil
+import tempfile
 from pathlib import Path
 from dotenv import load_dotenv
-from multiprocessing import Pool, Manager
-import traceback
 import json
 
-from tqdm import tqdm
+from core.backends import (
+    BACKEND_ENV_VARIABLE,
+    BACKENDS,
+    HTTP2_ENV_VARIABLE,
+    HTTP_KEEPALIVE_EXPIRY_ENV_VARIABLE,
+    HTTP_MAX_CONNECTIONS_ENV_VARIABLE,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS_ENV_VARIABLE,
+)
+from core.cache import (
+    OFFICIAL_ENV_VARIABLE,
+    EmbeddingCache,
+    GuessCache,
+    ResponseCache,
+    merge_guess_cache_stats,
+)
+from core.dataset import WordList
+from core.distributed import AUTHKEY_ENV_VARIABLE, Coordinator, parse_address, run_worker
+from core.early_stopping import EarlyStopping
+from core.evaluation import check_options, run_agents, run_samples
+from core.hedging import HedgingPolicy, merge_hedging_stats, summarize_hedging
+from core.profiling import WORKERS_SUBFOLDER, AgentProfiler, merge_profiles
+from core.rate_limiter import RateLimiter, RetryPolicy
+from core.resources import ResourceLimits, peak_rss_mb
+from core.results_store import ResultsStore, hash_files
+from core.streaming import JSONLWriter, leaderboard_rows, write_leaderboard
+from core.tracing import PERCENTILES, Tracer, load_spans, summarize_spans
+from core.startup import PRELOAD_MODULES, agent_dependencies, preload
+from core.tester import split_sweep_results
+from core.vector_index import HintsIndex
 
-from core.tester import test_solution
+IMPORT_TIME = time.perf_counter() - IMPORT_START_TIME
 
 
-def _test_solution_multiprocessing(parameters):
-    (
-        id,
-        agent_module_path,
-        test_list,
-        test_hints_level3,
-        french_translations_dict,
-        hints_db,
-        levels,
-        verbose,
-        model_name,
-    ) = parameters
-    try:
-        return test_solution(
-            module_path=agent_module_path,
-            test_list=test_list,
-            hints_list=test_hints_level3,
-            french_translations_dict=french_translations_dict,
-            hints_db=hints_db,
-            levels=levels,
-            verbose=verbose,
-            model_name=model_name,
-            progress_bar_id=id,
-        )
-    except Exception as e:
-        if verbose:
-            traceback.print_exception(e)
-            print(f"There was an uncaught error while running agent {agent_module_path}: {e}")
-        return agent_module_path, e
+MODEL_NAMES = ["gpt-4o-mini", "gpt-4.1-mini", "gpt-4.1-nano"]
 
 
 def main():
@@ -61,9 +67,23 @@ def main():
         "--model-name",
         type=str,
         default="gpt-4o-mini",
-        choices=["gpt-4o-mini", "gpt-4.1-mini", "gpt-4.1-nano"],
+        choices=MODEL_NAMES,
         help="The Azure OpenAI model to use to test the solutions",
     )
+    parser.add_argument(
+        "--guesser-models",
+        type=str,
+        nargs="+",
+        choices=MODEL_NAMES,
+        help="If set, sweep these guesser models in a single run: each hint (generated by the agents with "
+        "--model-name) is guessed by all of them, and there is one leaderboard per model. Defaults to --model-name",
+    )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        choices=BACKENDS,
+        help="The LLM backend to use (the fake one is a deterministic, offline stand-in, configured by TABOO_FAKE_* env variables)",
+    )
     parser.add_argument(
         "--quiet", action=argparse.BooleanOptionalAction, default=False, help="Whether to suppress verbose logging"
     )
@@ -73,6 +93,20 @@ def main():
         default=str(data_folder / "words_with_taboo.txt"),
         help="The path to the file containing words to guess and corresponding taboo words",
     )
+    parser.add_argument(
+        "--num-shards",
+        type=int,
+        default=1,
+        help="Split the words in this many disjoint shards (e.g., to spread a large words file over several runs)",
+    )
+    parser.add_argument("--shard-index", type=int, default=0, help="The shard of the words to test (from 0)")
+    parser.add_argument(
+        "--sample-fraction",
+        type=float,
+        help="If set, only test a deterministic, pseudo-random fraction (between 0 and 1) of the words",
+    )
+    parser.add_argument("--sample-seed", type=int, default=0, help="The seed used to sample the words")
+    parser.add_argument("--max-words", type=int, help="If set, only test the first words (of the shard and sample)")
     parser.add_argument(
         "--hints-path",
         type=str,
@@ -83,7 +117,9 @@ def main():
         "--hints-db-path",
         type=str,
         default=str(data_folder / "level3_data" / "hints_db.json"),
-        help="The path to the file containing the precomputed hints vector DB for the level 3",
+        help="The path to the file containing the precomputed hints vector DB for the level 3 (.json, loaded through "
+        "a .npy index built next to it on first use, or a .npy index, possibly quantized with "
+        "scripts/build_hints_index.py)",
     )
     parser.add_argument(
         "--translations-path",
@@ -100,55 +136,566 @@ def main():
         help="The maximum number of processes to use for testing solutions",
     )
     parser.add_argument("--chunksize", type=int, help="The size of the tasks chunk submitted to each worker")
+    parser.add_argument(
+        "--scheduler",
+        type=str,
+        default="agent",
+        choices=["agent", "sample"],
+        help="How to split the work among processes: one task per agent, or one task per (agent, level, word)",
+    )
+    parser.add_argument(
+        "--start-method",
+        type=str,
+        choices=multiprocessing.get_all_start_methods(),
+        help="How to start the worker processes (defaults to the platform default). With fork and forkserver, the "
+        "heavyweight modules (openai, numpy, the core modules and the packages imported by the agents) are imported "
+        "once, by this process or by the server, and every worker starts with them already loaded",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        help="If set, test the samples with the asyncio engine, keeping up to this number of samples in flight (of each "
+        "agent, or of each group of samples of an agent and level dispatched together by --scheduler sample)",
+    )
+    parser.add_argument(
+        "--guesser-batch-size",
+        type=int,
+        help="If set (requires --max-concurrency), guess the (valid) hints of the samples in flight in batches of this "
+        "size. Development only: the hints of a batch share a prompt, so it is not allowed with --official",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Whether to test the words in rounds (in a random order) and stop testing each agent once its position "
+        "in the ranking is settled, reporting the confidence interval of the scores (requires --scheduler sample)",
+    )
+    parser.add_argument(
+        "--adaptive-confidence",
+        type=float,
+        default=0.95,
+        help="The confidence of --adaptive that no agent is stopped at a wrong position (corrected for the number of "
+        "agents and rounds); the reported intervals have this confidence each",
+    )
+    parser.add_argument(
+        "--adaptive-min-words",
+        type=int,
+        default=20,
+        help="The number of words tested (at each level) before --adaptive stops any agent",
+    )
+    parser.add_argument(
+        "--adaptive-round-words",
+        type=int,
+        default=10,
+        help="The number of words tested (at each level) in each round of --adaptive",
+    )
+    parser.add_argument(
+        "--adaptive-top-k",
+        type=int,
+        help="If set, --adaptive only settles whether each agent is in the top k, instead of its exact position",
+    )
+    parser.add_argument(
+        "--isolate-agents",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Whether to run the agents in separate worker processes, which are killed when a hint times out",
+    )
+
+    # Distributed evaluation parameters (the coordinator and its workers share the secret in TABOO_DISTRIBUTED_AUTHKEY)
+    parser.add_argument(
+        "--coordinator",
+        type=str,
+        help="If set (host:port), serve the samples to the workers connecting to this address (see --worker), "
+        "instead of testing them in a local pool (requires --scheduler sample)",
+    )
+    parser.add_argument(
+        "--worker",
+        type=str,
+        help="If set (host:port), only run --max-workers worker processes testing the samples of the coordinator at "
+        "this address (from a checkout with the same agents), with their own --cache-path and --embedding-cache-path",
+    )
+    parser.add_argument(
+        "--task-timeout",
+        type=float,
+        default=600,
+        help="How long (in seconds) the coordinator waits for a sample before giving it to another worker",
+    )
+    parser.add_argument(
+        "--worker-max-restarts",
+        type=int,
+        default=10,
+        help="How many times the worker processes of --worker that die are restarted (in total)",
+    )
+
+    # Resource limits of the agents (enforced in their worker processes, so they require --isolate-agents)
+    parser.add_argument(
+        "--agent-max-memory-mb",
+        type=float,
+        help="If set, the maximum address space (virtual memory, in MB) of each agent worker process",
+    )
+    parser.add_argument(
+        "--agent-max-cpu-seconds",
+        type=float,
+        help="If set, the maximum CPU time (in seconds) of each agent worker process, which is killed beyond it",
+    )
+    parser.add_argument(
+        "--agent-max-open-files", type=int, help="If set, the maximum number of files open by each agent worker process"
+    )
+
+    # Response cache parameters
+    parser.add_argument("--cache-path", type=str, help="If set, cache the LLM responses in this SQLite file")
+    parser.add_argument("--cache-max-size-mb", type=float, help="The maximum size of the responses cache (in MB)")
+    parser.add_argument(
+        "--cache-max-age-hours", type=float, help="The maximum age of the cached responses (in hours)"
+    )
+    parser.add_argument(
+        "--cache-replay-only",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Whether to only replay cached responses, failing on cache misses instead of calling the API",
+    )
+    parser.add_argument(
+        "--embedding-cache-path",
+        type=str,
+        help="If set, cache the embeddings computed by the agents in this SQLite file (can be the same as --cache-path)",
+    )
+
+    parser.add_argument(
+        "--guess-cache-path",
+        type=str,
+        help="If set (development runs only), reuse the guesses of the same or similar hints, cached in this SQLite file",
+    )
+    parser.add_argument(
+        "--guess-cache-threshold",
+        type=float,
+        default=0.95,
+        help="The minimum cosine similarity between the embeddings of two hints for the guess cache to reuse a guess",
+    )
+    parser.add_argument(
+        "--official",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Whether this is an official scoring run, where approximations (the guess cache) are disabled",
+    )
+
+    # Rate limiting parameters
+    parser.add_argument(
+        "--requests-per-minute", type=float, help="The maximum number of requests per minute, shared by all workers"
+    )
+    parser.add_argument(
+        "--tokens-per-minute", type=float, help="The maximum number of tokens per minute, shared by all workers"
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        help="If set, the maximum number of retries (with jittered exponential backoff, instead of the retries of the "
+        "OpenAI client) of rate limited or failed requests. The backoff of the requests of an agent counts towards its "
+        "hint timeout, so keep it low",
+    )
+
+    # Hedging parameters
+    parser.add_argument(
+        "--hedge-percentile",
+        type=float,
+        help="If set, send a duplicate of the completion requests slower than this percentile of the recent latencies",
+    )
+    parser.add_argument(
+        "--hedge-budget",
+        type=float,
+        default=0.05,
+        help="The maximum number of duplicate (hedge) requests, as a fraction of the requests",
+    )
+
+    # HTTP connection pool parameters (the pool is shared by all the LLM clients of a worker process)
+    parser.add_argument("--http-max-connections", type=int, help="The maximum number of connections per process")
+    parser.add_argument(
+        "--http-max-keepalive-connections", type=int, help="The maximum number of idle connections kept alive per process"
+    )
+    parser.add_argument(
+        "--http-keepalive-expiry", type=float, help="How long (in seconds) idle connections are kept alive"
+    )
+    parser.add_argument(
+        "--http2",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Whether to use HTTP/2 for the Azure OpenAI requests (requires the h2 package)",
+    )
+
+    # Results store parameters
+    parser.add_argument(
+        "--results-path",
+        type=str,
+        help="If set, checkpoint the outcome of every sample in this SQLite file, and only test the samples missing "
+        "from it (or invalidated by a change of the agent source, data files, model or backend)",
+    )
+
+    # Machine-readable output parameters
+    parser.add_argument(
+        "--results-stream-path",
+        type=str,
+        help="If set, stream the results to this JSONL file as they complete (one line per sample and per agent)",
+    )
+    parser.add_argument(
+        "--leaderboard-path",
+        type=str,
+        help="If set, write the final leaderboard to this file (in JSON format if it ends with .json, CSV otherwise)",
+    )
+
+    # Tracing parameters
+    parser.add_argument(
+        "--trace-path",
+        type=str,
+        help="If set, write a JSONL trace of the timing and token usage of every stage (and print its percentiles)",
+    )
+
+    # Profiling parameters
+    parser.add_argument(
+        "--profile-dir",
+        type=str,
+        help="If set, profile the agents (cProfile and tracemalloc) and write a .prof file and the top allocation "
+        "sites of each agent to this folder",
+    )
 
     args = parser.parse_args()
 
     load_dotenv(dotenv_path=repo_folder / ".env", override=True)
+    # Set through the environment, so that it is inherited by all the processes of the run
+    if args.backend is not None:
+        os.environ[BACKEND_ENV_VARIABLE] = args.backend
+    if args.official:
+        os.environ[OFFICIAL_ENV_VARIABLE] = "1"
+    for env_variable, value in [
+        (HTTP_MAX_CONNECTIONS_ENV_VARIABLE, args.http_max_connections),
+        (HTTP_MAX_KEEPALIVE_CONNECTIONS_ENV_VARIABLE, args.http_max_keepalive_connections),
+        (HTTP_KEEPALIVE_EXPIRY_ENV_VARIABLE, args.http_keepalive_expiry),
+        (HTTP2_ENV_VARIABLE, 1 if args.http2 else None),
+    ]:
+        if value is not None:
+            os.environ[env_variable] = str(value)
 
-    test_list = [line.split(":") for line in open(args.words_path).read().splitlines()]
-    test_list = [
-        (guess_word.strip().lower(), [word.strip().lower() for word in taboo_list.split(":")])
-        for guess_word, taboo_list in test_list
-    ]
+    try:
+        check_options(args)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.worker is not None:
+        # The data and settings come from the coordinator, only the (host-local) caches are set here
+        overrides = {}
+        if args.cache_path is not None:
+            overrides["cache"] = ResponseCache(args.cache_path)
+        if args.embedding_cache_path is not None:
+            overrides["embedding_cache"] = EmbeddingCache(args.embedding_cache_path)
+        # Imported once, by the process forking the worker processes (the agents are only known once connected)
+        preload(PRELOAD_MODULES)
+        run_worker(
+            parse_address(args.worker),
+            os.environ[AUTHKEY_ENV_VARIABLE].encode("utf-8"),
+            processes=args.max_workers,
+            overrides=overrides,
+            max_restarts=args.worker_max_restarts,
+        )
+        return
+
+    start_time = time.time()
+
+    # The hints of the agents are guessed by each of these models
+    guesser_models = list(dict.fromkeys(args.guesser_models or [args.model_name]))
+
+    # Streamed from the file, and only this shard (and sample) of the words is kept, in a compact form
+    dataset_spec = {
+        "shard_index": args.shard_index,
+        "num_shards": args.num_shards,
+        "sample_fraction": args.sample_fraction,
+        "seed": args.sample_seed,
+        "max_words": args.max_words,
+    }
+    test_list = WordList.load(args.words_path, **dataset_spec)
     test_hints_level3 = [hint.strip() for hint in open(args.hints_path).read().splitlines()]
 
     # Load french guesses translations dict
     with open(args.translations_path, "r") as f:
         french_translations_dict = json.load(f)
 
-    with open(args.hints_db_path, "r") as f:
-        hints_db = json.load(f)
+    # Memory-mapped from a .npy index, so it is pickled by path (and shared by the workers via the page cache)
+    if Path(args.hints_db_path).suffix == ".json":
+        hints_db = HintsIndex.load_cached(args.hints_db_path)
+    else:
+        hints_db = HintsIndex.load(args.hints_db_path)
 
-    use_tqdm = args.quiet
-    tasks_parameters = []
-    for i, agent_module_path in enumerate(Path(args.folder).iterdir()):
-        if not agent_module_path.is_file() or agent_module_path.suffix != ".py":
-            continue
+    cache = None
+    if args.cache_path is not None:
+        cache = ResponseCache(
+            path=args.cache_path,
+            max_size_mb=args.cache_max_size_mb,
+            max_age_seconds=args.cache_max_age_hours * 3600 if args.cache_max_age_hours is not None else None,
+            replay_only=args.cache_replay_only,
+        )
+    embedding_cache = EmbeddingCache(args.embedding_cache_path) if args.embedding_cache_path is not None else None
+    guess_cache = None
+    if args.guess_cache_path is not None:
+        guess_cache = GuessCache(args.guess_cache_path, similarity_threshold=args.guess_cache_threshold)
+
+    # The rate limiter state lives in a temporary file shared by all the worker processes of this run
+    rate_limiter = None
+    if args.requests_per_minute is not None or args.tokens_per_minute is not None:
+        rate_limiter_folder = tempfile.TemporaryDirectory(prefix="taboo-rate-limiter-")
+        rate_limiter = RateLimiter(
+            path=Path(rate_limiter_folder.name) / "rate_limiter.sqlite",
+            requests_per_minute=args.requests_per_minute,
+            tokens_per_minute=args.tokens_per_minute,
+        )
+    retry_policy = None
+    if args.max_retries is not None:
+        retry_policy = RetryPolicy(max_retries=args.max_retries)
+    hedging_policy = None
+    if args.hedge_percentile is not None:
+        hedging_policy = HedgingPolicy(percentile=args.hedge_percentile, max_hedge_ratio=args.hedge_budget)
+
+    results_store, fingerprints = None, {}
+    if args.results_path is not None:
+        results_store = ResultsStore(args.results_path)
+
+    results_stream = None
+    if args.results_stream_path is not None:
+        Path(args.results_stream_path).parent.mkdir(parents=True, exist_ok=True)
+        open(args.results_stream_path, "w").close()
+        results_stream = JSONLWriter(args.results_stream_path)
+
+    tracer = None
+    if args.trace_path is not None:
+        # Every process of the run appends to the same trace, which starts empty
+        Path(args.trace_path).parent.mkdir(parents=True, exist_ok=True)
+        open(args.trace_path, "w").close()
+        tracer = Tracer(args.trace_path)
+
+    profiler = None
+    if args.profile_dir is not None:
+        # Every process of the run writes its own profiles there, merged at the end of the run
+        shutil.rmtree(Path(args.profile_dir) / WORKERS_SUBFOLDER, ignore_errors=True)
+        profiler = AgentProfiler(args.profile_dir)
+
+    resource_limits = ResourceLimits(
+        max_memory_mb=args.agent_max_memory_mb,
+        max_cpu_seconds=args.agent_max_cpu_seconds,
+        max_open_files=args.agent_max_open_files,
+    )
+
+    agent_paths = [
+        agent_module_path
+        for agent_module_path in Path(args.folder).iterdir()
+        if agent_module_path.is_file() and agent_module_path.suffix == ".py"
+    ]
+    if results_store is not None:
+        data_paths = [args.words_path, args.hints_path, args.translations_path, args.hints_db_path]
+        if Path(args.hints_db_path).suffix == ".npy":
+            data_paths.append(HintsIndex.sidecar_path(args.hints_db_path))
+            if hints_db.scales is not None:
+                data_paths.append(HintsIndex.scales_path(args.hints_db_path))
+        # The results are keyed by word index, which depends on the shard and sample of the words
+        data_digest = hash_files(data_paths) + json.dumps(dataset_spec, sort_keys=True)
+        backend = os.environ.get(BACKEND_ENV_VARIABLE, "azure")
+        if guess_cache is not None:
+            # The outcomes of approximated guesses must not be reused by runs without the guess cache (or vice versa)
+            backend += f"+guess-cache:{args.guess_cache_threshold}"
+        fingerprints = {
+            agent_path: ResultsStore.fingerprint(agent_path, data_digest, args.model_name, backend)
+            for agent_path in agent_paths
+        }
+
+    loading_time = time.time() - start_time
+
+    # The heavyweight modules are imported once, before starting the workers, instead of once per worker
+    mp_context = multiprocessing.get_context(args.start_method)
+    preload_modules = PRELOAD_MODULES + agent_dependencies(agent_paths)
+    preload_start_time = time.perf_counter()
+    if mp_context.get_start_method() == "forkserver":
+        mp_context.set_forkserver_preload(preload_modules)
+    elif mp_context.get_start_method() == "fork":
+        preload(preload_modules)
+    preload_time = time.perf_counter() - preload_start_time
 
-        tasks_parameters.append((
-            i,
-            agent_module_path,
-            test_list,
-            test_hints_level3,
-            french_translations_dict,
-            hints_db,
-            args.levels,
-            not args.quiet,
-            args.model_name,
-        ))
-
-    processes = min(args.max_workers, len(tasks_parameters))
-    chunksize = args.chunksize
-    if chunksize is not None:
-        chunksize = min(args.chunksize, len(tasks_parameters) // processes + 1)
-    with Manager() as manager, Pool(processes=processes, initializer=tqdm.set_lock, initargs=(manager.Lock(),)) as p:
-        results = p.map(_test_solution_multiprocessing, tasks_parameters, chunksize=chunksize)
-
-    # Only if tqdm was used, leave some space
-    if use_tqdm:
-        print("\n" * len(tasks_parameters))
-
-    print(f"\n{'POS':<3} | {'AGENT NAME':<30} | {'TIME':<8} | {'CORRECT':<11} | {'POINTS':<12} | EXCEPTIONS | ACCURACY")
+    # The read-only data and settings are shipped once per worker (by the pool initializer), tasks only carry the
+    # agent (and its progress bar id, or the level and word to test)
+    context = {
+        "test_list": test_list,
+        "hints_list": test_hints_level3,
+        "french_translations_dict": french_translations_dict,
+        "hints_db": hints_db,
+        "levels": args.levels,
+        "model_name": args.model_name,
+        "verbose": not args.quiet,
+        "max_concurrency": args.max_concurrency,
+        "cache": cache,
+        "embedding_cache": embedding_cache,
+        "isolate_agents": args.isolate_agents,
+        "rate_limiter": rate_limiter,
+        "retry_policy": retry_policy,
+        "tracer": tracer,
+        "results_store": results_store,
+        "fingerprints": fingerprints,
+        "results_stream": results_stream,
+        "guesser_batch_size": args.guesser_batch_size,
+        "hedging_policy": hedging_policy,
+        "guesser_models": guesser_models,
+        "profiler": profiler,
+        "resource_limits": resource_limits if resource_limits else None,
+        "guess_cache": guess_cache,
+    }
+
+    if args.scheduler == "sample":
+        coordinator = None
+        if args.coordinator is not None:
+            # The workers connect to it from any host, instead of being started here
+            coordinator = Coordinator(
+                parse_address(args.coordinator),
+                os.environ[AUTHKEY_ENV_VARIABLE].encode("utf-8"),
+                context,
+                agent_paths,
+                task_timeout=args.task_timeout,
+            )
+        early_stopping = None
+        if args.adaptive:
+            early_stopping = EarlyStopping(
+                agent_paths,
+                levels=args.levels,
+                num_words=len(test_list),
+                confidence=args.adaptive_confidence,
+                min_words=args.adaptive_min_words,
+                round_words=args.adaptive_round_words,
+                top_k=args.adaptive_top_k,
+                seed=args.sample_seed,
+            )
+        results, worker_startups = run_samples(
+            context,
+            agent_paths,
+            mp_context,
+            args.max_workers,
+            chunksize=args.chunksize,
+            coordinator=coordinator,
+            early_stopping=early_stopping,
+        )
+    else:
+        results, worker_startups = run_agents(context, agent_paths, mp_context, args.max_workers, args.chunksize)
+
+    # One leaderboard per guesser model (a single one, unless sweeping several models)
+    for guesser_model, model_results in split_sweep_results(results, guesser_models).items():
+        if len(guesser_models) > 1:
+            print(f"\nGuesser model: {guesser_model}")
+        print_leaderboard(model_results)
+        if args.leaderboard_path is not None:
+            leaderboard_path = Path(args.leaderboard_path)
+            if len(guesser_models) > 1:
+                leaderboard_path = leaderboard_path.with_stem(f"{leaderboard_path.stem}-{guesser_model}")
+            write_leaderboard(leaderboard_path, leaderboard_rows(model_results))
+
+    if cache is not None:
+        hits = sum(result.get("cache_stats", {}).get("hits", 0) for result in results if isinstance(result, dict))
+        misses = sum(result.get("cache_stats", {}).get("misses", 0) for result in results if isinstance(result, dict))
+        print(f"\nResponse cache: {hits} hits, {misses} misses ({hits / max(1, hits + misses) * 100:.1f}% hit rate)")
+    if embedding_cache is not None:
+        hits = sum(
+            result.get("embedding_cache_stats", {}).get("hits", 0) for result in results if isinstance(result, dict)
+        )
+        misses = sum(
+            result.get("embedding_cache_stats", {}).get("misses", 0) for result in results if isinstance(result, dict)
+        )
+        print(f"Embedding cache: {hits} hits, {misses} misses ({hits / max(1, hits + misses) * 100:.1f}% hit rate)")
+
+    if guess_cache is not None:
+        guess_stats = merge_guess_cache_stats(
+            result.get("guess_cache_stats", {}) for result in results if isinstance(result, dict)
+        )
+        total = max(1, sum(guess_stats.values()))
+        print(
+            f"Guess cache: {guess_stats['exact_hits']} exact hits, {guess_stats['semantic_hits']} semantic hits, "
+            f"{guess_stats['misses']} misses ({guess_stats['exact_hits'] / total * 100:.1f}% exact, "
+            f"{guess_stats['semantic_hits'] / total * 100:.1f}% semantic hit rate)"
+        )
+
+    if args.guesser_batch_size is not None:
+        batches = sum(result.get("guesser_batches", 0) for result in results if isinstance(result, dict))
+        fallbacks = sum(result.get("guesser_fallbacks", 0) for result in results if isinstance(result, dict))
+        print(f"Batched guesser: {batches} batched requests, {fallbacks} hints guessed one by one (fallback)")
+
+    if rate_limiter is not None or retry_policy is not None:
+        retries = sum(result.get("retries", 0) for result in results if isinstance(result, dict))
+        wait = sum(result.get("rate_limiter_wait", 0) for result in results if isinstance(result, dict))
+        print(f"Rate limiting: {retries} retries, {wait:.1f}s spent waiting for the rate limiter")
+
+    if hedging_policy is not None:
+        hedging = summarize_hedging(
+            merge_hedging_stats(result.get("hedging_stats", {}) for result in results if isinstance(result, dict))
+        )
+        print(
+            f"Hedging: {hedging['hedges']} hedges for {hedging['requests']} requests ({hedging['hedge_rate'] * 100:.1f}% "
+            f"hedge rate, {hedging['hedge_wins']} answered first, {hedging['over_budget']} skipped over budget)"
+        )
+        print(
+            "Hedging latency: "
+            + ", ".join(
+                f"P{percentile} {hedging['unhedged_latency'][f'p{percentile}']:.3f}s -> "
+                f"{hedging['latency'][f'p{percentile}']:.3f}s"
+                for percentile in PERCENTILES
+            )
+            + " (without -> with hedging)"
+        )
+
+    if args.adaptive:
+        tested = sum(result.get("tested_samples", 0) for result in results if isinstance(result, dict))
+        total = len(args.levels) * len(test_list) * sum(isinstance(result, dict) for result in results)
+        stopped = sum(result.get("stopped_early", False) for result in results if isinstance(result, dict))
+        print(
+            f"Adaptive evaluation: {tested}/{total} samples tested ({(total - tested) / max(1, total) * 100:.1f}% saved), "
+            f"{stopped} agents stopped early (marked with *, {args.adaptive_confidence * 100:g}% confidence intervals)"
+        )
+
+    if args.coordinator is not None:
+        hosts = {worker.rsplit(":", 1)[0] for worker in coordinator.workers}
+        print(
+            f"Distributed: {len(coordinator.workers)} worker processes on {len(hosts)} hosts, "
+            f"{coordinator.requeued_tasks} tasks given to another worker (lost or timed out)"
+        )
+
+    if results_store is not None:
+        reused = sum(result.get("reused_samples", 0) for result in results if isinstance(result, dict))
+        total = len(args.levels) * len(test_list) * sum(isinstance(result, dict) for result in results)
+        print(f"Results store: {reused} samples reused, {total - reused} tested")
+
+    agent_load_time = sum(result.get("agent_load_time", 0) for result in results if isinstance(result, dict))
+    print(
+        f"\nStartup: imports {IMPORT_TIME:.2f}s, preload {preload_time:.2f}s - {len(worker_startups)} workers started "
+        f"({mp_context.get_start_method()}) in {max(worker_startups.values(), default=0):.2f}s (slowest) - "
+        f"agents loaded in {agent_load_time:.2f}s (total)"
+    )
+
+    if tracer is not None:
+        print_trace_summary(summarize_spans(load_spans(args.trace_path)))
+
+    if profiler is not None:
+        agent_names = {
+            Path(result["agent_path"]).stem: result["agent_name"] for result in results if isinstance(result, dict)
+        }
+        print_profile_summary(merge_profiles(args.profile_dir), agent_names)
+        print(f"Profiles written to {args.profile_dir} (<agent>.prof and <agent>.allocations.json)")
+
+    main_peak_rss, workers_peak_rss = peak_rss_mb(), peak_rss_mb(children=True)
+    print(f"\nData loading: {loading_time:.2f}s - Total time: {time.time() - start_time:.2f}s", end="")
+    if main_peak_rss is not None:
+        print(f" - Peak RSS: {main_peak_rss:.0f} MB (main), {workers_peak_rss:.0f} MB (largest worker)")
+    else:
+        print()
+
+
+def print_leaderboard(results: list):
+    # The resource usage is only measured for isolated agents
+    show_resources = any(isinstance(result, dict) and "agent_resources" in result for result in results)
+    resources_header = f"{'PEAK RSS':<9} | {'CPU':<8} | " if show_resources else ""
+    # The scores of an adaptive evaluation are estimates, with their confidence interval
+    show_intervals = any(isinstance(result, dict) and "score_interval" in result for result in results)
+    interval_header = f"{'SCORE INTERVAL':<16} | " if show_intervals else ""
+    print(
+        f"\n{'POS':<3} | {'AGENT NAME':<30} | {'TIME':<8} | {'CORRECT':<11} | {'POINTS':<12} | {interval_header}"
+        f"EXCEPTIONS | {resources_header}ACCURACY"
+    )
     for i, result in enumerate(
         sorted(results, key=lambda el: el["score"] if isinstance(el, dict) else -1000, reverse=True)
     ):
@@ -158,7 +705,7 @@ def main():
             print(f"N/A | {str(agent_path):<30} | ERROR: {error}")
             continue
 
-        name, time, raw_results, accuracy, score, exceptions = (
+        name, execution_time, raw_results, accuracy, score, exceptions = (
             result["agent_name"],
             result["execution_time"],
             result["raw_results"],
@@ -167,8 +714,55 @@ def main():
             result["exceptions"],
         )
         total_correct = sum(el["correct"] for el in raw_results.values())
+        resources = ""
+        if show_resources:
+            agent_resources = result.get("agent_resources")
+            resources = (
+                f"{agent_resources['peak_rss_mb']:>6.0f} MB | {agent_resources['cpu_time']:>7.2f}s | "
+                if agent_resources is not None
+                else f"{'N/A':<9} | {'N/A':<8} | "
+            )
+        interval = ""
+        if show_intervals:
+            low, high = result.get("score_interval", (score, score))
+            stopped = "*" if result.get("stopped_early") else ""
+            interval = f"{f'[{low}, {high}]{stopped}':<16} | "
+        print(
+            f"{i + 1:<3} | {name[:30]:<30} | {round(execution_time, 2):<7}s | {total_correct:<3} correct | {score:<5} points | {interval}{exceptions:<10} | {resources}{accuracy}"
+        )
+
+
+def print_trace_summary(summary: dict):
+    percentiles_header = " | ".join(f"{f'P{percentile}':>8}" for percentile in PERCENTILES)
+
+    def print_row(name: str, stage: str, stage_summary: dict):
+        percentiles = " | ".join(f"{stage_summary[f'p{percentile}']:>7.3f}s" for percentile in PERCENTILES)
+        print(
+            f"{name[:30]:<30} | {stage:<16} | {stage_summary['count']:>7} | {percentiles} | "
+            f"{stage_summary['queue_wait']:>9.1f}s | {stage_summary['retries']:>7} | "
+            f"{stage_summary['prompt_tokens']:>9} | {stage_summary['completion_tokens']:>9}"
+        )
+
+    print(
+        f"\n{'AGENT':<30} | {'STAGE':<16} | {'COUNT':>7} | {percentiles_header} | {'QUEUE WAIT':>10} | "
+        f"{'RETRIES':>7} | {'PROMPT TK':>9} | {'COMPL. TK':>9}"
+    )
+    for stage, stage_summary in summary["stages"].items():
+        print_row("ALL", stage, stage_summary)
+    for agent, stages in sorted(summary["agents"].items()):
+        for stage, stage_summary in stages.items():
+            print_row(agent, stage, stage_summary)
+
+
+def print_profile_summary(summaries: dict, agent_names: dict):
+    print(f"\n{'AGENT':<30} | {'CALLS':>6} | {'TIME':>8} | {'TOP FUNCTION (OWN TIME)':<50} | TOP ALLOCATION SITE")
+    for key, summary in sorted(summaries.items()):
+        function, function_time = summary["hotspots"][0] if summary["hotspots"] else ("-", 0.0)
+        site = summary["sites"][0] if summary["sites"] else None
+        site_text = f"{site['site']} ({site['size'] / 1024 / 1024:.1f} MB)" if site is not None else "-"
         print(
-            f"{i + 1:<3} | {name[:30]:<30} | {round(time, 2):<7}s | {total_correct:<3} correct | {score:<5} points | {exceptions:<10} | {accuracy}"
+            f"{agent_names.get(key, key)[:30]:<30} | {summary['calls']:>6} | {summary['time']:>7.2f}s | "
+            f"{f'{function[:40]} ({function_time:.2f}s)':<50} | {site_text}"
         )
 
 
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from core.vector_index import HintsIndex
+
+TEST_LIST = [("apple", ["fruit", "red"]), ("car", ["drive", "road"]), ("piano", ["music", "keys"])]
+
+AGENT_SOURCE = '''
+import os
+
+from core.agent import Agent
+
+
+class TestAgent(Agent):
+    def get_name(self) -> str:
+        return "{name}"
+
+    def get_hint(self, taboo_list: list[str], guess_word: str, level: int) -> str:
+        {body}
+
+    def custom_similarity_search(self, query: str, k: int = 1) -> list[str]:
+        return []
+'''
+
+
+@pytest.fixture
+def make_context():
+    """Return a function building the evaluation context of the worker processes (see `init_worker`)."""
+
+    def make_context(**overrides) -> dict:
+        context = {
+            "test_list": TEST_LIST,
+            "hints_list": [],
+            "french_translations_dict": {},
+            "hints_db": HintsIndex(["a hint"], np.ones((1, 4), dtype=np.float32)),
+            "levels": [1],
+            "model_name": "gpt-4o-mini",
+            "verbose": False,
+            "max_concurrency": None,
+            "cache": None,
+            "embedding_cache": None,
+            "isolate_agents": False,
+            "rate_limiter": None,
+            "retry_policy": None,
+            "tracer": None,
+            "results_store": None,
+            "fingerprints": {},
+            "results_stream": None,
+            "guesser_batch_size": None,
+            "hedging_policy": None,
+            "guesser_models": ["gpt-4o-mini"],
+            "profiler": None,
+            "resource_limits": None,
+            "guess_cache": None,
+        }
+        context.update(overrides)
+        return context
+
+    return make_context
+
+
+@pytest.fixture
+def write_agent(tmp_path):
+    """Return a function writing an agent named `name`, whose `get_hint` runs `body`, and returning its path."""
+
+    def write_agent(name: str, body: str) -> str:
+        path = tmp_path / f"{name}.py"
+        path.write_text(AGENT_SOURCE.format(name=name, body=body))
+        return str(path)
+
+    return write_agent
@@ -0,0 +1,149 @@
+import asyncio
+import pickle
+from types import SimpleNamespace
+
+import httpx
+import numpy as np
+import openai
+import pytest
+
+from core.answer_generation import LLM
+from core.cache import OFFICIAL_ENV_VARIABLE, EmbeddingCache, GuessCache, ResponseCache
+from core.errors import CacheMissError
+from core.guesser import CachedGuesser
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr("core.cache.time.time", clock.time)
+    return clock
+
+
+def test_response_cache_hits_and_misses(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.db")
+    key = cache.make_key("gpt-4o-mini", {"messages": [{"role": "user", "content": "hi"}]})
+    assert key == cache.make_key("gpt-4o-mini", {"messages": [{"content": "hi", "role": "user"}]})
+    assert key != cache.make_key("gpt-4.1-mini", {"messages": [{"role": "user", "content": "hi"}]})
+    assert cache.get(key) is None
+    cache.put(key, "hello")
+    assert cache.get(key) == "hello"
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+    # Pickled into the worker processes, where it reconnects to the same database
+    assert pickle.loads(pickle.dumps(cache)).get(key) == "hello"
+
+
+def test_response_cache_evicts_the_least_recently_used_entries(tmp_path, clock):
+    # Room for two 100-byte entries
+    cache = ResponseCache(tmp_path / "cache.db", max_size_mb=250 / 1024 / 1024)
+    for key in "abc":
+        cache.put(key, key * 100)
+        clock.now += 1
+    cache.get("a")
+    cache.evict()
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.get("b") is None
+
+
+def test_response_cache_expires_old_entries(tmp_path, clock):
+    cache = ResponseCache(tmp_path / "cache.db", max_age_seconds=60)
+    cache.put("old", "answer")
+    clock.now += 45
+    cache.put("new", "answer")
+    clock.now += 30
+    # Expired entries are never returned, and are dropped on eviction
+    assert cache.get("old") is None and cache.get("new") == "answer"
+    cache.evict()
+    assert cache._connection.execute("SELECT key FROM responses").fetchall() == [("new",)]
+
+
+def test_replay_only_cache_raises_on_misses(tmp_path):
+    ResponseCache(tmp_path / "cache.db").put("key", "answer")
+    cache = ResponseCache(tmp_path / "cache.db", replay_only=True)
+    assert cache.get("key") == "answer"
+    with pytest.raises(CacheMissError):
+        cache.get("other key")
+
+
+def test_error_answers_are_not_cached(tmp_path, monkeypatch):
+    llm = LLM(hints_db={}, verbose=False, cache=ResponseCache(tmp_path / "cache.db"), backend="fake")
+    response = httpx.Response(429, request=httpx.Request("POST", "http://localhost/fake"))
+
+    def rate_limited(request, span=None):
+        raise openai.RateLimitError("Rate limit", response=response, body=None)
+
+    monkeypatch.setattr(llm, "_create_completion", rate_limited)
+    assert llm.generate_answer("hi") == "RATE_LIMIT_ERROR"
+    monkeypatch.undo()
+    answer = llm.generate_answer("hi")
+    assert answer != "RATE_LIMIT_ERROR"
+    assert llm.generate_answer("hi") == answer
+    assert llm.cache.stats()["hits"] == 1
+
+
+def test_embedding_cache_round_trip(tmp_path):
+    cache = EmbeddingCache(tmp_path / "cache.db")
+    embeddings = {"apple": [0.1, 1 / 3, -2.0], "pear": [1e-300, 0.0, 7.25]}
+    cache.put_many("model", embeddings)
+    # Float64 vectors, returned exactly
+    assert cache.get_many("model", ["apple", "pear", "plum"]) == embeddings
+    assert cache.get_many("other model", ["apple"]) == {}
+    assert cache.stats() == {"hits": 2, "misses": 2, "hit_rate": 0.5}
+
+
+def unit_vector(*values: float) -> list[float]:
+    vector = np.array(values, dtype=np.float64)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def test_guess_cache_exact_and_semantic_lookups(tmp_path):
+    cache = GuessCache(tmp_path / "guesses.db", similarity_threshold=0.9)
+    cache.put("model", "A red fruit!", "apple", unit_vector(1, 0, 0))
+    assert cache.get_exact("model", "a  RED fruit") == "apple"
+    assert cache.get_exact("other model", "a red fruit") is None
+    assert cache.get_similar("model", unit_vector(1, 0.1, 0)) == "apple"
+    assert cache.get_similar("model", unit_vector(1, 1, 0)) is None
+    assert cache.get_similar("model", None) is None
+    assert cache.collect_stats() == {"exact_hits": 1, "semantic_hits": 1, "misses": 2}
+    assert cache.collect_stats() == {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+
+
+def test_guess_cache_is_disabled_in_official_mode(tmp_path, monkeypatch):
+    cache = GuessCache(tmp_path / "guesses.db")
+    monkeypatch.setenv(OFFICIAL_ENV_VARIABLE, "1")
+    with pytest.raises(RuntimeError):
+        GuessCache(tmp_path / "guesses.db")
+    with pytest.raises(RuntimeError):
+        cache.get_exact("model", "a red fruit")
+
+
+class StubGuesser:
+    def __init__(self, guesses: list[str]):
+        self.llm = SimpleNamespace(model_name="model", embed_text=lambda text: unit_vector(len(text), 1, 0))
+        self.guesses = guesses
+
+    def get_guess(self, hint):
+        return self.guesses.pop(0)
+
+    async def aget_guess(self, hint):
+        return self.guesses.pop(0)
+
+
+def test_cached_guesser_does_not_cache_error_answers(tmp_path):
+    guesser = CachedGuesser(StubGuesser(["rate_limit_error", "apple"]), GuessCache(tmp_path / "guesses.db"))
+    assert guesser.get_guess("a red fruit") == "rate_limit_error"
+    assert guesser.get_guess("a red fruit") == "apple"
+    assert guesser.get_guess("a red fruit") == "apple"
+
+    guesser = CachedGuesser(StubGuesser(["api_error_500", "pear"]), GuessCache(tmp_path / "other_guesses.db"))
+    assert asyncio.run(guesser.aget_guess("a green fruit")) == "api_error_500"
+    assert asyncio.run(guesser.aget_guess("a green fruit")) == "pear"
+    assert asyncio.run(guesser.aget_guess("a green fruit")) == "pear"
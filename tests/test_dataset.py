@@ -0,0 +1,70 @@
+import pickle
+
+import pytest
+
+from core.dataset import WordList, iter_words, parse_words_line
+
+WORDS = [(f"word{i}", [f"taboo{i}a", f"taboo{i}b"]) for i in range(100)]
+
+
+@pytest.fixture
+def words_path(tmp_path):
+    path = tmp_path / "words.txt"
+    lines = ["# A comment", ""] + [f"{word}: {', '.join(taboo_list)}" for word, taboo_list in WORDS]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+def test_parse_words_line():
+    assert parse_words_line("Apple: Fruit,  RED , tree\n") == ("apple", ["fruit", "red", "tree"])
+    assert parse_words_line("apple") == ("apple", [])
+    assert parse_words_line("apple: fruit,, ") == ("apple", ["fruit"])
+    assert parse_words_line("   \n") is None
+    assert parse_words_line("# apple: fruit") is None
+    with pytest.raises(ValueError):
+        parse_words_line(": fruit, red")
+
+
+def test_iter_words_skips_blank_lines_and_comments(words_path):
+    assert list(iter_words(words_path)) == WORDS
+
+
+def test_shards_are_disjoint_and_cover_the_file(words_path):
+    shards = [list(iter_words(words_path, shard_index=i, num_shards=3)) for i in range(3)]
+    assert sorted(entry for shard in shards for entry in shard) == sorted(WORDS)
+    assert [len(shard) for shard in shards] == [34, 33, 33]
+    # Round-robin by word
+    assert shards[1][:2] == [WORDS[1], WORDS[4]]
+    with pytest.raises(ValueError):
+        list(iter_words(words_path, shard_index=3, num_shards=3))
+
+
+def test_sampling_is_deterministic_and_independent_of_the_sharding(words_path):
+    sample = list(iter_words(words_path, sample_fraction=0.3, seed=1))
+    assert sample == list(iter_words(words_path, sample_fraction=0.3, seed=1))
+    assert 15 <= len(sample) <= 45
+    assert sample != list(iter_words(words_path, sample_fraction=0.3, seed=2))
+    sharded_sample = [
+        entry
+        for i in range(2)
+        for entry in iter_words(words_path, shard_index=i, num_shards=2, sample_fraction=0.3, seed=1)
+    ]
+    assert sorted(sharded_sample) == sorted(sample)
+
+
+def test_max_words(words_path):
+    assert list(iter_words(words_path, max_words=5)) == WORDS[:5]
+    assert list(iter_words(words_path, shard_index=1, num_shards=2, max_words=3)) == [WORDS[1], WORDS[3], WORDS[5]]
+    sample = list(iter_words(words_path, sample_fraction=0.5, seed=0))
+    assert list(iter_words(words_path, sample_fraction=0.5, seed=0, max_words=4)) == sample[:4]
+
+
+def test_word_list(words_path):
+    words = WordList.load(words_path, max_words=10)
+    assert len(words) == 10
+    assert words[3] == WORDS[3] and words[-1] == WORDS[9]
+    assert list(words) == WORDS[:10]
+    sliced = words[2:5]
+    assert isinstance(sliced, WordList) and list(sliced) == WORDS[2:5]
+    assert list(pickle.loads(pickle.dumps(words))) == WORDS[:10]
+    assert list(WordList()) == []
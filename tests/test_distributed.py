@@ -0,0 +1,127 @@
+import math
+import socket
+import threading
+import time
+from multiprocessing.connection import Client
+
+import pytest
+
+from core.backends import BACKEND_ENV_VARIABLE
+from core.distributed import Coordinator, run_worker
+from core.scheduler import make_sample_tasks
+
+AUTHKEY = b"test secret"
+
+
+def free_address() -> tuple[str, int]:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()
+
+
+def connect_worker(address, name: str):
+    # A worker speaking the protocol of `_worker_main`, driven by the test
+    connection = Client(address, authkey=AUTHKEY)
+    connection.send(name)
+    connection.recv_bytes()
+    return connection
+
+
+@pytest.mark.parametrize("max_concurrency", [None, 2])
+def test_samples_of_killed_workers_are_requeued_then_counted_as_agent_errors(
+    make_context, write_agent, monkeypatch, max_concurrency
+):
+    monkeypatch.setenv(BACKEND_ENV_VARIABLE, "fake")
+    good_agent = write_agent("good", 'return "a round object"')
+    # Kills the worker process running it
+    crashing_agent = write_agent("crashing", "os._exit(3)")
+    agent_paths = [good_agent, crashing_agent]
+    context = make_context(max_concurrency=max_concurrency)
+    num_words = len(context["test_list"])
+    address = free_address()
+
+    with Coordinator(address, AUTHKEY, context, agent_paths, max_attempts=2) as coordinator:
+        # A worker restarted after the last sample keeps trying to connect for `connect_timeout`
+        workers = threading.Thread(
+            target=run_worker, args=(address, AUTHKEY), kwargs={"processes": 2, "connect_timeout": 1}
+        )
+        workers.start()
+        tasks = make_sample_tasks(agent_paths, levels=[1], num_words=num_words)
+        results = list(coordinator.imap_unordered(tasks))
+    workers.join(timeout=30)
+    assert not workers.is_alive()
+
+    assert sorted((result["agent_path"], result["word_index"]) for result in results) == sorted(
+        (agent_path, word_index) for agent_path, _, word_index in tasks
+    )
+    for result in results:
+        if result["agent_path"] == good_agent:
+            assert result["agent_name"] == "good"
+            assert result["outcomes"]["gpt-4o-mini"] in ("correct", "incorrect")
+        else:
+            assert result["agent_name"] is None
+            assert result["outcomes"] == {"gpt-4o-mini": "agent_error"}
+    # Each group of samples of the crashing agent was dispatched twice
+    assert coordinator.requeued_tasks == math.ceil(num_words / (max_concurrency or 1))
+
+
+def test_timed_out_samples_are_requeued_and_late_results_dropped(make_context):
+    address = free_address()
+    task = ("agent.py", 1, 0)
+    results = []
+    with Coordinator(address, AUTHKEY, make_context(), ["agent.py"], task_timeout=0.5) as coordinator:
+        runner = threading.Thread(target=lambda: results.extend(coordinator.imap_unordered([task])))
+        runner.start()
+        slow_worker = connect_worker(address, "slow")
+        slow_worker.send(None)
+        task_id, group = slow_worker.recv()
+        assert group == [task]
+
+        # The slow worker doesn't answer in time, so the task goes to the next worker
+        fast_worker = connect_worker(address, "fast")
+        fast_worker.send(None)
+        assert fast_worker.poll(10)
+        assert fast_worker.recv() == (task_id, [task])
+        assert coordinator.requeued_tasks == 1
+
+        result = {"agent_path": task[0], "level": 1, "word_index": 0, "agent_name": "agent", "execution_time": 1.0}
+        fast_worker.send((task_id, [dict(result, outcomes={"gpt-4o-mini": "correct"})]))
+        runner.join(timeout=10)
+        assert [result["outcomes"] for result in results] == [{"gpt-4o-mini": "correct"}]
+
+        # The late result of the slow worker is dropped
+        slow_worker.send((task_id, [dict(result, outcomes={"gpt-4o-mini": "incorrect"})]))
+        time.sleep(0.5)
+        assert coordinator._results.empty()
+        slow_worker.close()
+        fast_worker.close()
+
+
+@pytest.mark.parametrize("max_attempts", [1, 2])
+def test_samples_of_disconnected_workers_are_retried_up_to_max_attempts(make_context, max_attempts):
+    address = free_address()
+    # A single group of two samples
+    tasks = [("agent.py", 1, 0), ("agent.py", 1, 2)]
+    results = []
+    context = make_context(guesser_models=["m1", "m2"], max_concurrency=2)
+    with Coordinator(address, AUTHKEY, context, ["agent.py"], max_attempts=max_attempts) as coordinator:
+        runner = threading.Thread(target=lambda: results.extend(coordinator.imap_unordered(tasks)))
+        runner.start()
+        for attempt in range(max_attempts):
+            worker = connect_worker(address, f"worker {attempt}")
+            worker.send(None)
+            assert worker.recv()[1] == tasks
+            worker.close()
+        runner.join(timeout=10)
+    assert coordinator.requeued_tasks == max_attempts - 1
+    assert results == [
+        {
+            "agent_path": "agent.py",
+            "level": 1,
+            "word_index": word_index,
+            "agent_name": None,
+            "outcomes": {"m1": "agent_error", "m2": "agent_error"},
+            "execution_time": 0.0,
+        }
+        for word_index in [0, 2]
+    ]
@@ -0,0 +1,155 @@
+import random
+
+import pytest
+
+from core.early_stopping import EarlyStopping
+from core.tester import accuracy_interval, compute_score, level_weight, new_results_by_level, score_interval
+
+LEVELS = [1, 2]
+
+
+def make_results(correct: dict, incorrect: dict) -> dict:
+    results = new_results_by_level(LEVELS)
+    for level in LEVELS:
+        results[level]["correct"] = correct[level]
+        results[level]["incorrect"] = incorrect[level]
+    return results
+
+
+def run(early_stopping: EarlyStopping, accuracies: dict, seed: int = 0) -> dict:
+    # Test the agents still active on each round, each answering correctly with its own accuracy
+    rng = random.Random(seed)
+    tested_words = {agent_path: 0 for agent_path in accuracies}
+    for word_indices in early_stopping.rounds():
+        for agent_path in early_stopping.active:
+            tested_words[agent_path] += len(word_indices)
+            for level in LEVELS:
+                for _ in word_indices:
+                    outcome = "correct" if rng.random() < accuracies[agent_path] else "incorrect"
+                    early_stopping.update({"agent_path": agent_path, "level": level, "outcomes": {"m": outcome}})
+    return tested_words
+
+
+def test_accuracy_interval():
+    assert accuracy_interval(0, 0) == (0.0, 1.0)
+    low, high = accuracy_interval(0, 10)
+    assert low == pytest.approx(0.0) and 0 < high < 0.5
+    low, high = accuracy_interval(10, 10)
+    assert 0.5 < low < 1 and high == pytest.approx(1.0)
+    assert accuracy_interval(5, 10, confidence=0.99)[0] < accuracy_interval(5, 10, confidence=0.9)[0]
+
+
+def test_score_interval_of_all_the_words_is_exact():
+    results = make_results({1: 30, 2: 10}, {1: 70, 2: 90})
+    estimate, low, high = score_interval(results, num_words=100)
+    assert estimate == low == high
+    # The score is rounded
+    assert estimate == pytest.approx(compute_score(results), abs=0.01)
+
+
+def test_score_interval_without_samples_spans_every_score():
+    estimate, low, high = score_interval(new_results_by_level(LEVELS), num_words=100)
+    assert low == 0.0
+    assert high == pytest.approx(100 * sum(level_weight(level) for level in LEVELS))
+    assert low <= estimate <= high
+
+
+def test_score_interval_stays_within_the_possible_scores():
+    # No correct answer yet: the interval doesn't collapse, and never goes below the points already scored
+    estimate, low, high = score_interval(make_results({1: 0, 2: 0}, {1: 10, 2: 10}), num_words=100)
+    assert estimate == low == 0.0 and high > 0
+    results = make_results({1: 90, 2: 90}, {1: 5, 2: 5})
+    _, low, high = score_interval(results, num_words=100)
+    assert low >= 90 * sum(level_weight(level) for level in LEVELS)
+    assert high <= 95 * sum(level_weight(level) for level in LEVELS)
+
+
+def test_score_interval_narrows_with_samples_and_widens_with_confidence():
+    def width(num_samples: int, confidence: float = 0.95) -> float:
+        correct = {level: num_samples // 2 for level in LEVELS}
+        _, low, high = score_interval(make_results(correct, correct), num_words=200, confidence=confidence)
+        return high - low
+
+    assert width(80) < width(40) < width(10)
+    assert width(40, confidence=0.99) > width(40, confidence=0.9)
+
+
+def test_score_interval_coverage():
+    rng = random.Random(0)
+    num_words, num_samples = 100, 30
+    # The true correct answers of each level, of which random subsets are tested
+    answers = {level: [rng.random() < 0.6 for _ in range(num_words)] for level in LEVELS}
+    true_score = sum(level_weight(level) * sum(answers[level]) for level in LEVELS)
+    covered = 0
+    for _ in range(500):
+        results = new_results_by_level(LEVELS)
+        for level in LEVELS:
+            for correct in rng.sample(answers[level], num_samples):
+                results[level]["correct" if correct else "incorrect"] += 1
+        _, low, high = score_interval(results, num_words)
+        covered += low <= true_score <= high
+    assert covered / 500 >= 0.9
+
+
+def test_intervals_are_bonferroni_corrected():
+    early_stopping = EarlyStopping(["a", "b", "c", "d"], LEVELS, num_words=100, min_words=20, round_words=10)
+    # Checked after 20, 30, ..., 90 words (after the last round, every word is tested)
+    assert early_stopping.num_checks() == 8
+    assert early_stopping.interval_confidence == pytest.approx(1 - 0.05 / (4 * 8))
+    assert EarlyStopping(["a"], LEVELS, num_words=95, min_words=20, round_words=10).num_checks() == 8
+    assert EarlyStopping(["a"], LEVELS, num_words=10, min_words=20, round_words=10).num_checks() == 1
+
+
+def test_separated_agents_stop_early():
+    accuracies = {"good": 0.95, "average": 0.5, "bad": 0.05}
+    early_stopping = EarlyStopping(list(accuracies), LEVELS, num_words=200, min_words=20, round_words=10)
+    tested_words = run(early_stopping, accuracies)
+    assert early_stopping.stopped == set(accuracies)
+    assert all(words < 200 for words in tested_words.values())
+    intervals = early_stopping.intervals()
+    assert intervals["good"][1] > intervals["average"][2] > intervals["average"][1] > intervals["bad"][2]
+
+
+def test_tied_agents_are_tested_on_every_word():
+    accuracies = {"a": 0.5, "b": 0.5}
+    early_stopping = EarlyStopping(list(accuracies), LEVELS, num_words=100, min_words=20, round_words=10)
+    assert run(early_stopping, accuracies) == {"a": 100, "b": 100}
+    assert early_stopping.stopped == set()
+    assert early_stopping.tested_samples() == 2 * len(LEVELS) * 100
+
+
+def test_top_k_only_settles_the_membership():
+    accuracies = {"first": 0.95, "second": 0.9, "third": 0.05}
+    early_stopping = EarlyStopping(list(accuracies), LEVELS, num_words=200, top_k=2, min_words=20, round_words=10)
+    tested_words = run(early_stopping, accuracies)
+    # The top 2 are close, but both are certainly in it
+    assert early_stopping.stopped == set(accuracies)
+    assert tested_words["first"] < 200 and tested_words["second"] < 200
+
+
+def test_failed_agents_are_stopped_without_an_interval():
+    early_stopping = EarlyStopping(["a", "b"], LEVELS, num_words=100)
+    early_stopping.update({"agent_path": "a", "level": 1, "word_index": 0, "error": RuntimeError("can't load")})
+    assert early_stopping.settle() == ["a"]
+    assert early_stopping.active == ["b"]
+    assert "a" not in early_stopping.stopped and "a" not in early_stopping.intervals()
+
+
+def test_remaining_samples_shrink_as_agents_stop():
+    accuracies = {"good": 0.95, "average": 0.5, "bad": 0.05}
+    early_stopping = EarlyStopping(list(accuracies), LEVELS, num_words=200, min_words=20, round_words=10)
+    assert early_stopping.remaining_samples() == 3 * len(LEVELS) * 200
+    rng = random.Random(0)
+    # The number of samples to test in the whole evaluation, as estimated at the start of each round
+    totals = []
+    for word_indices in early_stopping.rounds():
+        totals.append(early_stopping.tested_samples() + early_stopping.remaining_samples())
+        for agent_path in early_stopping.active:
+            for level in LEVELS:
+                for _ in word_indices:
+                    outcome = "correct" if rng.random() < accuracies[agent_path] else "incorrect"
+                    early_stopping.update({"agent_path": agent_path, "level": level, "outcomes": {"m": outcome}})
+    assert totals == sorted(totals, reverse=True) and totals[-1] < totals[0]
+    # Once all the agents are stopped, nothing remains
+    assert early_stopping.active == [] and early_stopping.remaining_samples() == 0
+    assert early_stopping.tested_samples() <= totals[-1]
@@ -0,0 +1,118 @@
+import multiprocessing
+from argparse import Namespace
+
+import pytest
+
+from core.backends import BACKEND_ENV_VARIABLE
+from core.cache import OFFICIAL_ENV_VARIABLE
+from core.early_stopping import EarlyStopping
+from core.evaluation import check_options, run_samples
+
+
+def make_args(**overrides) -> Namespace:
+    # The defaults of scripts/test_solutions.py
+    args = dict(
+        scheduler="agent",
+        coordinator=None,
+        worker=None,
+        worker_max_restarts=10,
+        shard_index=0,
+        num_shards=1,
+        sample_fraction=None,
+        cache_path=None,
+        cache_replay_only=False,
+        embedding_cache_path=None,
+        guess_cache_path=None,
+        guess_cache_threshold=0.95,
+        requests_per_minute=None,
+        tokens_per_minute=None,
+        max_retries=None,
+        hedge_percentile=None,
+        max_concurrency=None,
+        guesser_batch_size=None,
+        trace_path=None,
+        profile_dir=None,
+        adaptive=False,
+        adaptive_confidence=0.95,
+        adaptive_round_words=10,
+        agent_max_memory_mb=None,
+        agent_max_cpu_seconds=None,
+        agent_max_open_files=None,
+        isolate_agents=False,
+    )
+    args.update(overrides)
+    return Namespace(**args)
+
+
+@pytest.mark.parametrize(
+    "overrides",
+    [
+        {},
+        {"scheduler": "sample", "max_concurrency": 4, "guesser_batch_size": 2},
+        {"scheduler": "sample", "adaptive": True},
+        {"agent_max_memory_mb": 512, "isolate_agents": True},
+    ],
+)
+def test_valid_options(overrides):
+    check_options(make_args(**overrides))
+
+
+@pytest.mark.parametrize(
+    "overrides, message",
+    [
+        ({"shard_index": 2, "num_shards": 2}, "--shard-index"),
+        ({"cache_replay_only": True}, "--cache-replay-only requires --cache-path"),
+        ({"max_concurrency": 0}, "--max-concurrency must be positive"),
+        ({"guesser_batch_size": 2}, "--guesser-batch-size requires --max-concurrency"),
+        ({"adaptive": True}, "--adaptive requires --scheduler sample"),
+        ({"agent_max_cpu_seconds": 10}, "require --isolate-agents"),
+    ],
+)
+def test_invalid_options(overrides, message):
+    with pytest.raises(ValueError, match=message):
+        check_options(make_args(**overrides))
+
+
+def test_distributed_options(monkeypatch):
+    monkeypatch.delenv("TABOO_DISTRIBUTED_AUTHKEY", raising=False)
+    with pytest.raises(ValueError, match="TABOO_DISTRIBUTED_AUTHKEY"):
+        check_options(make_args(worker="localhost:6000"))
+    monkeypatch.setenv("TABOO_DISTRIBUTED_AUTHKEY", "secret")
+    with pytest.raises(ValueError, match="--coordinator requires --scheduler sample"):
+        check_options(make_args(coordinator="localhost:6000"))
+    # Host-local files, which the workers can't share
+    with pytest.raises(ValueError, match="--cache-path is not supported with --coordinator"):
+        check_options(make_args(scheduler="sample", coordinator="localhost:6000", cache_path="cache.db"))
+
+
+def test_approximations_are_not_allowed_in_official_mode(monkeypatch):
+    monkeypatch.setenv(OFFICIAL_ENV_VARIABLE, "1")
+    with pytest.raises(ValueError, match="official scoring mode"):
+        check_options(make_args(guess_cache_path="guesses.db"))
+    with pytest.raises(ValueError, match="official scoring mode"):
+        check_options(make_args(max_concurrency=4, guesser_batch_size=2))
+
+
+@pytest.mark.parametrize("max_concurrency", [None, 2])
+@pytest.mark.parametrize("adaptive", [False, True])
+def test_run_samples(make_context, write_agent, monkeypatch, max_concurrency, adaptive):
+    monkeypatch.setenv(BACKEND_ENV_VARIABLE, "fake")
+    agent_paths = [write_agent("round", 'return "a round object"'), write_agent("broken", "raise RuntimeError")]
+    context = make_context(levels=[1, 2], max_concurrency=max_concurrency)
+    num_words = len(context["test_list"])
+    early_stopping = None
+    if adaptive:
+        early_stopping = EarlyStopping(agent_paths, levels=[1, 2], num_words=num_words, min_words=1, round_words=1)
+    results, worker_startups = run_samples(
+        context, agent_paths, multiprocessing.get_context("fork"), 2, early_stopping=early_stopping
+    )
+
+    assert [result["agent_path"] for result in results] == agent_paths
+    assert len(worker_startups) >= 1
+    round_result, broken_result = results
+    assert round_result["agent_name"] == "round"
+    assert sum(round_result["raw_results"][1].values()) == num_words
+    assert broken_result["agent_name"] == "broken"
+    assert broken_result["exceptions"] == 2 * num_words
+    if adaptive:
+        assert "score_interval" in round_result
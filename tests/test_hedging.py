@@ -0,0 +1,122 @@
+import asyncio
+import pickle
+import threading
+import time
+
+import pytest
+
+from core.hedging import HedgingPolicy, merge_hedging_stats, summarize_hedging
+
+
+def warm_up(policy: HedgingPolicy, latency: float = 0.0):
+    # Observe enough (fast) requests for hedging to start
+    for _ in range(policy.min_samples):
+        policy.run(lambda: time.sleep(latency))
+
+
+def test_no_hedging_before_min_samples():
+    policy = HedgingPolicy(min_samples=5, min_delay=0.0)
+    for _ in range(4):
+        assert policy.run(lambda: "answer") == "answer"
+    stats = policy.collect_stats()
+    assert stats["requests"] == 4
+    assert stats["hedges"] == 0
+
+
+def test_slow_request_is_hedged_and_the_hedge_wins():
+    policy = HedgingPolicy(percentile=50, max_hedge_ratio=1.0, min_samples=5, min_delay=0.01)
+    warm_up(policy)
+    policy.collect_stats()
+
+    calls = []
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            calls.append(len(calls))
+            first = len(calls) == 1
+        # The first request is stuck, the hedge answers right away
+        time.sleep(1.0 if first else 0.0)
+        return "slow" if first else "hedge"
+
+    assert policy.run(call) == "hedge"
+    stats = policy.collect_stats()
+    assert stats["hedges"] == 1
+    assert stats["hedge_wins"] == 1
+
+
+def test_hedges_are_capped_by_the_budget():
+    policy = HedgingPolicy(percentile=50, max_hedge_ratio=0.1, min_samples=5, min_delay=0.001)
+    warm_up(policy)
+    policy.collect_stats()
+
+    # Every request is slower than the recent latencies
+    for _ in range(30):
+        policy.run(lambda: time.sleep(0.01))
+    # The budget counts every request since the start (the warm-up included)
+    assert policy._hedges <= policy.max_hedge_ratio * policy._requests
+    stats = policy.collect_stats()
+    assert stats["hedges"] >= 1
+    assert stats["over_budget"] > 0
+    assert stats["hedges"] + stats["over_budget"] <= stats["requests"]
+
+
+def test_errors_of_both_requests_raise_the_first_one():
+    policy = HedgingPolicy(percentile=50, max_hedge_ratio=1.0, min_samples=5, min_delay=0.001)
+    warm_up(policy)
+
+    def call():
+        time.sleep(0.05)
+        raise ValueError("request failed")
+
+    with pytest.raises(ValueError):
+        policy.run(call)
+
+
+def test_async_hedge_cancels_the_loser():
+    policy = HedgingPolicy(percentile=50, max_hedge_ratio=1.0, min_samples=5, min_delay=0.01)
+    warm_up(policy)
+    policy.collect_stats()
+    cancelled = []
+
+    async def main():
+        calls = 0
+
+        async def call():
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                try:
+                    await asyncio.sleep(1.0)
+                except asyncio.CancelledError:
+                    cancelled.append(True)
+                    raise
+                return "slow"
+            return "hedge"
+
+        return await policy.arun(call)
+
+    assert asyncio.run(main()) == "hedge"
+    assert cancelled == [True]
+    assert policy.collect_stats()["hedge_wins"] == 1
+
+
+def test_policy_pickles_without_its_state():
+    policy = HedgingPolicy(percentile=90, max_hedge_ratio=0.2)
+    warm_up(policy)
+    copy = pickle.loads(pickle.dumps(policy))
+    assert (copy.percentile, copy.max_hedge_ratio) == (90, 0.2)
+    assert copy._requests == 0
+
+
+def test_merge_and_summarize_stats():
+    first = {"requests": 10, "hedges": 1, "hedge_wins": 1, "over_budget": 0}
+    second = {"requests": 10, "hedges": 0, "hedge_wins": 0, "over_budget": 2}
+    first.update(latencies=[0.1] * 10, unhedged_latencies=[0.1] * 9 + [1.0])
+    second.update(latencies=[0.2] * 10, unhedged_latencies=[0.2] * 10)
+    stats = merge_hedging_stats([first, second])
+    summary = summarize_hedging(stats)
+    assert summary["requests"] == 20
+    assert summary["hedge_rate"] == pytest.approx(0.05)
+    assert summary["over_budget"] == 2
+    assert summary["unhedged_latency"]["p99"] > summary["latency"]["p99"]
@@ -0,0 +1,105 @@
+import httpx
+import openai
+import pytest
+
+from core import rate_limiter as rate_limiter_module
+from core.rate_limiter import RateLimiter, RetryPolicy
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter_module.time, "time", clock.time)
+    monkeypatch.setattr(rate_limiter_module.time, "sleep", clock.sleep)
+    return clock
+
+
+def make_error(error_class, status_code: int, headers: dict | None = None):
+    request = httpx.Request("POST", "https://example.invalid/chat/completions")
+    response = httpx.Response(status_code, headers=headers, request=request)
+    return error_class("error", response=response, body=None)
+
+
+def test_rate_limiter_without_limits_never_waits(tmp_path, clock):
+    rate_limiter = RateLimiter(tmp_path / "rate_limiter.sqlite")
+    for _ in range(100):
+        rate_limiter.acquire(tokens=1000)
+    assert clock.sleeps == []
+    assert rate_limiter.total_wait == 0
+
+
+def test_rate_limiter_requests_bucket(tmp_path, clock):
+    rate_limiter = RateLimiter(tmp_path / "rate_limiter.sqlite", requests_per_minute=60)
+    # The bucket starts full
+    for _ in range(60):
+        rate_limiter.acquire()
+    assert clock.sleeps == []
+    # Then it refills at one request per second
+    rate_limiter.acquire()
+    assert clock.sleeps == [pytest.approx(1.0)]
+    assert rate_limiter.total_wait == pytest.approx(1.0)
+
+
+def test_rate_limiter_tokens_bucket(tmp_path, clock):
+    rate_limiter = RateLimiter(tmp_path / "rate_limiter.sqlite", tokens_per_minute=600)
+    rate_limiter.acquire(tokens=500)
+    # 500 more tokens than estimated were used: the bucket is in debt
+    rate_limiter.record_usage(500)
+    rate_limiter.acquire(tokens=100)
+    assert sum(clock.sleeps) == pytest.approx(50.0)
+
+
+def test_rate_limiter_is_shared_through_its_file(tmp_path, clock):
+    path = tmp_path / "rate_limiter.sqlite"
+    first, second = RateLimiter(path, requests_per_minute=2), RateLimiter(path, requests_per_minute=2)
+    first.acquire()
+    second.acquire()
+    first.acquire()
+    assert first.total_wait == pytest.approx(30.0)
+    assert second.total_wait == 0
+
+
+def test_retry_policy_only_retries_transient_errors():
+    retry_policy = RetryPolicy(max_retries=3)
+    assert retry_policy.get_delay(0, make_error(openai.RateLimitError, 429)) is not None
+    assert retry_policy.get_delay(0, make_error(openai.InternalServerError, 500)) is not None
+    assert retry_policy.get_delay(0, make_error(openai.BadRequestError, 400)) is None
+    assert retry_policy.retries == 2
+
+
+def test_retry_policy_gives_up_after_max_retries():
+    retry_policy = RetryPolicy(max_retries=2)
+    error = make_error(openai.RateLimitError, 429)
+    assert retry_policy.get_delay(1, error) is not None
+    assert retry_policy.get_delay(2, error) is None
+    assert RetryPolicy(max_retries=0).get_delay(0, error) is None
+
+
+def test_retry_policy_backoff_is_capped():
+    retry_policy = RetryPolicy(max_retries=20, base_delay=1.0, max_delay=5.0)
+    error = make_error(openai.RateLimitError, 429)
+    for attempt in range(20):
+        assert 0 <= retry_policy.get_delay(attempt, error) <= min(5.0, 2**attempt)
+
+
+def test_retry_policy_honors_retry_after():
+    retry_policy = RetryPolicy(max_retries=3, base_delay=0.001, max_delay=60.0)
+    assert retry_policy.get_delay(0, make_error(openai.RateLimitError, 429, {"retry-after": "7"})) == 7.0
+    assert retry_policy.get_delay(0, make_error(openai.RateLimitError, 429, {"retry-after-ms": "1500"})) == 1.5
+    # Capped by the maximum delay, and ignored when it is an HTTP date
+    assert retry_policy.get_delay(0, make_error(openai.RateLimitError, 429, {"retry-after": "120"})) == 60.0
+    date_error = make_error(openai.RateLimitError, 429, {"retry-after": "Wed, 21 Oct 2026 07:28:00 GMT"})
+    assert retry_policy.get_delay(0, date_error) <= 0.001
@@ -0,0 +1,43 @@
+from core.results_store import ResultsStore
+from core.tester import _Sample
+
+FINGERPRINTS = {"m1": "f1", "m2": "f2"}
+
+
+def test_samples_round_trip(tmp_path):
+    store = ResultsStore(tmp_path / "results.db")
+    store.put("f1", 1, 0, "agent", "correct", 1.5)
+    sample = store.get("f1", 1, 0)
+    assert sample == {"agent_name": "agent", "outcome": "correct", "execution_time": 1.5}
+    assert store.load("f1")[(1, 0)] == sample
+    assert store.get("f1", 2, 0) is None
+    assert store.get("f2", 1, 0) is None
+
+
+def test_outcomes_round_trip(tmp_path):
+    store = ResultsStore(tmp_path / "results.db")
+    store.put_outcomes(FINGERPRINTS, 1, 0, "agent", {"m1": "correct", "m2": "incorrect"}, 1.5)
+    sample = store.get_outcomes(FINGERPRINTS, 1, 0)
+    assert sample == {
+        "agent_name": "agent",
+        "outcome": "correct",
+        "execution_time": 1.5,
+        "outcomes": {"m1": "correct", "m2": "incorrect"},
+    }
+    assert store.load_outcomes(FINGERPRINTS)[(1, 0)]["outcomes"] == sample["outcomes"]
+    assert store.get_outcomes(FINGERPRINTS, 2, 0) is None
+
+
+def test_samples_with_an_error_are_not_stored(tmp_path):
+    store = ResultsStore(tmp_path / "results.db")
+    store.put_outcomes(FINGERPRINTS, 1, 0, "agent", {"m1": "correct", "m2": "guesser_error"}, 1.0)
+    assert store.get_outcomes(FINGERPRINTS, 1, 0) is None
+    assert store.load_outcomes(FINGERPRINTS) == {}
+
+
+def test_error_answers_of_the_guesser_are_guesser_errors():
+    sample = _Sample("apple", ["fruit"], [], {}, level=1, verbose=False)
+    assert sample.guess_outcome("a red fruit", "apple") == "correct"
+    assert sample.guess_outcome("a red fruit", "pear") == "incorrect"
+    assert sample.guess_outcome("a red fruit", "RATE_LIMIT_ERROR") == "guesser_error"
+    assert sample.guess_outcome("a red fruit", "api_error_500") == "guesser_error"
@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+from core.rules import HintValidator, check_hint
+
+TABOO_LIST = ["felino", "miagola", "topo", "fusa", "animale"]
+FRENCH_TRANSLATIONS = {"gatto": "chat"}
+
+
+def reference_check_hint(taboo_list, guess_word, hint, level, hints_list=None, french_translations_dict=None):
+    # The straightforward version of the rules, that the optimized matcher must agree with
+    if level == 3:
+        return hint in hints_list
+    forbidden_words = taboo_list + [guess_word]
+    if level == 2:
+        forbidden_words.append(french_translations_dict[guess_word])
+    lowered_hint = hint.lower()
+    normalized_hint = "".join(c for c in lowered_hint if c.isalnum())
+    for word in forbidden_words:
+        word = word.lower()
+        if word in lowered_hint or word in normalized_hint or word in normalized_hint[::-1]:
+            return False
+    if level == 4:
+        words = hint.split()
+        if len(words) > 5 or any(len(word) > 20 for word in words):
+            return False
+    return True
+
+
+@pytest.mark.parametrize(
+    "hint, expected",
+    [
+        ("Un animale domestico", False),
+        ("Fa le FUSA", False),
+        ("g-a-t-t-o", False),
+        ("ottag", False),
+        ("o t t a g", False),
+        ("Le chat", True),
+        ("Ha i baffi e caccia", True),
+        ("", True),
+    ],
+)
+def test_check_hint_level_1(hint, expected):
+    assert check_hint(TABOO_LIST, "gatto", hint, 1) is expected
+
+
+def test_check_hint_level_2_forbids_the_translation():
+    assert not check_hint(TABOO_LIST, "gatto", "C'est un chat", 2, french_translations_dict=FRENCH_TRANSLATIONS)
+    assert not check_hint(TABOO_LIST, "gatto", "t-a-h-c", 2, french_translations_dict=FRENCH_TRANSLATIONS)
+    assert check_hint(TABOO_LIST, "gatto", "Ha i baffi", 2, french_translations_dict=FRENCH_TRANSLATIONS)
+
+
+def test_check_hint_level_3_only_accepts_listed_hints():
+    validator = HintValidator(TABOO_LIST, "gatto", 3, hints_list=["animale domestico", "baffi"])
+    # The first check uses the list, the next ones the set
+    assert validator.validate_many(["baffi", "Baffi", "animale domestico", "coda"]) == [True, False, True, False]
+
+
+def test_check_hint_level_4_limits_the_words():
+    assert check_hint(TABOO_LIST, "gatto", "ha i baffi lunghi", 4)
+    assert not check_hint(TABOO_LIST, "gatto", "uno due tre quattro cinque sei", 4)
+    assert not check_hint(TABOO_LIST, "gatto", "a" * 21, 4)
+
+
+def test_check_hint_rejects_invalid_hints():
+    with pytest.raises(ValueError):
+        check_hint(TABOO_LIST, "gatto", None, 1)
+    assert not check_hint(TABOO_LIST, "gatto", "baffi", 5)
+
+
+def test_validator_matches_the_reference_rules():
+    rng = random.Random(0)
+    alphabet = "gatoichfelinmusp -.'ÀÉ"
+    for level in [1, 2, 4]:
+        validator = HintValidator(TABOO_LIST, "gatto", level, french_translations_dict=FRENCH_TRANSLATIONS)
+        for _ in range(2000):
+            hint = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+            expected = reference_check_hint(TABOO_LIST, "gatto", hint, level, french_translations_dict=FRENCH_TRANSLATIONS)
+            assert validator.validate(hint) is expected, hint
+            assert check_hint(TABOO_LIST, "gatto", hint, level, french_translations_dict=FRENCH_TRANSLATIONS) is expected
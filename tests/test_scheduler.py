@@ -0,0 +1,70 @@
+import pytest
+
+from core.backends import BACKEND_ENV_VARIABLE
+from core.results_store import ResultsStore
+from core.scheduler import (
+    SampleResultsMerger,
+    group_sample_tasks,
+    init_worker,
+    make_sample_tasks,
+    run_sample_group_task,
+)
+
+
+def test_group_sample_tasks_keeps_the_agents_interleaved():
+    tasks = make_sample_tasks(["a", "b"], levels=[1, 2], num_words=3)
+    groups = group_sample_tasks(tasks, group_size=2)
+    assert groups == [
+        [("a", 1, 0), ("a", 1, 1)],
+        [("b", 1, 0), ("b", 1, 1)],
+        [("a", 1, 2)],
+        [("b", 1, 2)],
+        [("a", 2, 0), ("a", 2, 1)],
+        [("b", 2, 0), ("b", 2, 1)],
+        [("a", 2, 2)],
+        [("b", 2, 2)],
+    ]
+    assert group_sample_tasks(tasks, group_size=1) == [[task] for task in tasks]
+
+
+@pytest.mark.parametrize(
+    "max_concurrency, guesser_batch_size", [(None, None), (3, None), (3, 3)], ids=["sequential", "asyncio", "batched"]
+)
+def test_sample_groups_give_the_same_outcomes(
+    make_context, write_agent, monkeypatch, max_concurrency, guesser_batch_size
+):
+    monkeypatch.setenv(BACKEND_ENV_VARIABLE, "fake")
+    # The fake guesser guesses the last word of the hint
+    agent_path = write_agent("round", 'return "a round object"')
+    context = make_context(max_concurrency=max_concurrency, guesser_batch_size=guesser_batch_size)
+    init_worker(context)
+    tasks = make_sample_tasks([agent_path], levels=[1], num_words=len(context["test_list"]))
+    results = run_sample_group_task(tasks)
+
+    assert [(result["level"], result["word_index"]) for result in results] == [task[1:] for task in tasks]
+    assert all(result["outcomes"] == {"gpt-4o-mini": "incorrect"} for result in results)
+    assert "agent_load_time" in results[0] and "agent_load_time" not in results[1]
+    if guesser_batch_size is not None:
+        # All the hints of the group in a single request
+        assert results[0]["guesser_batches"] == 1
+
+    merger = SampleResultsMerger([agent_path], levels=[1], test_list=context["test_list"])
+    for result in results:
+        merger.add(result)
+    assert merger.result(agent_path)["raw_results"][1]["incorrect"] == len(tasks)
+
+
+def test_sample_groups_only_test_the_samples_missing_from_the_results_store(
+    make_context, write_agent, monkeypatch, tmp_path
+):
+    monkeypatch.setenv(BACKEND_ENV_VARIABLE, "fake")
+    agent_path = write_agent("round", 'return "a round object"')
+    results_store = ResultsStore(tmp_path / "results.db")
+    context = make_context(max_concurrency=3, results_store=results_store, fingerprints={agent_path: "fingerprint"})
+    results_store.put_outcomes({"gpt-4o-mini": "fingerprint"}, 1, 1, "round", {"gpt-4o-mini": "correct"}, 1.0)
+    init_worker(context)
+    results = run_sample_group_task(make_sample_tasks([agent_path], levels=[1], num_words=3))
+    assert [result.get("reused", False) for result in results] == [False, True, False]
+    assert [result["outcomes"]["gpt-4o-mini"] for result in results] == ["incorrect", "correct", "incorrect"]
+    # The tested samples are stored
+    assert results_store.get_outcomes({"gpt-4o-mini": "fingerprint"}, 1, 2)["outcomes"] == {"gpt-4o-mini": "incorrect"}
@@ -0,0 +1,111 @@
+import json
+import pickle
+
+import numpy as np
+import pytest
+
+from core.vector_index import DTYPES, HintsIndex, quantize, recall_at_k, top_k_cosine
+
+
+def random_embeddings(n: int = 200, d: int = 64, seed: int = 0) -> np.ndarray:
+    embeddings = np.random.default_rng(seed).standard_normal((n, d)).astype(np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def make_index(n: int = 200, d: int = 64) -> HintsIndex:
+    return HintsIndex([f"hint {i}" for i in range(n)], random_embeddings(n, d))
+
+
+def test_quantize_float_formats():
+    embeddings = random_embeddings()
+    matrix, scales = quantize(embeddings, "float32")
+    assert matrix.dtype == np.float32 and scales is None
+    np.testing.assert_array_equal(matrix, embeddings)
+    matrix, scales = quantize(embeddings, "float16")
+    assert matrix.dtype == np.float16 and scales is None
+    np.testing.assert_allclose(matrix, embeddings, atol=1e-3)
+
+
+def test_quantize_int8_round_trip():
+    embeddings = random_embeddings()
+    matrix, scales = quantize(embeddings, "int8")
+    assert matrix.dtype == np.int8 and scales.dtype == np.float32
+    # Each row uses the full range, and dequantizes within half a step
+    assert np.all(np.abs(matrix).max(axis=1) == 127)
+    np.testing.assert_allclose(matrix * scales[:, None], embeddings, atol=float(scales.max()) / 2 + 1e-7)
+
+
+def test_quantize_zero_rows_and_invalid_dtype():
+    matrix, scales = quantize(np.zeros((2, 4)), "int8")
+    assert not matrix.any() and np.all(scales > 0)
+    with pytest.raises(ValueError):
+        quantize(random_embeddings(), "int4")
+
+
+def test_top_k_cosine_matches_a_full_sort():
+    embeddings = random_embeddings()
+    query = np.random.default_rng(1).standard_normal(embeddings.shape[1]) * 3
+    indices, similarities = top_k_cosine(embeddings, query, k=10)
+    expected = np.argsort(-(embeddings @ (query / np.linalg.norm(query))), kind="stable")[:10]
+    np.testing.assert_array_equal(indices, expected)
+    assert np.all(np.diff(similarities) <= 0)
+    assert len(top_k_cosine(embeddings, query, k=0)[0]) == 0
+    assert len(top_k_cosine(embeddings, query, k=1000)[0]) == len(embeddings)
+
+
+@pytest.mark.parametrize("dtype", DTYPES)
+def test_quantized_index_search_and_values(dtype):
+    index = make_index()
+    quantized = index.quantized(dtype)
+    assert quantized.dtype == dtype
+    hint = index.hints[7]
+    # The dict interface keeps returning lists of floats
+    assert isinstance(quantized[hint], list)
+    np.testing.assert_allclose(quantized[hint], index[hint], atol=0.01)
+    assert quantized.search(index.embeddings[7], k=1) == [hint]
+
+
+def test_recall_at_k_of_identical_indexes_is_perfect():
+    index = make_index()
+    report = recall_at_k(index, index.quantized("float32"), k_values=[1, 5], max_queries=50)
+    assert report["queries"] == 50
+    assert report["top1_agreement"] == 1.0
+    assert report["recall@1"] == 1.0 and report["recall@5"] == 1.0
+
+
+def test_recall_at_k_of_quantized_indexes():
+    index = make_index()
+    float16_report = recall_at_k(index, index.quantized("float16"), k_values=[10])
+    int8_report = recall_at_k(index, index.quantized("int8"), k_values=[10])
+    assert float16_report["recall@10"] >= 0.99
+    assert 0.9 <= int8_report["recall@10"] <= 1.0
+
+
+def test_recall_at_k_detects_a_different_index():
+    index = make_index()
+    shuffled = HintsIndex(index.hints, random_embeddings(seed=1))
+    assert recall_at_k(index, shuffled, k_values=[5])["recall@5"] < 0.5
+    with pytest.raises(ValueError):
+        recall_at_k(index, HintsIndex(index.hints[:-1], index.embeddings[:-1]))
+
+
+def test_saved_index_is_memory_mapped_and_pickled_by_path(tmp_path):
+    index = make_index().quantized("int8")
+    path = tmp_path / "index.npy"
+    index.save(path)
+    loaded = HintsIndex.load(path)
+    assert isinstance(loaded.matrix, np.memmap) and loaded.dtype == "int8"
+    assert len(pickle.dumps(loaded)) < 1000
+    assert pickle.loads(pickle.dumps(loaded)).hints == index.hints
+
+
+def test_load_cached_builds_and_rebuilds_the_index(tmp_path):
+    json_path = tmp_path / "hints_db.json"
+    hints_db = {f"hint {i}": embedding.tolist() for i, embedding in enumerate(random_embeddings(10, 8))}
+    json_path.write_text(json.dumps(hints_db))
+    index = HintsIndex.load_cached(json_path)
+    assert index.path == str(tmp_path / "hints_db.npy") and len(index) == 10
+
+    hints_db["new hint"] = hints_db["hint 0"]
+    json_path.write_text(json.dumps(hints_db))
+    assert "new hint" in HintsIndex.load_cached(json_path)